@@ -0,0 +1,85 @@
+"""
+Import-time benchmark of the Airflow DAG file.
+
+The scheduler imports dag.py every time it parses the DAG folder, so everything dag.py imports is paid on every parse. This measures
+the imports with `python -X importtime` in a fresh interpreter per run:
+
+- before: koalasis.pipeline, which the DAG used to import (as test_pipeline) to build the stage graph. It imports pandas, the
+  KoalaSis client and every pipeline module, and used to configure logging.
+- after: koalasis.stages, which the DAG imports now. It only imports the standard library, config.py and stage_graph.py.
+- dag: dag.py itself, when Airflow is installed.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time --repeat 5
+"""
+
+import argparse  # Provides command-line argument parsing | used here to configure the benchmark
+import importlib.util  # Finds modules without importing them | used here to check whether Airflow is installed
+import json  # Provides functions for working with JSON data | used here to print machine-readable results
+import statistics  # Provides statistics functions | used here to take the median of the runs
+import subprocess  # Runs other programs | used here to import the modules in a fresh interpreter
+import sys  # Provides system-specific parameters | used here to find the Python interpreter
+
+# The code each case runs. The fake KoalaSis client stands in for do_not_look, which the old pipeline imported at the top.
+CASES = {
+    "before": "from tests.fake_koala_sis import install_as_koala_sis_api; install_as_koala_sis_api(); import koalasis.pipeline",
+    "after": "import koalasis.stages; koalasis.stages.build_stage_graph()",
+    "dag": "import dag",
+}
+
+
+def import_time(code: str) -> dict:
+    """
+    Run code in a fresh interpreter under -X importtime, and return the total import time and the slowest top-level imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Each line is "import time: self [us] | cumulative | imported package", with one more leading space per level of nesting
+    top_level = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "seconds": sum(top_level.values()) / 1e6,
+        "modules": result.stderr.count("import time:") - 1,
+        "slowest": {name: microseconds / 1e6 for name, microseconds in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per case; the median is reported"
+    )
+    args = parser.parse_args()
+
+    cases = dict(CASES)
+    if importlib.util.find_spec("airflow") is None:
+        del cases["dag"]
+
+    for case, code in cases.items():
+        runs = [import_time(code) for _ in range(args.repeat)]
+        median = statistics.median(run["seconds"] for run in runs)
+        print(
+            json.dumps(
+                {
+                    "case": case,
+                    "seconds": round(median, 4),
+                    "modules": runs[0]["modules"],
+                    "slowest": runs[0]["slowest"],
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Memory and throughput benchmark for downloading a KoalaSis generator to disk.
+
+Compares the original path (process_data_generator_to_dataframe followed by a single to_csv) with the streaming ingester in
+ingest.py on the enrollments generator of the fake KoalaSis client. Run from the repository root:
+
+    python -m benchmarks.ingestion --records 1000000 --page-size 1000
+
+The streaming ingester's peak memory is bounded by --batch-size while the original path's grows with --records, so the two only
+differ when the download is several batches long: by default it is DEFAULT_RECORDS_PER_BATCH batches.
+"""
+
+import argparse  # Provides command-line argument parsing | used here to configure the benchmark size
+import json  # Provides functions for working with JSON data | used here to print machine-readable results
+import os  # Provides functions for interacting with the operating system | used here to manage the scratch directory
+import tempfile  # Provides temporary files and directories | used here as the output location of the benchmark
+import time  # Provides timing functions | used here to measure wall time, outside of tracemalloc
+import tracemalloc  # Traces Python memory allocations | used here to measure peak memory
+
+from koalasis.ingest import DEFAULT_BATCH_SIZE, stream_generator_to_csv
+from koalasis.pipeline import process_data_generator_to_dataframe
+from tests.fake_koala_sis import FakeKoalaSisDataClient, install_as_koala_sis_api
+
+install_as_koala_sis_api()
+
+# The default number of records, in batches of --batch-size
+DEFAULT_RECORDS_PER_BATCH = 10
+
+
+def synthetic_enrollment_pages(n_records: int, page_size: int):
+    """
+    Yield JSON pages of enrollment records, as returned by KoalaSisDataClient.get_enrollment_data(), from the fake client.
+    """
+    return FakeKoalaSisDataClient.at_scale(
+        n_records, page_size=page_size
+    ).get_enrollment_data()
+
+
+def measure(label: str, func, *args) -> dict:
+    """
+    Run func twice: once timed, and once under tracemalloc for its peak memory. tracemalloc slows every allocation down by an order of
+    magnitude, so a run under it would time tracemalloc rather than the ingestion.
+    """
+    started = time.perf_counter()
+    rows = func(*args)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        "label": label,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else None,
+        "peak_mib": round(peak / 2**20, 1),
+    }
+    print(json.dumps(result))
+    return result
+
+
+def run_current(n_records: int, page_size: int, path: str) -> int:
+    df = process_data_generator_to_dataframe(
+        synthetic_enrollment_pages(n_records, page_size)
+    )
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def run_streaming(n_records: int, page_size: int, path: str, batch_size: int) -> int:
+    return stream_generator_to_csv(
+        synthetic_enrollment_pages(n_records, page_size), path, batch_size
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--records",
+        type=int,
+        help=f"Defaults to {DEFAULT_RECORDS_PER_BATCH} times --batch-size",
+    )
+    parser.add_argument("--page-size", type=int, default=1_000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.records is None:
+        args.records = DEFAULT_RECORDS_PER_BATCH * args.batch_size
+    if args.records <= args.batch_size:
+        print(
+            f"Warning: {args.records} records fit in one batch of {args.batch_size}, so both paths hold the whole download"
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        measure(
+            "process_data_generator_to_dataframe",
+            run_current,
+            args.records,
+            args.page_size,
+            os.path.join(tmp, "current.csv"),
+        )
+        measure(
+            "stream_generator_to_csv",
+            run_streaming,
+            args.records,
+            args.page_size,
+            os.path.join(tmp, "streaming.csv"),
+            args.batch_size,
+        )
+
+
+if __name__ == "__main__":
+    main()
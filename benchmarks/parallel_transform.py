@@ -0,0 +1,71 @@
+"""
+Scaling benchmark for the parallel transform stage.
+
+Builds a synthetic merged dataset with the fake KoalaSis client and times merge_and_transform_data with 1, 2, 4 and 8 transform
+workers. Run from the repository root:
+
+    python -m benchmarks.parallel_transform --enrollments 2000000 --schools 200
+"""
+
+import argparse  # Provides command-line argument parsing | used here to configure the benchmark size
+import json  # Provides functions for working with JSON data | used here to print machine-readable results
+import time  # Provides timing functions | used here to measure wall time
+
+import pandas as pd  # 🐼
+
+from koalasis import config, pipeline
+from koalasis.storage import TABLE_SCHEMAS, apply_schema
+from tests.fake_koala_sis import FakeKoalaSisDataClient, install_as_koala_sis_api
+
+install_as_koala_sis_api()
+
+
+def build_tables(n_students: int, n_schools: int, n_enrollments: int):
+    client = FakeKoalaSisDataClient(
+        n_students=n_students, n_schools=n_schools, n_enrollments=n_enrollments
+    )
+    return (
+        apply_schema(pd.DataFrame(client.student_records()), TABLE_SCHEMAS["students"]),
+        apply_schema(pd.DataFrame(client.school_records()), TABLE_SCHEMAS["schools"]),
+        apply_schema(
+            pd.DataFrame(client.enrollment_records()), TABLE_SCHEMAS["enrollments"]
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--schools", type=int, default=100)
+    parser.add_argument("--enrollments", type=int, default=1_000_000)
+    parser.add_argument("--partition-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    students, schools, enrollments = build_tables(
+        args.students, args.schools, args.enrollments
+    )
+    config.transform_partition_size = args.partition_size
+
+    baseline = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        pipeline.merge_and_transform_data(
+            students, schools, enrollments, save_merged=False, workers=workers
+        )
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(
+            json.dumps(
+                {
+                    "workers": workers,
+                    "rows": len(enrollments),
+                    "seconds": round(elapsed, 3),
+                    "speedup": round(baseline / elapsed, 2),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
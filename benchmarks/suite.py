@@ -0,0 +1,344 @@
+"""
+End-to-end benchmark of the pipeline stages on synthetic KoalaSis data.
+
+Generates an extract of the chosen scale with the fake KoalaSis client (see tests/fake_koala_sis.py), runs the pipeline stages on it in a
+scratch directory, and collects the metrics every stage records (see metrics.py): wall and CPU time, peak RSS and its growth, rows in
+and out, and optionally the peak of Python allocations under tracemalloc. merge_and_transform_data is also broken down per transform.
+
+The stages are, in order:
+
+- ingest: process_data_generator_to_dataframe on the enrollments generator. It holds the whole extract in memory, so it is skipped
+  above --ingest-limit enrollments.
+- download: download_data_to_csv from the fake client into the scratch directory, in config.storage_format.
+- read: read_input_data, as the pipeline reads its input.
+- transform: merge_and_transform_data, with one entry per transform.
+- validate: validate_data.
+- save: save_transformed_data.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --scale 1m --output results.json
+    python -m benchmarks.suite --scale 1m --save-baseline baseline.json
+    python -m benchmarks.suite --scale 1m --baseline baseline.json --threshold 0.2
+
+With --baseline, the run exits with status 1 if any stage is slower (or, with --tracemalloc, allocates more) than in the baseline by
+more than the threshold. Baselines only compare meaningfully on the machine they were recorded on, so none is checked in. A run is
+only compared with a baseline of the same number of enrollments, storage format and --tracemalloc setting: tracemalloc slows every
+allocation down, so the timings of a run with it and a run without it would show regressions or speedups that aren't there.
+"""
+
+import argparse  # Provides command-line argument parsing | used here to configure the benchmark
+import json  # Provides functions for working with JSON data | used here to read and write the results
+import os  # Provides functions for interacting with the operating system | used here to manage the scratch directory
+import platform  # Provides information about the machine | used here to label the results
+import sys  # Provides system-specific parameters | used here to set the exit status
+import tempfile  # Provides temporary files and directories | used here as the scratch directory of the benchmark
+import tracemalloc  # Traces Python memory allocations | used here to measure the peak allocations of a stage
+from typing import (
+    Callable,
+    Dict,
+    List,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+import numpy as np
+import pandas as pd
+
+from koalasis import config, pipeline
+from koalasis.join import JoinReport
+from koalasis.metrics import StageMetrics, add_metrics_sink
+from tests.fake_koala_sis import (
+    FakeKoalaSisDataClient,
+    install_as_koala_sis_api,
+)
+
+install_as_koala_sis_api()
+
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "50m": 50_000_000,
+}
+
+STAGES = ["ingest", "download", "read", "transform", "validate", "save"]
+
+# The metrics compared with the baseline. Peak RSS is left out: it is the peak of the whole process so far, not of the stage.
+COMPARED_METRICS = ["wall_seconds", "python_peak_mb"]
+
+
+class CollectingSink:
+    """
+    A metrics sink that keeps the metrics of every stage, summing the times of a stage that runs more than once.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, dict] = {}
+
+    def emit(self, metrics: StageMetrics):
+        stage = self.stages.get(metrics.stage)
+        if stage is None:
+            self.stages[metrics.stage] = {
+                "wall_seconds": metrics.wall_seconds,
+                "cpu_seconds": metrics.cpu_seconds,
+                "peak_rss_mb": metrics.peak_rss_mb,
+                "rss_growth_mb": metrics.rss_growth_mb,
+                "rows_in": metrics.rows_in,
+                "rows_out": metrics.rows_out,
+                "runs": 1,
+            }
+            return
+        stage["wall_seconds"] = round(stage["wall_seconds"] + metrics.wall_seconds, 6)
+        stage["cpu_seconds"] = round(stage["cpu_seconds"] + metrics.cpu_seconds, 6)
+        stage["peak_rss_mb"] = metrics.peak_rss_mb
+        stage["runs"] += 1
+
+
+def run_stage(
+    sink: CollectingSink, name: str, trace_memory: bool, func: Callable, *args, **kwargs
+):
+    """
+    Run one pipeline stage, recording its peak Python allocations under the stage name when trace_memory is set.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sink.stages.setdefault(name, {})["python_peak_mb"] = round(peak / 2**20, 1)
+
+
+def ingest(client: FakeKoalaSisDataClient) -> pd.DataFrame:
+    with pipeline.measure_stage("process_data_generator_to_dataframe") as result:
+        df = pipeline.process_data_generator_to_dataframe(client.get_enrollment_data())
+        result.rows_out = len(df)
+    return df
+
+
+def run_pipeline(
+    n_enrollments: int,
+    stages: List[str],
+    seed: int,
+    trace_memory: bool,
+    ingest_limit: int,
+    directory: str,
+) -> Dict[str, dict]:
+    """
+    Run the selected stages once over a fresh extract of n_enrollments enrollments and return the metrics of every stage.
+
+    The stages a selected stage depends on (download and read, for the stages after them) always run, so their metrics are reported too.
+    """
+    sink = CollectingSink()
+    add_metrics_sink(sink)
+
+    config.input_path = os.path.join(directory, "koala_sis")
+    config.output_path = os.path.join(directory, "data_mart")
+
+    client = FakeKoalaSisDataClient.at_scale(n_enrollments, seed=seed)
+    last_stage = max(STAGES.index(stage) for stage in stages)
+
+    if "ingest" in stages and n_enrollments <= ingest_limit:
+        run_stage(
+            sink, "process_data_generator_to_dataframe", trace_memory, ingest, client
+        )
+
+    if last_stage < STAGES.index("download"):
+        return sink.stages
+    run_stage(
+        sink,
+        "download_data_to_csv",
+        trace_memory,
+        pipeline.download_data_to_csv,
+        client=client,
+        retries=0,
+    )
+
+    if last_stage < STAGES.index("read"):
+        return sink.stages
+    students, schools, enrollments = run_stage(
+        sink, "read_input_data", trace_memory, pipeline.read_input_data
+    )
+
+    if last_stage < STAGES.index("transform"):
+        return sink.stages
+    join_report = JoinReport()
+    transformed_data = run_stage(
+        sink,
+        "merge_and_transform_data",
+        trace_memory,
+        pipeline.merge_and_transform_data,
+        students,
+        schools,
+        enrollments,
+        save_merged=False,
+        join_report=join_report,
+    )
+
+    if "validate" in stages:
+        run_stage(
+            sink,
+            "validate_data",
+            trace_memory,
+            pipeline.validate_data,
+            transformed_data,
+            join_report=join_report,
+        )
+    if "save" in stages:
+        run_stage(
+            sink,
+            "save_transformed_data",
+            trace_memory,
+            pipeline.save_transformed_data,
+            transformed_data,
+        )
+
+    return sink.stages
+
+
+def best_of(runs: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """
+    Combine repeated runs by keeping, for every stage, the run with the lowest wall time, which is the least disturbed by other load.
+    """
+    best = {}
+    for run in runs:
+        for stage, metrics in run.items():
+            if stage not in best or metrics.get("wall_seconds", np.inf) < best[
+                stage
+            ].get("wall_seconds", np.inf):
+                best[stage] = metrics
+    return best
+
+
+def find_regressions(
+    results: dict, baseline: dict, threshold: float, min_seconds: float
+) -> List[dict]:
+    """
+    List the stage metrics that are worse than in the baseline by more than threshold (0.2 is 20%).
+
+    Stages that took less than min_seconds in the baseline are not compared for time, since their timings are mostly noise.
+    """
+    regressions = []
+    for stage, metrics in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            current, previous = metrics.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            if metric == "wall_seconds" and previous < min_seconds:
+                continue
+            change = current / previous - 1
+            if change > threshold:
+                regressions.append(
+                    {
+                        "stage": stage,
+                        "metric": metric,
+                        "baseline": previous,
+                        "current": current,
+                        "change": round(change, 3),
+                    }
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="100k")
+    parser.add_argument(
+        "--enrollments", type=int, help="Number of enrollments; overrides --scale"
+    )
+    parser.add_argument(
+        "--stages", default=",".join(STAGES), help="Comma-separated stages to run"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per stage; the fastest is kept"
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Also record peak Python allocations per stage (slows the run down)",
+    )
+    parser.add_argument("--ingest-limit", type=int, default=SCALES["1m"])
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline")
+    parser.add_argument("--baseline", help="Compare the results with this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    n_enrollments = args.enrollments or SCALES[args.scale]
+
+    runs = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            runs.append(
+                run_pipeline(
+                    n_enrollments,
+                    stages,
+                    args.seed,
+                    args.tracemalloc,
+                    args.ingest_limit,
+                    directory,
+                )
+            )
+
+    results = {
+        "enrollments": n_enrollments,
+        "seed": args.seed,
+        "stages_run": stages,
+        "storage_format": config.storage_format,
+        "tracemalloc": args.tracemalloc,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "stages": best_of(runs),
+    }
+    for stage, metrics in results["stages"].items():
+        print(json.dumps({"stage": stage, **metrics}))
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["enrollments"] != n_enrollments:
+            sys.exit(
+                f"Baseline is for {baseline['enrollments']} enrollments, not {n_enrollments}"
+            )
+        # Baselines saved before these settings were recorded: they ran on CSV, and only had Python peaks under tracemalloc
+        baseline_format = baseline.get("storage_format", "csv")
+        baseline_tracemalloc = baseline.get(
+            "tracemalloc",
+            any("python_peak_mb" in m for m in baseline["stages"].values()),
+        )
+        if baseline_format != config.storage_format:
+            sys.exit(
+                f"Baseline read and wrote {baseline_format}, not {config.storage_format}"
+            )
+        if baseline_tracemalloc != args.tracemalloc:
+            sys.exit(
+                f"Baseline was recorded {'with' if baseline_tracemalloc else 'without'} --tracemalloc; rerun "
+                f"{'with' if baseline_tracemalloc else 'without'} it to compare timings"
+            )
+        regressions = find_regressions(
+            results, baseline, args.threshold, args.min_seconds
+        )
+        for regression in regressions:
+            print(json.dumps({"regression": True, **regression}))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.python import PythonOperator
-import test_pipeline
+from koalasis.stages import build_stage_graph, run_graph_stage
 
 # Define the default arguments for the DAG
 # These are the settings that will be applied to every task in the DAG,
@@ -26,23 +26,26 @@ dag = DAG(
 )
 
 # Define the pipeline tasks
-# Each task represents a distinct unit of work in the pipeline
+# The tasks are generated from the stage graph of the pipeline (see koalasis/stages.py and koalasis/stage_graph.py):
+# one download task per KoalaSis endpoint, which run in parallel, a conform task per partition of the schools that starts once
+# all three downloads are on disk, then validate and save. Every task runs run_graph_stage, which skips the stage
+# when its input files have the same content hash as in its last successful run and its code and settings are unchanged.
+# koalasis.stages only imports the standard library: the stages refer to the pipeline functions by import path, so pandas and
+# the pipeline code are imported when a task runs, not every time the scheduler parses this file.
+stage_graph = build_stage_graph()
 
-# Task 1: Download data from KoalaSis to a CSV file
-download_data_task = PythonOperator(
-    task_id='download_data',  # A unique identifier for this task within the DAG
-    python_callable=test_pipeline.download_data_to_csv,  # The function to call to execute this task
-    dag=dag,  # Associate this task with the DAG we defined earlier
-)
-
-# Task 2: Transform and conform the data to meet specific requirements
-conform_data_task = PythonOperator(
-    task_id='conform_data',  # A unique identifier for this task within the DAG
-    python_callable=test_pipeline.conform_data,  # The function to call to execute this task
-    dag=dag,  # Associate this task with the DAG we defined earlier
-)
+tasks = {
+    name: PythonOperator(
+        task_id=name,  # A unique identifier for this task within the DAG, the name of the stage
+        python_callable=run_graph_stage,  # The function to call to execute this task
+        op_kwargs={'name': name},  # The stage this task runs
+        dag=dag,  # Associate this task with the DAG we defined earlier
+    )
+    for name in stage_graph.order()
+}
 
 # Set task dependencies
-# This defines the order in which tasks will be executed within the pipeline
-download_data_task >> conform_data_task  # Run the conform_data_task after the download_data_task completes successfully
-
+# Every task runs after the tasks that write its input files
+for name, task in tasks.items():
+    for upstream in stage_graph.upstream(name):
+        tasks[upstream] >> task
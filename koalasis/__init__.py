@@ -0,0 +1,7 @@
+"""
+The KoalaSis pipeline: download the students, schools and enrollments from the KoalaSis API, conform them into the
+student_demographics_and_enrollment table of the data mart, validate it and save it.
+
+Importing the package is cheap and has no side effects. The pipeline code is in koalasis.pipeline, its settings in koalasis.config,
+and the stage graph that the Airflow DAG is generated from in koalasis.stages.
+"""
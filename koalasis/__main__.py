@@ -0,0 +1,7 @@
+"""
+Run the pipeline command line: python -m koalasis run --help
+"""
+
+from koalasis.cli import main
+
+main()
@@ -0,0 +1,79 @@
+"""
+Chunked (out-of-core) conform for enrollment tables larger than memory.
+
+Students and schools are small dimension tables; enrollments is the large fact table. conform_in_chunks keeps the dimensions in memory
+and streams the enrollments through merge -> transform -> validate -> write one chunk at a time, so memory use depends on the chunk size
+rather than on the number of enrollments.
+
+Each output row depends only on its own enrollment and the dimension rows it joins to, so the chunked output holds the same rows as the
+in-memory conform. Only the row order differs: rows come out chunk by chunk instead of grouped by student.
+"""
+
+import logging  # Provides a logging system for tracking the execution of the code | used here to report progress per chunk
+import pandas as pd  # 🐼
+from typing import (
+    Callable,
+    Iterable,
+    List,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.join import (
+    JoinReport,
+)  # Hash join of the enrollments with the dimension tables | used here for the enrollments the merge of the chunks dropped
+from koalasis.storage import (
+    TableWriter,
+)  # Pluggable table storage | used here to append each conformed chunk to the output
+from koalasis.validation import (
+    DataValidationError,
+    DataValidator,
+)  # Chunk-friendly validation | used here to validate each chunk and the duplicates across chunks
+
+
+def conform_in_chunks(
+    students: pd.DataFrame,
+    schools: pd.DataFrame,
+    enrollment_chunks: Iterable[pd.DataFrame],
+    transform: Callable[[pd.DataFrame, pd.DataFrame, pd.DataFrame], pd.DataFrame],
+    validator: DataValidator,
+    writers: List[TableWriter],
+    join_report: Optional[JoinReport] = None,
+) -> int:
+    """
+    Merge, transform, validate and write the enrollments one chunk at a time.
+
+    Args:
+        students (pd.DataFrame): The students table, held in memory for the whole run.
+        schools (pd.DataFrame): The schools table, held in memory for the whole run.
+        enrollment_chunks (Iterable[pd.DataFrame]): The enrollments, e.g. from TableStorage.iter_batches.
+        transform (Callable[[pd.DataFrame, pd.DataFrame, pd.DataFrame], pd.DataFrame]): Merges and transforms (students, schools,
+            enrollments chunk) into output rows, e.g. merge_and_transform_data.
+        validator (DataValidator): Validates every chunk. Its report is checked once all chunks are written, before the writers publish
+            the output, so duplicates across chunks are caught too.
+        writers (List[TableWriter]): Open writers every output chunk is appended to.
+        join_report (Optional[JoinReport]): The report transform adds the unmatched enrollments of every chunk to. It is validated
+            once every chunk has been merged.
+
+    Returns:
+        int: The number of output rows written.
+    """
+    rows_written = 0
+
+    for chunk_number, enrollments in enumerate(enrollment_chunks):
+        transformed = transform(students, schools, enrollments)
+        validator.update(transformed)
+
+        for writer in writers:
+            writer.write(transformed)
+
+        rows_written += len(transformed)
+        logging.info(
+            f"Conformed chunk {chunk_number}: {len(enrollments)} enrollments -> {len(transformed)} rows"
+        )
+
+    if join_report is not None:
+        validator.update_join(join_report)
+    report = validator.finish()
+    if not report.ok:
+        raise DataValidationError(report)
+    return rows_written
@@ -0,0 +1,336 @@
+"""
+Command-line runner of the pipeline, which can run any range of its stages and caches their outputs between runs.
+
+    python -m koalasis run
+    python -m koalasis run --stages merge,transform --from-cache
+    python -m koalasis run --stages transform --force --save-merged
+
+The stages are, in order: download, read, merge, transform, validate and save. --stages lists the stages to run, and every stage
+between the first and the last one listed runs too. The stages before the first one aren't run: their outputs are the downloads
+already in config.input_path and the stage cache.
+
+The outputs of merge, transform and validate are kept in a StageCache in config.cache_path (see stage_cache.py), keyed by a hash of the
+downloaded files, the settings they depend on and the source code that computes them, so editing a transform only invalidates the
+transform stage and the stages after it. A stage whose key is in the cache isn't run again, and its output is only read from the cache
+if a later stage needs it, so rerunning unchanged stages takes about as long as hashing the downloads. A cached stage that isn't listed
+in --stages is computed if it isn't in the cache, unless --from-cache is given, in which case the run stops instead; --force runs the
+stages of the range even if they are cached.
+
+save only writes data that passed validation: it reads the output of the validate stage first, so validate runs (or is read from the
+cache) even when only save is listed. --save-merged writes the output of the merge stage, before the transforms, whatever the range,
+from the cache when it is there; it is the same table merge_and_transform_data(save_merged=True) writes.
+"""
+
+import argparse  # Provides command-line argument parsing | used here to parse the commands and options
+import logging  # Provides a logging system for tracking the execution of the code | used here to log the stages run
+import os  # Provides functions for interacting with the operating system | used here to check that the downloads exist
+import sys  # Provides system-specific parameters | used here to exit with an error message
+import time  # Provides timing functions | used here to time the stages
+from dataclasses import (
+    asdict,
+)  # Converts dataclasses to dicts | used here to cache the join report of the merge stage
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+import pandas as pd  # 🐼
+
+from koalasis import (
+    config,
+    dtype_plan,
+    join,
+    parallel,
+    pipeline,
+    storage,
+    validation,
+)  # The pipeline, its settings and the modules its stages run | used here to run the stages and hash their code
+from koalasis.stage_cache import (
+    StageCache,
+    cache_key,
+    code_version,
+)  # On-disk cache of stage outputs | used here to skip the stages whose inputs and code are unchanged
+from koalasis.join import (
+    JoinReport,
+)  # Report of the enrollments the merge found no student or school for | used here to pass it from the merge to the validate stage
+from koalasis.stage_graph import (
+    content_hash,
+)  # Content hashes of files | used here to key the cache on the downloaded tables
+from koalasis.stages import (
+    ENDPOINTS,
+)  # The stage graph of the pipeline | used here for the names of the downloaded tables
+
+STAGES = ["download", "read", "merge", "transform", "validate", "save"]
+
+# The stages whose output is kept in the stage cache. download and save write their output where the pipeline always does, and read
+# only reads the downloads back.
+CACHED_STAGES = ["merge", "transform", "validate"]
+
+# The tables and info of a stage's output
+StageOutput = Tuple[Dict[str, pd.DataFrame], dict]
+
+
+class StageRun:
+    """
+    One run of a range of the pipeline stages. The output of every stage is computed on demand, from the cache when it is there.
+
+    Args:
+        stages (Iterable[str]): The stages to run. The stages between the first and the last of them run too.
+        from_cache (bool): Stop with an error, rather than computing it, when a cached stage before the first stage to run isn't in
+            the cache.
+        force (bool): Run the cached stages of the range even if their output is in the cache.
+        save_merged (bool): Also write the output of the merge stage to config.input_path as merged_data, even if merge is outside
+            the range of stages.
+        cache (Optional[StageCache]): The cache of stage outputs. Defaults to a StageCache in config.cache_path.
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[str],
+        from_cache: bool = False,
+        force: bool = False,
+        save_merged: bool = False,
+        cache: Optional[StageCache] = None,
+    ):
+        stages = list(stages)
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(
+                f"Unknown stages {sorted(unknown)}, expected some of {STAGES}"
+            )
+        first = min(STAGES.index(stage) for stage in stages)
+        last = max(STAGES.index(stage) for stage in stages)
+
+        self.stages = STAGES[first : last + 1]
+        self.from_cache = from_cache
+        self.force = force
+        self.save_merged = save_merged
+        self.cache = cache or StageCache(
+            config.cache_path, config.cache_format, config.cache_entries
+        )
+        self.statuses: Dict[str, str] = {}
+        self._keys: Dict[str, str] = {}
+        self._outputs: Dict[str, StageOutput] = {}
+
+    def key(self, stage: str) -> str:
+        """
+        Return the cache key of the output of stage: a hash of the stage name, the code that computes it, the settings it depends
+        on, and the keys of the stages it reads from. The downloads are hashed by content.
+        """
+        if stage not in self._keys:
+            if stage == "read":
+                input_storage = storage.get_storage(
+                    config.storage_format, config.input_path
+                )
+                paths = [input_storage.path(name) for name in ENDPOINTS]
+                missing = [path for path in paths if not os.path.exists(path)]
+                if missing:
+                    raise FileNotFoundError(
+                        f"The downloads {missing} are missing; run the download stage first"
+                    )
+                parts = [
+                    code_version(pipeline.read_input_data, storage, dtype_plan),
+                    config.input_columns,
+                    config.compact_dtypes,
+                    [content_hash(path) for path in paths],
+                ]
+            elif stage == "merge":
+                parts = [
+                    code_version(
+                        pipeline.merge_data,
+                        pipeline.build_dimension_indexes,
+                        pipeline.assign_data_types,
+                        join,
+                        dtype_plan,
+                    ),
+                    pipeline.ENROLLMENT_JOIN_COLUMNS,
+                    pipeline.STUDENT_JOIN_COLUMNS,
+                    pipeline.SCHOOL_JOIN_COLUMNS,
+                    self.key("read"),
+                ]
+            elif stage == "transform":
+                parts = [
+                    code_version(
+                        pipeline.transform_merged_data,
+                        pipeline.transform_data,
+                        pipeline.format_name_column,
+                        pipeline.NameCache,
+                        pipeline.capitalize_name_parts,
+                        pipeline.capitalize_part,
+                        pipeline.build_display_names,
+                        pipeline.format_display_name,
+                        pipeline.format_gender_column,
+                        pipeline.format_gender,
+                        pipeline.calculate_exit_withdraw_dates,
+                        pipeline.output_columns,
+                        parallel,
+                    ),
+                    pipeline.NAME_PART_START_PATTERN.pattern,
+                    pipeline.TRANSFORM_INPUT_COLUMNS,
+                    pipeline.TRANSFORM_OUTPUT_COLUMNS,
+                    pipeline.output_columns(),
+                    self.key("merge"),
+                ]
+            elif stage == "validate":
+                parts = [
+                    code_version(pipeline.validate_data, validation),
+                    config.validation_key,
+                    self.key("transform"),
+                ]
+            else:
+                raise ValueError(f"Stage {stage} has no cache key")
+            self._keys[stage] = cache_key(stage, *parts)
+        return self._keys[stage]
+
+    def is_cached(self, stage: str) -> bool:
+        return stage in CACHED_STAGES and self.cache.has(stage, self.key(stage))
+
+    def output(self, stage: str) -> StageOutput:
+        """
+        Return the output of stage, from the cache if it is there, and computing it (and the outputs it needs) otherwise.
+        """
+        if stage not in self._outputs:
+            forced = self.force and stage in self.stages
+            if self.is_cached(stage) and not forced:
+                self._outputs[stage] = self.cache.load(stage, self.key(stage))
+            else:
+                if (
+                    self.from_cache
+                    and stage in CACHED_STAGES
+                    and stage not in self.stages
+                ):
+                    raise FileNotFoundError(
+                        f"Stage {stage} has no cached output for the current downloads, settings and code; run it first, or "
+                        "leave out --from-cache"
+                    )
+                self._outputs[stage] = self.compute(stage)
+                if stage in CACHED_STAGES:
+                    self.cache.save(stage, self.key(stage), *self._outputs[stage])
+        return self._outputs[stage]
+
+    def compute(self, stage: str) -> StageOutput:
+        """
+        Run stage, reading the outputs of the stages it depends on through output.
+        """
+        logging.info(f"Running stage {stage}")
+        if stage == "download":
+            pipeline.download_data_to_csv()
+            return {}, {}
+        if stage == "read":
+            students, schools, enrollments = pipeline.read_input_data()
+            return {
+                "students": students,
+                "schools": schools,
+                "enrollments": enrollments,
+            }, {}
+        if stage == "merge":
+            # The join report of the merge is kept as its info, for the validate stage
+            merged_data, join_report = pipeline.merge_data(**self.output("read")[0])
+            return {"merged_data": merged_data}, asdict(join_report)
+        if stage == "transform":
+            # The transforms add their columns to the merged data, so they get a copy of the output of the merge stage
+            merged_data = self.output("merge")[0]["merged_data"].copy()
+            transformed_data = pipeline.transform_merged_data(merged_data)
+            return {"transformed_data": transformed_data}, {}
+        if stage == "validate":
+            report = pipeline.validate_data(
+                self.output("transform")[0]["transformed_data"],
+                join_report=JoinReport(**self.output("merge")[1]),
+            )
+            return {}, report.to_dict()
+        if stage == "save":
+            # validate raises on invalid data, so only validated data is saved
+            self.output("validate")
+            pipeline.save_transformed_data(
+                self.output("transform")[0]["transformed_data"]
+            )
+            return {}, {}
+        raise ValueError(f"Unknown stage {stage}")
+
+    def run(self) -> Dict[str, str]:
+        """
+        Run the stages, and return how each one ran ("cached" or the time it took), keyed by stage.
+        """
+        for stage in self.stages:
+            if self.is_cached(stage) and not self.force:
+                # Its output is only read from the cache if a later stage needs it
+                self.statuses[stage] = "cached"
+            else:
+                started = time.perf_counter()
+                self.output(stage)
+                self.statuses[stage] = f"ran in {time.perf_counter() - started:.2f}s"
+
+        if self.save_merged:
+            pipeline.save_merged_data(self.output("merge")[0]["merged_data"])
+        return self.statuses
+
+
+def parse_stages(value: str) -> List[str]:
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if not stages or unknown:
+        raise argparse.ArgumentTypeError(
+            f"expected a comma-separated list of {', '.join(STAGES)}"
+        )
+    return stages
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="koalasis", description=__doc__.strip().splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run", help="Run a range of the pipeline stages, reusing cached outputs"
+    )
+    run_parser.add_argument(
+        "--stages",
+        type=parse_stages,
+        default=STAGES,
+        help=f"Comma-separated stages to run, of {','.join(STAGES)}. Defaults to all of them.",
+    )
+    run_parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="Fail instead of recomputing a cached stage before the first stage to run",
+    )
+    run_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Run the stages even if their output is cached",
+    )
+    run_parser.add_argument(
+        "--save-merged",
+        action="store_true",
+        help="Also write the merged data, before the transforms, to the input directory as merged_data",
+    )
+    run_parser.add_argument(
+        "--workers", type=int, help="Number of processes the transforms run on"
+    )
+    run_parser.add_argument("--cache-dir", help="Directory of the stage cache")
+    args = parser.parse_args(argv)
+
+    config.configure_logging()
+    if args.workers is not None:
+        config.transform_workers = args.workers
+    if args.cache_dir is not None:
+        config.cache_path = args.cache_dir
+
+    run = StageRun(
+        args.stages,
+        from_cache=args.from_cache,
+        force=args.force,
+        save_merged=args.save_merged,
+    )
+    try:
+        statuses = run.run()
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+    finally:
+        for stage, status in run.statuses.items():
+            print(f"{stage:<10} {status}")
+    return statuses
@@ -0,0 +1,111 @@
+"""
+Settings of the KoalaSis pipeline.
+
+The settings are plain module attributes, read by the pipeline every time they are used, so they can be changed at runtime, e.g.
+config.input_path = "/tmp/extract" before a run. This module only imports the standard library: the Airflow DAG and the CLI read the
+settings to lay out the stages without importing pandas or the pipeline code.
+"""
+
+import logging  # Provides a logging system for tracking the execution of the code | used here to set up the pipeline log file
+
+# Global constants for input and output paths
+credentials = "landing_zone_credentials"
+
+# Specify the directories where raw data is stored (input_path) and where transformed data will be saved (output_path)
+input_path = "data/koala_sis"
+output_path = "data/data_mart"
+
+# Where the incremental conform keeps the previous run's fingerprints and output
+state_path = "data/koala_sis/state"
+
+# Conform incrementally: only re-transform the enrollments affected by a change since the previous run, and upsert them into that run's
+# output (see incremental.py). Used by conform_data and by the conform stages of the stage graph. After a change to the transform code
+# the state must be rebuilt once, with conform_data(full_rebuild=True) or by deleting state_path.
+incremental_conform = False
+
+# Where the stage graph keeps the artifacts passed between its stages (conformed partitions, validation report) and the hashes of
+# each stage's last run
+staging_path = "data/koala_sis/staging"
+
+# The number of conform tasks of the stage graph. Each one conforms the enrollments of a share of the schools (by SchoolId), and the
+# validate and save stages combine them.
+conform_partitions = 1
+
+# The format the downloaded tables are stored in between download and conform ("parquet", "feather" or "csv")
+storage_format = "parquet"
+
+# The formats the final data mart table is saved in. Add "csv" for downstream consumers that need a CSV export.
+output_formats = ("parquet",)
+
+# The columns conform_data needs from each downloaded table. Only these are read back, which the columnar formats can do without
+# touching the other columns on disk.
+input_columns = {
+    "students": ["id", "local_student_id", "first_name", "last_name", "gender"],
+    "schools": ["id", "school_name", "end_date"],
+    "enrollments": [
+        "id",
+        "student_id",
+        "school_id",
+        "enrollment_start_date",
+        "enrollment_end_date",
+        "academic_year",
+    ],
+}
+
+# Read the tables with the compact dtype plan of dtype_plan.py (categoricals, Arrow strings, downcast ids) instead of int64 and
+# Python-object columns. The output table is saved with the same dtypes either way.
+compact_dtypes = False
+
+# How the data mart table is written. None writes one file per output format, with a .manifest.json of its row count and checksum
+# next to it. A list of columns, e.g. ["SchoolId"] or ["SchoolId", "academic_year"], writes one directory per output format instead,
+# with part files per partition and a _manifest.json listing them, so consumers can read only the schools they need (see
+# output_writer.py). Partition columns that aren't output columns, like academic_year, are added to the table.
+output_partition_by = None
+
+# The number of rows handed to the background output writer at a time, and how many of them may wait to be written
+output_batch_size = 250_000
+output_max_pending = 2
+
+# Number of processes the transforms run on, and the target number of rows sent to a process at a time.
+# Rows are partitioned by SchoolId, so a partition holds whole schools and can exceed the target for a very large school.
+transform_workers = 1
+transform_partition_size = 250_000
+
+# The columns that identify one output row. validate_data rejects rows that repeat them; None compares whole rows instead.
+validation_key = ["SchoolId", "StudentUniqueId", "EntryDate"]
+
+# Stop validating at the first column with missing values, rather than scanning every column of every chunk to report them all. Missing
+# values fail the run either way, so by default the whole table is validated and validation_report.json lists every violation; turn
+# this on to fail sooner on large runs.
+validation_fail_fast = False
+
+# Number of records buffered per batch while streaming downloads to disk
+ingest_batch_size = 50_000
+
+# Number of endpoints downloaded at the same time, and how often / how patiently a failed endpoint is retried
+download_max_workers = 3
+download_retries = 3
+download_backoff = 5.0  # seconds before the first retry, doubled on each further retry
+
+# Checkpoint the downloads, so a retry or the next attempt of the task continues a failed download instead of starting over
+download_resumable = True
+
+# How long a download may be reused from disk before it is downloaded again, in seconds, for the endpoints that rarely change
+download_cache_ttl = {"schools": 24 * 60 * 60}
+
+# Where the command line (cli.py) caches the outputs of the merge, transform and validate stages, the format of the cached tables, and
+# how many cached outputs are kept per stage
+cache_path = "data/koala_sis/cache"
+cache_format = "feather"
+cache_entries = 2
+
+# The file the pipeline logs to, once configure_logging has been called
+log_file = "pipeline.log"
+
+
+def configure_logging():
+    """
+    Send the log to log_file. Called when a pipeline task or main() actually runs, rather than when the pipeline is imported, so
+    parsing the DAG file doesn't set up logging. Does nothing if logging was already configured.
+    """
+    logging.basicConfig(filename=log_file, level=logging.INFO)
@@ -0,0 +1,188 @@
+import time  # Provides timing functions | used here to wait between retries
+import random  # Provides random numbers | used here to add jitter to the retry backoff
+import logging  # Provides a logging system for tracking the execution of the code | used here to log retries and failures
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)  # Runs callables on a pool of threads | used here to download the endpoints at the same time
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Type,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.ingest import (
+    DEFAULT_BATCH_SIZE,
+    stream_generator_to_storage,
+)  # Batched, streaming ingestion of the KoalaSis generators
+from koalasis.resumable import (
+    DEFAULT_CHECKPOINT_MAX_AGE,
+    cached_records,
+    download_resumable,
+)  # Checkpointed downloads | used here to continue a failed download where it stopped and to cache slowly-changing endpoints
+from koalasis.storage import (
+    TableStorage,
+)  # Pluggable table storage | used here as the destination of the downloads
+
+# The KoalaSis endpoints downloaded by the pipeline, keyed by the name of the table they are saved as
+ENDPOINTS = {
+    "students": "get_student_data",
+    "schools": "get_schools_data",
+    "enrollments": "get_enrollment_data",
+}
+
+
+def retry_with_backoff(
+    func: Callable,
+    retries: int = 3,
+    backoff: float = 1.0,
+    max_backoff: float = 60.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    description: str = "call",
+):
+    """
+    Call func, retrying it with exponential backoff if it raises.
+
+    The wait before retry number n is backoff * 2 ** (n - 1) seconds, capped at max_backoff, plus up to 10% of random jitter so that
+    several endpoints failing at the same moment don't all hit the API again at the same moment.
+
+    Args:
+        func (Callable): The function to call. It is called with no arguments.
+        retries (int): How many times to retry after the first failure. 0 disables retrying.
+        backoff (float): The wait before the first retry, in seconds.
+        max_backoff (float): The longest wait between two attempts, in seconds.
+        retry_on (Tuple[Type[BaseException], ...]): The exception types that trigger a retry. Anything else is raised straight away.
+        description (str): A short description of the call used in log messages.
+
+    Returns:
+        The return value of func.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except retry_on as e:
+            if attempt >= retries:
+                logging.error(f"{description} failed after {attempt + 1} attempts: {e}")
+                raise
+
+            wait = min(backoff * 2**attempt, max_backoff)
+            wait += random.uniform(0, wait * 0.1)
+            attempt += 1
+            logging.warning(
+                f"{description} failed ({e}), retry {attempt}/{retries} in {wait:.1f}s"
+            )
+            time.sleep(wait)
+
+
+def download_endpoint(
+    client,
+    name: str,
+    storage: TableStorage,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    retries: int = 3,
+    backoff: float = 1.0,
+    resumable: bool = False,
+    cache_ttl: Optional[float] = None,
+    checkpoint_max_age: float = DEFAULT_CHECKPOINT_MAX_AGE,
+) -> int:
+    """
+    Download one KoalaSis endpoint into the table called name of storage, retrying only this endpoint if it fails.
+
+    Every attempt asks the client for a fresh generator, because a generator that raised can't be resumed. The storage writer
+    only moves the file into place once a download completes, so a failed attempt never leaves a partial file behind.
+
+    With resumable, the pages downloaded before a failure are kept on disk with a checkpoint, and the next attempt (a retry here or a
+    later run of the task) continues after them instead of starting over (see resumable.py).
+
+    Args:
+        client: A KoalaSisDataClient, or any object with the same get_*_data methods.
+        name (str): The endpoint to download, one of the keys of ENDPOINTS.
+        storage (TableStorage): The storage the table is written to.
+        batch_size (int): The number of records buffered per batch.
+        retries (int): How many times to retry the endpoint after a failure.
+        backoff (float): The wait before the first retry, in seconds.
+        resumable (bool): Checkpoint the download so a failed attempt can be continued.
+        cache_ttl (Optional[float]): Reuse the table already on disk if it was downloaded less than cache_ttl seconds ago.
+        checkpoint_max_age (float): With resumable, ignore checkpoints older than this, in seconds.
+
+    Returns:
+        int: The number of records written.
+    """
+    if cache_ttl is not None:
+        records = cached_records(storage, name, cache_ttl)
+        if records is not None:
+            logging.info(f"Using the cached download of {name} ({records} records)")
+            return records
+
+    get_data = getattr(client, ENDPOINTS[name])
+
+    if resumable or cache_ttl is not None:
+        # A cached endpoint is downloaded resumably too, since that also records when it was downloaded
+        download = lambda: download_resumable(
+            get_data, storage, name, batch_size, max_age=checkpoint_max_age
+        )
+    else:
+        download = lambda: stream_generator_to_storage(
+            get_data(), storage, name, batch_size
+        )
+
+    return retry_with_backoff(
+        download,
+        retries=retries,
+        backoff=backoff,
+        description=f"Downloading {name}",
+    )
+
+
+def download_all(
+    client,
+    storage: TableStorage,
+    max_workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    retries: int = 3,
+    backoff: float = 1.0,
+    resumable: bool = False,
+    cache_ttls: Optional[Dict[str, float]] = None,
+) -> Dict[str, int]:
+    """
+    Download all the KoalaSis endpoints, running up to max_workers of them at the same time.
+
+    The downloads are I/O bound, so threads are enough to overlap them: the wall time becomes roughly that of the slowest endpoint
+    rather than the sum of all three. Each endpoint is retried on its own, so a transient API error on one of them doesn't restart
+    the others. If an endpoint still fails once its retries are used up, the error is raised after the other downloads finish.
+
+    Args:
+        client: A KoalaSisDataClient, or any object with the same get_*_data methods.
+        storage (TableStorage): The storage the tables are written to.
+        max_workers (Optional[int]): The maximum number of concurrent downloads. Defaults to one per endpoint; 1 downloads sequentially.
+        batch_size (int): The number of records buffered per batch.
+        retries (int): How many times to retry each endpoint after a failure.
+        backoff (float): The wait before the first retry, in seconds.
+        resumable (bool): Checkpoint each download so a failed attempt can be continued (see download_endpoint).
+        cache_ttls (Optional[Dict[str, float]]): Time-to-live of the downloads that may be reused from disk, in seconds, keyed by
+            endpoint name, e.g. {"schools": 86400}.
+
+    Returns:
+        Dict[str, int]: The number of records written for each endpoint.
+    """
+    cache_ttls = cache_ttls or {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(ENDPOINTS)) as executor:
+        futures = {
+            name: executor.submit(
+                download_endpoint,
+                client,
+                name,
+                storage,
+                batch_size,
+                retries,
+                backoff,
+                resumable,
+                cache_ttls.get(name),
+            )
+            for name in ENDPOINTS
+        }
+
+    # Leaving the with block waits for every download, so the first failure is only raised once the other endpoints are on disk
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,166 @@
+"""
+Memory-optimized dtype plans for the pipeline tables.
+
+By default every id is an int64 and every string a Python object, so a school name, a grade or the academic year is stored as a separate
+Python string on every enrollment row. The compact plans in DTYPE_PLANS store each column in the smallest dtype that holds its values:
+
+- "category": low-cardinality strings (school names, grades, academic year, gender) become categoricals, which store each distinct
+  value once and an int8/int16 code per row.
+- "string": high-cardinality strings (names) become Arrow-backed strings, one contiguous buffer instead of a Python object per value.
+- "integer": ids are downcast to the smallest integer type that holds them, and become nullable integers (Int32, ...) rather than
+  floats when they have missing values.
+- datetime64[ns] dates stay datetimes, with NaT for missing values, rather than falling back to object.
+
+The plans are applied to each table as it is read, before the merge, so the merged table never exists in the wide default dtypes.
+"""
+
+import logging  # Provides a logging system for tracking the execution of the code | used here to log the memory report
+import pandas as pd  # 🐼
+from typing import (
+    Dict,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# Arrow-backed strings need pyarrow. Without it the "string" columns are left as Python objects.
+try:
+    import pyarrow  # noqa: F401
+
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:  # pragma: no cover - depends on the environment
+    STRING_DTYPE = "object"
+
+DATETIME_DTYPE = "datetime64[ns]"
+
+# The compact dtype of every known column, per table. "merged" names the columns of the merged table, after the renames of
+# merge_and_transform_data.
+DTYPE_PLANS = {
+    "students": {
+        "id": "integer",
+        "local_student_id": "integer",
+        "first_name": "string",
+        "last_name": "string",
+        "gender": "category",
+        "grade": "category",
+    },
+    "schools": {
+        "id": "integer",
+        "school_name": "category",
+        "start_date": DATETIME_DTYPE,
+        "end_date": DATETIME_DTYPE,
+        "start_grade": "category",
+        "end_grade": "category",
+    },
+    "enrollments": {
+        "id": "integer",
+        "student_id": "integer",
+        "school_id": "integer",
+        "enrollment_start_date": DATETIME_DTYPE,
+        "enrollment_end_date": DATETIME_DTYPE,
+        "grade": "category",
+        "academic_year": "category",
+        "notes": "string",
+    },
+    "merged": {
+        "StudentUniqueId": "integer",
+        "FirstName": "string",
+        "LastSurname": "string",
+        "grade": "category",
+        "Gender": "category",
+        "id": "integer",
+        "EnrollmentId": "integer",
+        "SchoolId": "integer",
+        "academic_year": "category",
+        "EntryDate": DATETIME_DTYPE,
+        "enrollment_end_date": DATETIME_DTYPE,
+        "notes": "string",
+        "NameOfInstitution": "category",
+        "start_grade": "category",
+        "end_grade": "category",
+        "start_date": DATETIME_DTYPE,
+        "end_date": DATETIME_DTYPE,
+    },
+}
+
+
+def downcast_integers(column: pd.Series) -> pd.Series:
+    """
+    Downcast an integer column to the smallest signed integer dtype that holds its values, as a nullable integer if it has missing
+    values.
+    """
+    if column.hasnans:
+        column = column.astype("Int64")
+    elif not pd.api.types.is_integer_dtype(column.dtype):
+        column = column.astype("int64")
+    return pd.to_numeric(column, downcast="integer")
+
+
+def apply_dtype_plan(df: pd.DataFrame, plan: Dict[str, str]) -> pd.DataFrame:
+    """
+    Cast the columns of df that appear in plan to their compact dtype. Columns already in that dtype are left as they are, so applying
+    a plan twice costs next to nothing.
+
+    Args:
+        df (pd.DataFrame): The table to cast.
+        plan (Dict[str, str]): Column name -> "integer", "string", "category" or a pandas dtype, e.g. one of DTYPE_PLANS.
+
+    Returns:
+        pd.DataFrame: A new DataFrame with the plan applied.
+    """
+    df = df.copy(deep=False)
+    for column, dtype in plan.items():
+        if column not in df.columns:
+            continue
+        if dtype == "integer":
+            df[column] = downcast_integers(df[column])
+        elif dtype == "string":
+            if df[column].dtype != STRING_DTYPE:
+                df[column] = df[column].astype(STRING_DTYPE)
+        elif dtype == "category":
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+        elif dtype == DATETIME_DTYPE:
+            if df[column].dtype != DATETIME_DTYPE:
+                df[column] = pd.to_datetime(df[column], errors="coerce").astype(
+                    DATETIME_DTYPE
+                )
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare the memory used by each column of a table before and after applying a dtype plan.
+
+    Returns:
+        pd.DataFrame: One row per column, plus a "total" row, with the dtype and bytes before and after and the share of memory saved.
+    """
+    report = pd.DataFrame(
+        {
+            "dtype_before": before.dtypes.astype(str),
+            "dtype_after": after.dtypes.astype(str),
+            "bytes_before": before.memory_usage(index=False, deep=True),
+            "bytes_after": after.memory_usage(index=False, deep=True),
+        }
+    )
+    report.loc["total"] = [
+        "",
+        "",
+        report["bytes_before"].sum(),
+        report["bytes_after"].sum(),
+    ]
+    report["saved"] = (1 - report["bytes_after"] / report["bytes_before"]).round(3)
+    return report
+
+
+def compact_table(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Apply the DTYPE_PLANS entry of the table called name to df, and with DEBUG logging log the memory saved per column.
+    """
+    compacted = apply_dtype_plan(df, DTYPE_PLANS[name])
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        # deep=True sizes every Python string of both tables, which costs about as much as the cast itself, so the report is only
+        # made when debugging
+        logging.debug(
+            f"Memory of {name} with the compact dtype plan:\n{memory_report(df, compacted).to_string()}"
+        )
+    return compacted
@@ -0,0 +1,206 @@
+"""
+Incremental (delta) conform.
+
+The DAG runs daily, but only a small fraction of enrollments change from one day to the next. Instead of re-merging and re-transforming
+the full history on every run, conform_incremental fingerprints every input row, compares the fingerprints with the ones stored by the
+previous run, and only sends the enrollments affected by a change through the transform. The results are upserted into the conformed
+table kept from the previous run, keyed by enrollment id.
+
+An enrollment is re-transformed when:
+- the enrollment itself is new or changed,
+- its student changed (e.g. a corrected name), or
+- its school changed (e.g. a new school end date).
+
+Enrollments that disappeared from the input, or whose student or school disappeared, are removed from the conformed table.
+
+Unchanged input rows are never re-transformed, so the state also records a version of the transform: a hash of its code and settings.
+A run with another version, e.g. the first run after a change to a transform was deployed, ignores the state and rebuilds it in full.
+"""
+
+import logging  # Provides a logging system for tracking the execution of the code | used here to report the size of each delta
+import os  # Provides functions for interacting with the operating system | used here to locate the version file in the state
+import numpy as np  # Provides fast array operations | used here for the row order of the result
+import pandas as pd  # 🐼
+from typing import (
+    Callable,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.resumable import (
+    read_json,
+    write_json_atomically,
+)  # Atomic JSON files | used here to store the version of the transform the state was built with
+
+from koalasis.storage import (
+    TableStorage,
+    apply_schema,
+)  # Pluggable table storage | used here to keep the previous run's fingerprints and conformed table
+
+# The column every output row is keyed by. The transform passed to conform_incremental must return it.
+KEY_COLUMN = "EnrollmentId"
+
+# The name of the table holding the previous run's conformed output in the state storage
+CONFORMED_STATE = "conformed"
+
+# The input tables that are fingerprinted, and the name their fingerprints are stored under
+FINGERPRINT_STATES = {
+    "students": "fingerprints_students",
+    "schools": "fingerprints_schools",
+    "enrollments": "fingerprints_enrollments",
+}
+
+# The file in the state directory that records the version of the transform the state was built with
+VERSION_FILE = "version.json"
+
+
+def fingerprint_rows(df: pd.DataFrame, key: str = "id") -> pd.DataFrame:
+    """
+    Hash every row of df to a single uint64, so two runs can be compared row by row without keeping the full previous input.
+
+    Args:
+        df (pd.DataFrame): The table to fingerprint.
+        key (str): The column identifying a row across runs.
+
+    Returns:
+        pd.DataFrame: One row per input row with the key column (renamed to "id") and its "fingerprint".
+    """
+    return pd.DataFrame(
+        {
+            "id": df[key].to_numpy(),
+            "fingerprint": pd.util.hash_pandas_object(df, index=False).to_numpy(),
+        }
+    )
+
+
+def changed_ids(current: pd.DataFrame, previous: pd.DataFrame) -> pd.Index:
+    """
+    Return the ids that were added, removed or whose fingerprint changed between previous and current.
+    """
+    added_or_removed = pd.Index(current["id"]).symmetric_difference(
+        pd.Index(previous["id"])
+    )
+
+    # An inner merge keeps the fingerprints as uint64; an outer merge would turn them into floats and lose precision
+    compared = current.merge(previous, on="id", suffixes=("", "_previous"))
+    modified = compared.loc[
+        compared["fingerprint"] != compared["fingerprint_previous"], "id"
+    ]
+    return added_or_removed.union(pd.Index(modified))
+
+
+def load_state(state: TableStorage, version: str = "") -> Optional[dict]:
+    """
+    Load the fingerprints and conformed table stored by the previous run, or None if there is no complete previous state or it was
+    built with another version of the transform.
+    """
+    names = list(FINGERPRINT_STATES.values()) + [CONFORMED_STATE]
+    if not all(state.exists(name) for name in names):
+        return None
+
+    stored = read_json(os.path.join(state.directory, VERSION_FILE)) or {}
+    if stored.get("version") != version:
+        logging.info(
+            f"Incremental conform: the state was built with transform version {stored.get('version')}, not {version}"
+        )
+        return None
+    return {name: state.read(name) for name in names}
+
+
+def save_state(
+    state: TableStorage, fingerprints: dict, conformed: pd.DataFrame, version: str = ""
+):
+    """
+    Store the fingerprints, conformed table and transform version of this run for the next one.
+
+    The conformed table is written after the fingerprints, so a run that fails part-way leaves a state that is at worst missing its
+    newest fingerprints; load_state then finds mismatching fingerprints and the affected rows are simply re-transformed. The version
+    is written last: until it is, a state left by a failed run with a new version is rebuilt in full.
+    """
+    for table, df in fingerprints.items():
+        state.write(df, FINGERPRINT_STATES[table])
+    state.write(conformed, CONFORMED_STATE)
+    write_json_atomically(
+        os.path.join(state.directory, VERSION_FILE), {"version": version}
+    )
+
+
+def conform_incremental(
+    students: pd.DataFrame,
+    schools: pd.DataFrame,
+    enrollments: pd.DataFrame,
+    transform: Callable[[pd.DataFrame, pd.DataFrame, pd.DataFrame], pd.DataFrame],
+    state: TableStorage,
+    force_full: bool = False,
+    version: str = "",
+    order: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Conform the input tables, re-transforming only the enrollments affected by a change since the previous run.
+
+    If there is no previous state, it was built with another version, or force_full is set, every enrollment is transformed and the
+    state is rebuilt from scratch.
+
+    The rows of the result are in the given order, or sorted by KEY_COLUMN without one, so a full and an incremental run over the same
+    input return identical tables.
+
+    Args:
+        students (pd.DataFrame): The students table.
+        schools (pd.DataFrame): The schools table.
+        enrollments (pd.DataFrame): The enrollments table.
+        transform (Callable[[pd.DataFrame, pd.DataFrame, pd.DataFrame], pd.DataFrame]): Merges and transforms (students, schools,
+            enrollments) into output rows that include KEY_COLUMN, e.g. merge_and_transform_data with keep_enrollment_id=True.
+        state (TableStorage): Where the previous run's fingerprints and conformed table are stored.
+        force_full (bool): Ignore the previous state and transform every enrollment.
+        version (str): The version of transform, e.g. a hash of its code and settings. A state built with another version is ignored.
+        order (Optional[np.ndarray]): The KEY_COLUMN values of the result in the order to return them, e.g. the order a full transform
+            returns them in. Every row of the result must be listed.
+
+    Returns:
+        pd.DataFrame: The conformed table, including KEY_COLUMN.
+    """
+    fingerprints = {
+        "students": fingerprint_rows(students),
+        "schools": fingerprint_rows(schools),
+        "enrollments": fingerprint_rows(enrollments),
+    }
+
+    previous = None if force_full else load_state(state, version)
+
+    if previous is None:
+        logging.info("Incremental conform: no usable previous state, full rebuild")
+        conformed = transform(students, schools, enrollments)
+    else:
+        changed_students, changed_schools, changed_enrollments = (
+            changed_ids(fingerprints[table], previous[name])
+            for table, name in FINGERPRINT_STATES.items()
+        )
+
+        affected = (
+            enrollments["id"].isin(changed_enrollments)
+            | enrollments["student_id"].isin(changed_students)
+            | enrollments["school_id"].isin(changed_schools)
+        )
+        affected_ids = changed_enrollments.union(
+            pd.Index(enrollments.loc[affected, "id"])
+        )
+
+        logging.info(
+            f"Incremental conform: {affected.sum()} of {len(enrollments)} enrollments to re-transform, "
+            f"{len(changed_students)} students and {len(changed_schools)} schools changed"
+        )
+
+        delta = transform(students, schools, enrollments[affected])
+        kept = previous[CONFORMED_STATE]
+        kept = kept[~kept[KEY_COLUMN].isin(affected_ids)]
+
+        conformed = pd.concat([kept, delta])
+
+    # Casting to the stored schema gives the same dtypes whether a row was just transformed or read back from the previous state
+    conformed = apply_schema(conformed, state.schemas.get(CONFORMED_STATE, {}))
+    if order is None:
+        conformed = conformed.sort_values(KEY_COLUMN, kind="stable")
+    else:
+        conformed = conformed.take(pd.Index(conformed[KEY_COLUMN]).get_indexer(order))
+    conformed = conformed.reset_index(drop=True)
+    save_state(state, fingerprints, conformed, version)
+    return conformed
@@ -0,0 +1,172 @@
+"""
+Streaming ingestion of the KoalaSis API pages.
+
+The KoalaSis client yields the records of an endpoint as a generator of JSON pages. process_data_generator_to_dataframe (see
+pipeline.py) collects every page into one list before building a DataFrame, so its memory grows with the size of the download.
+Here the pages are decoded one at a time and their records buffered until batch_size of them are collected, and each batch is turned
+into a DataFrame and appended to the table in storage before the next pages are read. The memory held is bounded by the batch size,
+whatever the size of the download.
+
+iter_page_batches only cuts batches between pages, so a resumable download (see resumable.py) knows which page to restart from.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to split output paths
+import json  # Provides functions for working with JSON data | used here as the fallback decoder for API pages
+import logging  # Provides a logging system for tracking the execution of the code | used here to report ingestion progress
+import pandas as pd  # 🐼
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    Union,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.storage import (
+    CsvStorage,
+    TableStorage,
+)  # Pluggable table storage | used here as the destination of the streamed batches
+
+# orjson decodes JSON several times faster than the standard library. It is optional: when it isn't installed we fall back to json.loads,
+# which produces the same Python objects.
+try:
+    import orjson
+
+    decode_json = orjson.loads
+except ImportError:  # pragma: no cover - depends on the environment
+    decode_json = json.loads
+
+
+# Number of records held in memory before a batch is handed on. Peak memory of the ingester is bounded by this value, not by the
+# size of the whole download.
+DEFAULT_BATCH_SIZE = 50_000
+
+
+def page_to_records(page: Union[list, dict]) -> List[dict]:
+    """
+    Turn one decoded API page into a list of records.
+
+    The KoalaSis client yields one JSON document per page. process_data_generator_to_dataframe hands each page to pd.DataFrame, which
+    accepts either a list of records or a dict of equally long columns, so both shapes are accepted here as well.
+
+    Args:
+        page (Union[list, dict]): A decoded page.
+
+    Returns:
+        List[dict]: The records in the page.
+    """
+    if isinstance(page, dict):
+        return [dict(zip(page.keys(), row)) for row in zip(*page.values())]
+    return page
+
+
+def iter_dataframe_batches(
+    data_generator: Iterable[Union[str, bytes]], batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Consume a KoalaSis data generator and yield its records as DataFrames of at most batch_size rows.
+
+    Unlike process_data_generator_to_dataframe, the generator is never materialized into a list. Pages are decoded one at a time and
+    their records collected into a buffer; every time the buffer reaches batch_size it is turned into a single DataFrame and released.
+
+    Args:
+        data_generator (Iterable[Union[str, bytes]]): A generator of JSON pages, as returned by KoalaSisDataClient.
+        batch_size (int): The number of records per yielded DataFrame.
+
+    Yields:
+        pd.DataFrame: The next batch of records.
+    """
+    buffer = []
+
+    for data in data_generator:
+        buffer.extend(page_to_records(decode_json(data)))
+
+        while len(buffer) >= batch_size:
+            yield pd.DataFrame.from_records(buffer[:batch_size])
+            del buffer[:batch_size]
+
+    if buffer:
+        yield pd.DataFrame.from_records(buffer)
+
+
+def iter_page_batches(
+    data_generator: Iterable[Union[str, bytes]], batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Like iter_dataframe_batches, but only cut batches between pages, so every batch holds a whole number of pages.
+
+    This is what a resumable download needs: the number of pages consumed so far is exactly the page to restart from.
+
+    Args:
+        data_generator (Iterable[Union[str, bytes]]): A generator of JSON pages, as returned by KoalaSisDataClient.
+        batch_size (int): The number of records after which a batch is yielded, at the end of the page that reaches it.
+
+    Yields:
+        Tuple[int, pd.DataFrame]: The number of pages in the batch, and the batch of records.
+    """
+    buffer = []
+    pages = 0
+
+    for data in data_generator:
+        buffer.extend(page_to_records(decode_json(data)))
+        pages += 1
+
+        if len(buffer) >= batch_size:
+            yield pages, pd.DataFrame.from_records(buffer)
+            buffer = []
+            pages = 0
+
+    if pages:
+        yield pages, pd.DataFrame.from_records(buffer)
+
+
+def stream_generator_to_storage(
+    data_generator: Iterable[Union[str, bytes]],
+    storage: TableStorage,
+    name: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Stream a KoalaSis data generator into the table called name of storage, one batch at a time.
+
+    Each batch is appended to the table as soon as it is complete. The storage writer only publishes the table once the generator is
+    exhausted, so a failed download never leaves a partial file behind.
+
+    Args:
+        data_generator (Iterable[Union[str, bytes]]): A generator of JSON pages, as returned by KoalaSisDataClient.
+        storage (TableStorage): The storage to write to, e.g. ParquetStorage or CsvStorage.
+        name (str): The table to write, e.g. "students".
+        batch_size (int): The number of records written per batch.
+
+    Returns:
+        int: The number of records written.
+    """
+    with storage.open_writer(name) as writer:
+        for batch in iter_dataframe_batches(data_generator, batch_size):
+            writer.write(batch)
+
+    logging.info(f"Wrote {writer.rows_written} records to {storage.path(name)}")
+    return writer.rows_written
+
+
+def stream_generator_to_csv(
+    data_generator: Iterable[Union[str, bytes]],
+    path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Stream a KoalaSis data generator to a CSV file, one batch at a time. See stream_generator_to_storage.
+
+    Args:
+        data_generator (Iterable[Union[str, bytes]]): A generator of JSON pages, as returned by KoalaSisDataClient.
+        path (str): The CSV file to write.
+        batch_size (int): The number of records written per batch.
+
+    Returns:
+        int: The number of records written.
+    """
+    directory, filename = os.path.split(path)
+    name, _ = os.path.splitext(filename)
+    return stream_generator_to_storage(
+        data_generator, CsvStorage(directory), name, batch_size
+    )
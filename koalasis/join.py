@@ -0,0 +1,200 @@
+"""
+Hash join of the enrollments fact table with its dimension tables.
+
+Merging students, enrollments and schools with two chained DataFrame.merge calls materializes a wide intermediate table holding every
+column of all three tables, including duplicated id columns and the notes, most of which are thrown away by the final projection.
+
+Here each dimension table is projected to the columns the output needs and indexed on its id once, as a DimensionIndex. The join then
+maps every enrollment's foreign key through the index to a row position and takes the projected columns at those positions, so no
+column that isn't needed is ever copied. The indexes only depend on the dimension tables, so they are built once and reused by every
+chunk of the chunked conform and every delta of the incremental conform.
+
+Enrollments whose student or school is missing are left out of the result, as with an inner join, but counted in a JoinReport rather
+than dropped silently. The validation takes its counts of unmatched enrollments from the JoinReport of the merge (see
+DataValidator.update_join), which also logs them as warnings, so the keys aren't looked up a second time.
+"""
+
+import numpy as np  # Provides fast array operations | used here to combine the row positions of the matched enrollments
+import pandas as pd  # 🐼
+from dataclasses import (
+    dataclass,
+    field,
+)  # Generates boilerplate for data-holding classes | used here for the join report
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# How many unmatched key values are kept per foreign key in the report
+DEFAULT_SAMPLE_SIZE = 5
+
+
+class DimensionIndex:
+    """
+    A dimension table projected to the columns a join needs and indexed on its key.
+
+    Args:
+        table (pd.DataFrame): The dimension table, e.g. students.
+        columns (Dict[str, str]): The columns to keep, mapped to their name in the join result.
+        key (str): The column the fact table's foreign key refers to. Its values must be unique.
+    """
+
+    def __init__(self, table: pd.DataFrame, columns: Dict[str, str], key: str = "id"):
+        self.index = pd.Index(table[key])
+        if not self.index.is_unique:
+            duplicated = self.index[self.index.duplicated()].unique().tolist()
+            raise ValueError(
+                f"The {key} column of the dimension table must be unique, found duplicates such as {duplicated[:DEFAULT_SAMPLE_SIZE]}"
+            )
+        self.columns = (
+            table[list(columns)].rename(columns=columns).reset_index(drop=True)
+        )
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def positions(self, keys: pd.Series) -> np.ndarray:
+        """
+        Return the row position of every key in the dimension table, or -1 for keys it doesn't contain.
+        """
+        return self.index.get_indexer(keys)
+
+    def take(self, positions: np.ndarray) -> pd.DataFrame:
+        return self.columns.take(positions).reset_index(drop=True)
+
+
+@dataclass
+class JoinReport:
+    """
+    The number of fact rows joined, and the number left out per foreign key because the key has no match.
+
+    A row with several unmatched keys is counted under each of them.
+    """
+
+    rows_in: int = 0
+    rows_out: int = 0
+    unmatched_counts: Dict[str, int] = field(default_factory=dict)
+    unmatched_samples: Dict[str, list] = field(default_factory=dict)
+
+    def warnings(self) -> List[str]:
+        return [
+            f"{count} of {self.rows_in} rows dropped by the join: no match for {column} "
+            f"(e.g. {self.unmatched_samples[column]})"
+            for column, count in self.unmatched_counts.items()
+            if count
+        ]
+
+    def add(self, other: "JoinReport", sample_size: int = DEFAULT_SAMPLE_SIZE):
+        """
+        Add the counts and samples of other, e.g. the report of the next chunk of the same fact table.
+        """
+        self.rows_in += other.rows_in
+        self.rows_out += other.rows_out
+        for column, count in other.unmatched_counts.items():
+            self.unmatched_counts[column] = self.unmatched_counts.get(column, 0) + count
+            samples = self.unmatched_samples.setdefault(column, [])
+            samples.extend(
+                value
+                for value in other.unmatched_samples.get(column, [])
+                if value not in samples
+            )
+            del samples[sample_size:]
+
+
+def match_keys(
+    facts: pd.DataFrame,
+    dimensions: Dict[str, DimensionIndex],
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray, JoinReport]:
+    """
+    Look up every foreign key of facts in its dimension index.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], np.ndarray, JoinReport]: The row positions in each dimension table (-1 where unmatched), keyed by
+            foreign key, a mask of the fact rows matched on every key, and the report of the unmatched keys.
+    """
+    report = JoinReport(rows_in=len(facts))
+
+    positions = {}
+    matched = np.ones(len(facts), dtype=bool)
+    for column, dimension in dimensions.items():
+        positions[column] = dimension.positions(facts[column])
+        unmatched = positions[column] < 0
+        report.unmatched_counts[column] = int(unmatched.sum())
+        report.unmatched_samples[column] = (
+            facts.loc[unmatched, column].unique()[:sample_size].tolist()
+        )
+        matched &= ~unmatched
+
+    report.rows_out = int(matched.sum())
+    return positions, matched, report
+
+
+def check_references(
+    facts: pd.DataFrame,
+    dimensions: Dict[str, DimensionIndex],
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+) -> JoinReport:
+    """
+    Return the JoinReport join_dimensions would give for facts, without joining them: the rows it would drop for a key with no match.
+    """
+    return match_keys(facts, dimensions, sample_size)[2]
+
+
+def joined_rows(
+    positions: Dict[str, np.ndarray],
+    matched: np.ndarray,
+    order_by: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Return the positions of the fact rows join_dimensions keeps, in the order it returns them, from the output of match_keys.
+    """
+    rows = np.flatnonzero(matched)
+    if order_by is not None:
+        rows = rows[np.argsort(positions[order_by][rows], kind="stable")]
+    return rows
+
+
+def join_dimensions(
+    facts: pd.DataFrame,
+    fact_columns: Dict[str, str],
+    dimensions: Dict[str, DimensionIndex],
+    order_by: Optional[str] = None,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+) -> Tuple[pd.DataFrame, JoinReport]:
+    """
+    Inner join a fact table with dimension tables through their indexes.
+
+    Args:
+        facts (pd.DataFrame): The fact table, e.g. enrollments.
+        fact_columns (Dict[str, str]): The fact columns to keep, mapped to their name in the result.
+        dimensions (Dict[str, DimensionIndex]): The dimension index each foreign key column of facts is looked up in, e.g.
+            {"student_id": students_index}.
+        order_by (Optional[str]): A foreign key whose dimension table order the result follows, with the facts of one dimension row
+            in their original order. This gives the row order of a chain of DataFrame.merge calls starting from that dimension table.
+            By default the facts keep their own order.
+        sample_size (int): How many unmatched key values to keep per foreign key in the report.
+
+    Returns:
+        Tuple[pd.DataFrame, JoinReport]: The joined rows, with the fact columns first and then the columns of each dimension in the
+            order of dimensions, and the report of the join. The unmatched keys are only reported, not logged: validation logs them.
+    """
+    positions, matched, report = match_keys(facts, dimensions, sample_size)
+    rows = joined_rows(positions, matched, order_by)
+
+    joined = pd.concat(
+        [
+            facts[list(fact_columns)]
+            .take(rows)
+            .reset_index(drop=True)
+            .rename(columns=fact_columns)
+        ]
+        + [
+            dimension.take(positions[column][rows])
+            for column, dimension in dimensions.items()
+        ],
+        axis=1,
+    )
+    return joined, report
@@ -0,0 +1,318 @@
+"""
+Per-stage instrumentation for the pipeline.
+
+Wrapping a function with @instrumented_stage(), or a block of code with measure_stage(), records for each run of the stage:
+
+- wall time and CPU time,
+- the peak resident set size of the process at the end of the stage, and how much the stage raised it,
+- the number of rows going in and coming out, when they are DataFrames.
+
+Every record is logged as one JSON line on the "koalasis.metrics" logger and handed to the configured sinks: a Prometheus textfile
+(for node_exporter's textfile collector) and/or a StatsD server. Setting profile_stage runs that one stage under cProfile and saves
+the profile next to a summary of the slowest calls in the log.
+
+Sinks and profiling are configured with configure_metrics(), or from the environment when it isn't called:
+
+- KOALASIS_METRICS_TEXTFILE: path of the Prometheus textfile to write.
+- KOALASIS_STATSD: host:port of a StatsD server.
+- KOALASIS_PROFILE_STAGE: name of the stage to profile; KOALASIS_PROFILE_DIR: where to save the profile (default "profiles").
+"""
+
+import cProfile  # Provides a deterministic profiler | used here to profile one chosen stage
+import functools  # Provides tools for working with functions | used here to keep the wrapped function's name and docstring
+import io  # Provides in-memory text streams | used here to capture the profile summary
+import json  # Provides functions for working with JSON data | used here to log the metrics as JSON lines
+import logging  # Provides a logging system for tracking the execution of the code | used here to emit the metrics
+import os  # Provides functions for interacting with the operating system | used here to read the configuration and write files
+import pstats  # Formats cProfile results | used here to summarize the profiled stage
+import socket  # Provides network sockets | used here to send metrics to StatsD over UDP
+import sys  # Provides system-specific parameters | used here to detect the unit of ru_maxrss
+import threading  # Provides thread synchronization | used here to guard the sinks against concurrent downloads
+import time  # Provides timing functions | used here to measure wall and CPU time
+from contextlib import (
+    contextmanager,
+)  # Turns a generator into a context manager | used here for measure_stage
+from dataclasses import (
+    asdict,
+    dataclass,
+)  # Generates boilerplate for data-holding classes | used here for the stage records
+from typing import (
+    Dict,
+    List,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+try:
+    import resource  # Unix only
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None
+
+logger = logging.getLogger("koalasis.metrics")
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_mb: Optional[float]
+    rss_growth_mb: Optional[float]
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    status: str = "ok"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Return the peak resident set size of this process so far, in MiB, or None where it isn't available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def count_rows(value) -> Optional[int]:
+    """
+    Count the rows in a stage's input or output: a DataFrame, a tuple of DataFrames, or a dict of row counts.
+    """
+    if hasattr(value, "shape") and len(getattr(value, "shape", ())) == 2:
+        return int(value.shape[0])
+    if isinstance(value, tuple):
+        counts = [count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    if (
+        isinstance(value, dict)
+        and value
+        and all(isinstance(v, int) for v in value.values())
+    ):
+        return sum(value.values())
+    return None
+
+
+class PrometheusTextfileSink:
+    """
+    Keeps the latest metrics of every stage in a Prometheus text-format file, for node_exporter's textfile collector.
+
+    The file is rewritten through a temporary file and a rename, so the collector never reads half a file.
+    """
+
+    GAUGES = {
+        "wall_seconds": "Wall time of the last run of the pipeline stage.",
+        "cpu_seconds": "CPU time of the last run of the pipeline stage.",
+        "peak_rss_mb": "Peak resident set size of the process after the pipeline stage, in MiB.",
+        "rows_out": "Rows produced by the last run of the pipeline stage.",
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self.latest: Dict[str, StageMetrics] = {}
+
+    def emit(self, metrics: StageMetrics):
+        self.latest[metrics.stage] = metrics
+
+        lines = []
+        for name, help_text in self.GAUGES.items():
+            lines.append(f"# HELP koalasis_stage_{name} {help_text}")
+            lines.append(f"# TYPE koalasis_stage_{name} gauge")
+            for stage, stage_metrics in sorted(self.latest.items()):
+                value = getattr(stage_metrics, name)
+                if value is not None:
+                    lines.append(f'koalasis_stage_{name}{{stage="{stage}"}} {value}')
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class StatsdSink:
+    """
+    Sends the metrics of every stage to a StatsD server over UDP: times as timers in milliseconds, the rest as gauges.
+    """
+
+    def __init__(self, host: str, port: int = 8125, prefix: str = "koalasis"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, metrics: StageMetrics):
+        name = f"{self.prefix}.{metrics.stage}"
+        lines = [
+            f"{name}.wall:{metrics.wall_seconds * 1000:.0f}|ms",
+            f"{name}.cpu:{metrics.cpu_seconds * 1000:.0f}|ms",
+        ]
+        if metrics.peak_rss_mb is not None:
+            lines.append(f"{name}.peak_rss_mb:{metrics.peak_rss_mb:.1f}|g")
+        if metrics.rows_out is not None:
+            lines.append(f"{name}.rows:{metrics.rows_out}|g")
+
+        try:
+            self.socket.sendto("\n".join(lines).encode(), self.address)
+        except OSError as e:
+            # Metrics must never fail the pipeline
+            logger.warning(f"Could not send metrics to StatsD: {e}")
+
+
+class MetricsConfig:
+    def __init__(self):
+        self.sinks: List = []
+        self.profile_stage: Optional[str] = None
+        self.profile_dir: str = "profiles"
+        self.configured = False
+        self.lock = threading.Lock()
+
+
+config = MetricsConfig()
+
+
+def configure_metrics(
+    textfile_path: Optional[str] = None,
+    statsd_address: Optional[str] = None,
+    profile_stage: Optional[str] = None,
+    profile_dir: str = "profiles",
+):
+    """
+    Configure where stage metrics are sent and which stage, if any, is profiled.
+
+    Args:
+        textfile_path (Optional[str]): Write a Prometheus textfile here.
+        statsd_address (Optional[str]): Send the metrics to the StatsD server at "host:port".
+        profile_stage (Optional[str]): Run the stage with this name under cProfile.
+        profile_dir (str): The directory the profile is saved to, as <stage>.prof.
+    """
+    sinks = []
+    if textfile_path:
+        sinks.append(PrometheusTextfileSink(textfile_path))
+    if statsd_address:
+        host, _, port = statsd_address.partition(":")
+        sinks.append(StatsdSink(host, int(port or 8125)))
+
+    config.sinks = sinks
+    config.profile_stage = profile_stage
+    config.profile_dir = profile_dir
+    config.configured = True
+
+
+def add_metrics_sink(sink):
+    """
+    Send stage metrics to sink as well, e.g. to collect them in a benchmark. sink needs an emit(metrics: StageMetrics) method.
+    """
+    ensure_configured()
+    with config.lock:
+        config.sinks.append(sink)
+
+
+def ensure_configured():
+    if not config.configured:
+        configure_metrics(
+            textfile_path=os.environ.get("KOALASIS_METRICS_TEXTFILE"),
+            statsd_address=os.environ.get("KOALASIS_STATSD"),
+            profile_stage=os.environ.get("KOALASIS_PROFILE_STAGE"),
+            profile_dir=os.environ.get("KOALASIS_PROFILE_DIR", "profiles"),
+        )
+
+
+def record(metrics: StageMetrics):
+    logger.info(json.dumps({"event": "stage_metrics", **asdict(metrics)}))
+    with config.lock:
+        for sink in config.sinks:
+            sink.emit(metrics)
+
+
+class StageResult:
+    """
+    Handed out by measure_stage so the measured block can report its output rows.
+    """
+
+    def __init__(self):
+        self.rows_out: Optional[int] = None
+
+
+@contextmanager
+def measure_stage(name: str, rows_in: Optional[int] = None):
+    """
+    Measure the block of code run inside the with statement as the stage called name.
+
+        with measure_stage("transform.gender", rows_in=len(df)) as result:
+            ...
+            result.rows_out = len(df)
+    """
+    ensure_configured()
+
+    profiler = None
+    if config.profile_stage == name:
+        profiler = cProfile.Profile()
+
+    result = StageResult()
+    status = "ok"
+    rss_before = peak_rss_mb()
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield result
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        rss_after = peak_rss_mb()
+
+        record(
+            StageMetrics(
+                stage=name,
+                wall_seconds=round(wall, 6),
+                cpu_seconds=round(cpu, 6),
+                peak_rss_mb=None if rss_after is None else round(rss_after, 1),
+                rss_growth_mb=(
+                    None if rss_after is None else round(rss_after - rss_before, 1)
+                ),
+                rows_in=rows_in,
+                rows_out=result.rows_out,
+                status=status,
+            )
+        )
+        if profiler is not None:
+            save_profile(name, profiler)
+
+
+def save_profile(name: str, profiler: cProfile.Profile):
+    os.makedirs(config.profile_dir, exist_ok=True)
+    path = os.path.join(config.profile_dir, f"{name}.prof")
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(20)
+    logger.info(f"Profile of stage {name} saved to {path}\n{summary.getvalue()}")
+
+
+def instrumented_stage(name: Optional[str] = None):
+    """
+    Decorator that measures every call of the function as a stage, named after the function unless name is given.
+
+    The input rows are counted from the DataFrame arguments and the output rows from the return value.
+    """
+
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = count_rows(tuple(args) + tuple(kwargs.values()))
+            with measure_stage(stage_name, rows_in=rows_in) as result:
+                value = func(*args, **kwargs)
+                result.rows_out = count_rows(value)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,456 @@
+"""
+Streaming, partitioned writers for the data mart output.
+
+BackgroundWriter hands the batches of a table to its writer on a background thread, through a bounded queue. Encoding and compressing a
+batch then overlaps with the work that produces the next one (the transform of the next chunk in the chunked conform, or the other
+output formats), and no more than max_pending batches wait in memory.
+
+PartitionedTableWriter writes a table as a directory with one or more part files per partition, e.g. per SchoolId and academic year:
+
+    student_demographics_and_enrollment.parquet/
+        _manifest.json
+        SchoolId=3/academic_year=2022-2023/part-<run id>-00000.parquet
+        ...
+
+Every part file is written to a temporary file and renamed into place as soon as it is complete (see storage.TableWriter), and the
+manifest, which lists every part file of the table with its partition, row count and BLAKE2b checksum, is written last with the same
+temporary file + rename. The manifest is the commit point: readers that go through it (read_partitioned_table) always see a complete
+table, either the previous one or the new one, and can read only the partitions they need. The files of the previous table are removed
+once the new manifest is in place; a run that fails leaves the previous table and its manifest untouched.
+
+SingleFileTableWriter writes an unpartitioned table as one file, published the same way by storage.TableWriter, and then a manifest
+next to it (student_demographics_and_enrollment.parquet.manifest.json) with the same row count and checksum, so read_partitioned_table
+reads and verifies both kinds of table. The file is renamed into place just before its manifest is written, so for that moment a
+reader with verify=True sees a checksum mismatch rather than a table that doesn't match its manifest.
+"""
+
+import logging  # Provides a logging system for tracking the execution of the code | used here to log the published tables
+import os  # Provides functions for interacting with the operating system | used here to lay out and clean up the partition directories
+import queue  # Provides thread-safe queues | used here to pass the batches to the background thread
+import threading  # Provides threads | used here to write the batches in the background
+import uuid  # Generates unique ids | used here to name the files of each run apart from those of the previous run
+from datetime import (
+    datetime,
+    timezone,
+)  # Provides date and time types | used here to record when a table was published
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+import numpy as np  # Provides fast array operations | used here to sort the rows of a batch by partition
+import pandas as pd  # 🐼
+
+from koalasis.resumable import (
+    read_json,
+    write_json_atomically,
+)  # Atomic JSON files | used here to publish the manifest
+from koalasis.stage_graph import (
+    content_hash,
+)  # BLAKE2b content hashes of files | used here as the checksums in the manifest
+from koalasis.storage import (
+    TableWriter,
+    apply_schema,
+    get_storage,
+)  # Pluggable Parquet / Feather / CSV table storage | used here to write and read the partition files
+
+MANIFEST_FILE = "_manifest.json"
+
+# Appended to the path of a single file table for the path of its manifest
+SINGLE_FILE_MANIFEST_SUFFIX = ".manifest.json"
+
+# Marks the end of the batches on the queue of a BackgroundWriter
+_DONE = object()
+
+
+class BackgroundWriter:
+    """
+    Writes the batches given to write with writer on a background thread.
+
+    Use it as a context manager in place of writer: it enters writer, and on exit waits for the pending batches to be written before
+    exiting writer, which publishes the table. If writing a batch fails, the error is raised by the next write or on exit, and writer
+    discards the table.
+
+    Args:
+        writer: The writer to write with, a storage.TableWriter or a PartitionedTableWriter.
+        max_pending (int): The number of batches that may wait for the background thread; write blocks while the queue is full.
+    """
+
+    def __init__(self, writer, max_pending: int = 2):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(
+            target=self._run, name=f"BackgroundWriter({writer.path})", daemon=True
+        )
+
+    @property
+    def path(self) -> str:
+        return self.writer.path
+
+    @property
+    def rows_written(self) -> int:
+        return self.writer.rows_written
+
+    def __enter__(self):
+        self.writer.__enter__()
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _DONE:
+                return
+            # After an error the remaining batches are only taken off the queue, so write never blocks on a full queue
+            if self.error is None:
+                try:
+                    self.writer.write(batch)
+                except BaseException as e:
+                    self.error = e
+
+    def write(self, batch: pd.DataFrame):
+        """
+        Queue batch to be written. The batch must not be modified afterwards.
+        """
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.queue.put(_DONE)
+        self.thread.join()
+        if exc_type is None and self.error is not None:
+            self.writer.__exit__(type(self.error), self.error, self.error.__traceback__)
+            raise self.error
+        return self.writer.__exit__(exc_type, exc, tb)
+
+
+def partition_directory(partition: Dict[str, object]) -> str:
+    return os.path.join(
+        *(
+            f"{column}={'null' if pd.isna(value) else value}"
+            for column, value in partition.items()
+        )
+    )
+
+
+def manifest_path(path: str) -> str:
+    """
+    The manifest of the table at path: MANIFEST_FILE in the directory of a partitioned table, or next to a single file table.
+    """
+    if os.path.isdir(path):
+        return os.path.join(path, MANIFEST_FILE)
+    return path + SINGLE_FILE_MANIFEST_SUFFIX
+
+
+def write_manifest(
+    path: str,
+    storage_format: str,
+    partition_by: List[str],
+    schema: Dict[str, str],
+    rows: int,
+    files: List[dict],
+    columns: Sequence[str] = (),
+):
+    """
+    Publish the manifest of the table at path, listing files with their path relative to the table's directory, partition, row count
+    and checksum. The schema is limited to the columns written, as the table needn't have every column of schema.
+    """
+    write_json_atomically(
+        manifest_path(path),
+        {
+            "format": storage_format,
+            "partition_by": partition_by,
+            "schema": {
+                column: dtype for column, dtype in schema.items() if column in columns
+            },
+            "published_at": datetime.now(timezone.utc).isoformat(),
+            "rows": rows,
+            "files": files,
+        },
+    )
+
+
+def json_value(value):
+    # Partition values come out of pandas as numpy scalars, which the json module can't serialize
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+class PartitionedTableWriter:
+    """
+    Writes one table as a directory with a file per partition, published through a manifest (see the module docstring).
+
+    Rows are routed to their partition as they are written, and buffered per partition until it has rows_per_write of them, or until
+    max_buffered_rows rows are buffered in all. Every flush of a partition's buffer is written as a part file of its own and closed
+    straight away, so no file is left open between flushes however many partitions the table has; a partition whose rows arrive over
+    several flushes holds several part files, all of them listed in the manifest.
+
+    Args:
+        storage_format (str): The format of the partition files ("parquet", "feather" or "csv").
+        path (str): The directory of the table.
+        partition_by (Sequence[str]): The columns of the table to partition by, outermost first.
+        schema (Optional[Dict[str, str]]): The dtypes the partition files are written with, as in storage.TABLE_SCHEMAS.
+        rows_per_write (int): The number of rows a partition buffers before they are written.
+        max_buffered_rows (int): The number of rows buffered over all partitions before they are all written.
+    """
+
+    def __init__(
+        self,
+        storage_format: str,
+        path: str,
+        partition_by: Sequence[str],
+        schema: Optional[Dict[str, str]] = None,
+        rows_per_write: int = 100_000,
+        max_buffered_rows: int = 1_000_000,
+    ):
+        self.storage_format = storage_format
+        self.path = path
+        self.partition_by = list(partition_by)
+        self.schema = schema or {}
+        self.rows_per_write = rows_per_write
+        self.max_buffered_rows = max_buffered_rows
+        self.file_name = f"part-{uuid.uuid4().hex[:16]}"
+        self.rows_written = 0
+        self.columns: List[str] = []
+        # The partition values of every part file written, in order
+        self._parts: List[Tuple[tuple, TableWriter]] = []
+        self._buffers: Dict[tuple, List[pd.DataFrame]] = {}
+        self._buffered_rows = 0
+
+    def __enter__(self):
+        if os.path.isfile(self.path):
+            raise FileExistsError(
+                f"{self.path} was written unpartitioned; remove it to write the table partitioned"
+            )
+        os.makedirs(self.path, exist_ok=True)
+        return self
+
+    def write(self, batch: pd.DataFrame):
+        if batch.empty:
+            return
+        # Cast the batch once here, rather than every slice of it in the writer of its partition
+        batch = apply_schema(batch, self.schema)
+        self.columns = self.columns or list(batch.columns)
+        keys = batch[self.partition_by]
+
+        # Sort the batch by partition once, so the rows of every partition are a slice of it rather than a copy
+        codes = (
+            keys.groupby(self.partition_by, sort=False, dropna=False)
+            .ngroup()
+            .to_numpy()
+        )
+        order = np.argsort(codes, kind="stable")
+        batch, keys = batch.take(order), keys.take(order)
+        starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+        ends = np.append(starts[1:], len(batch))
+
+        for start, end in zip(starts, ends):
+            values = tuple(json_value(value) for value in keys.iloc[start])
+            self._buffers.setdefault(values, []).append(batch.iloc[start:end])
+            self._buffered_rows += end - start
+            if sum(map(len, self._buffers[values])) >= self.rows_per_write:
+                self._flush(values)
+
+        if self._buffered_rows >= self.max_buffered_rows:
+            self._flush_all()
+        self.rows_written += len(batch)
+
+    def _flush(self, values: tuple):
+        pieces = self._buffers.pop(values)
+        rows = pieces[0] if len(pieces) == 1 else pd.concat(pieces)
+        self._buffered_rows -= len(rows)
+
+        name = f"{self.file_name}-{len(self._parts):05d}"
+        storage = get_storage(
+            self.storage_format,
+            os.path.join(
+                self.path, partition_directory(dict(zip(self.partition_by, values)))
+            ),
+            schemas={name: self.schema},
+        )
+        with storage.open_writer(name) as writer:
+            writer.write(rows)
+        self._parts.append((values, writer))
+
+    def _flush_all(self):
+        for values in list(self._buffers):
+            self._flush(values)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self._flush_all()
+                self._publish()
+                return False
+            except BaseException:
+                self._discard()
+                raise
+        self._discard()
+        return False
+
+    def _discard(self):
+        """
+        Remove every file of this run, whether or not it was renamed into place yet.
+        """
+        self._remove_files(lambda name: name.startswith(self.file_name))
+
+    def _publish(self):
+        files = [
+            {
+                "path": os.path.relpath(writer.path, self.path),
+                "partition": {
+                    column: json_value(value)
+                    for column, value in zip(self.partition_by, values)
+                },
+                "rows": writer.rows_written,
+                "blake2b": content_hash(writer.path),
+            }
+            for values, writer in self._parts
+        ]
+        write_manifest(
+            self.path,
+            self.storage_format,
+            self.partition_by,
+            self.schema,
+            self.rows_written,
+            files,
+            self.columns,
+        )
+        # The previous table's files are no longer in the manifest, so they can go
+        published = {os.path.basename(entry["path"]) for entry in files}
+        self._remove_files(
+            lambda name: name.startswith("part-") and name not in published
+        )
+        partitions = len({values for values, _ in self._parts})
+        logging.info(
+            f"Published {self.rows_written} rows in {len(files)} files over {partitions} partitions to {self.path}"
+        )
+
+    def _remove_files(self, matches):
+        """
+        Remove the files below path whose name matches, and the partition directories left empty.
+        """
+        for directory, _, names in os.walk(self.path, topdown=False):
+            for name in names:
+                if matches(name):
+                    os.remove(os.path.join(directory, name))
+            if directory != self.path and not os.listdir(directory):
+                os.rmdir(directory)
+
+
+class SingleFileTableWriter:
+    """
+    Writes one table as a single file with a storage.TableWriter, and publishes a manifest of it (see the module docstring).
+
+    Args:
+        storage_format (str): The format of the file ("parquet", "feather" or "csv").
+        writer (TableWriter): The writer of the file, from TableStorage.open_writer.
+    """
+
+    def __init__(self, storage_format: str, writer: TableWriter):
+        self.storage_format = storage_format
+        self.writer = writer
+        self.columns: List[str] = []
+
+    @property
+    def path(self) -> str:
+        return self.writer.path
+
+    @property
+    def rows_written(self) -> int:
+        return self.writer.rows_written
+
+    def __enter__(self):
+        if os.path.isdir(self.path):
+            raise FileExistsError(
+                f"{self.path} was written partitioned; remove it to write the table unpartitioned"
+            )
+        self.writer.__enter__()
+        return self
+
+    def write(self, batch: pd.DataFrame):
+        self.columns = self.columns or list(batch.columns)
+        self.writer.write(batch)
+
+    def __exit__(self, exc_type, exc, tb):
+        # Renames the file into place, or removes it if the table failed
+        self.writer.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            write_manifest(
+                self.path,
+                self.storage_format,
+                [],
+                self.writer.schema,
+                self.rows_written,
+                [
+                    {
+                        "path": os.path.basename(self.path),
+                        "partition": {},
+                        "rows": self.rows_written,
+                        "blake2b": content_hash(self.path),
+                    }
+                ],
+                self.columns,
+            )
+            logging.info(f"Published {self.rows_written} rows to {self.path}")
+        return False
+
+
+def read_manifest(path: str) -> Optional[dict]:
+    """
+    Return the manifest of the table at path, partitioned or a single file, or None if no table was published there.
+    """
+    return read_json(manifest_path(path))
+
+
+def read_partitioned_table(
+    path: str,
+    filters: Optional[Dict[str, List[object]]] = None,
+    columns: Optional[List[str]] = None,
+    verify: bool = False,
+) -> pd.DataFrame:
+    """
+    Read the table at path, as listed in its manifest: a partitioned table, or a single file table written by SingleFileTableWriter.
+
+    Args:
+        path (str): The directory of a partitioned table, or the file of a single file table.
+        filters (Optional[Dict[str, List[object]]]): Only read the partitions whose value of each listed column is among the listed
+            values, e.g. {"SchoolId": [3, 7]}. The files of the other partitions aren't opened.
+        columns (Optional[List[str]]): Only read these columns.
+        verify (bool): Check the checksum of every file read against the manifest, and raise ValueError on a mismatch.
+
+    Returns:
+        pd.DataFrame: The rows of the selected partitions.
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No manifest for {path}")
+
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    frames = []
+    for entry in manifest["files"]:
+        if filters and any(
+            entry["partition"].get(column) not in values
+            for column, values in filters.items()
+        ):
+            continue
+        file_path = os.path.join(directory, entry["path"])
+        if verify and content_hash(file_path) != entry["blake2b"]:
+            raise ValueError(f"Checksum mismatch for {file_path}")
+        name, _ = os.path.splitext(os.path.basename(file_path))
+        storage = get_storage(
+            manifest["format"],
+            os.path.dirname(file_path),
+            schemas={name: manifest["schema"]},
+        )
+        frames.append(storage.read(name, columns=columns))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,144 @@
+"""
+Multi-core transform stage.
+
+transform_in_parallel splits a DataFrame into partitions of whole key groups (whole schools, in the pipeline), transforms the
+partitions on a pool of worker processes and puts the results back together in the original row order, so the output is the same
+whichever number of workers is used.
+
+Partitions travel to and from the workers as Arrow IPC buffers when pyarrow is installed. Arrow stores a string column as one contiguous
+buffer, which is much cheaper to serialize than pickling every Python string object of a pandas object column.
+"""
+
+import numpy as np  # Provides fast array operations | used here to group row positions into partitions
+import pandas as pd  # 🐼
+from concurrent.futures import (
+    ProcessPoolExecutor,
+)  # Runs callables on a pool of processes | used here to run the transforms on several cores
+from functools import (
+    partial,
+)  # Binds arguments to a function | used here to send the transform to the workers with each partition
+from pandas.api.types import (
+    union_categoricals,
+)  # Combines categoricals with different categories | used here to give the partitions' categorical columns the same categories
+from typing import (
+    Callable,
+    List,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# pyarrow is optional: without it the partitions are pickled as DataFrames, which gives the same result, only slower
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+
+def plan_partitions(keys: pd.Series, partition_size: int) -> List[np.ndarray]:
+    """
+    Group the row positions of keys into partitions of roughly partition_size rows, never splitting the rows of one key.
+
+    Keys are taken in sorted order, so the plan only depends on the data, not on the order the rows arrive in.
+
+    Args:
+        keys (pd.Series): The partitioning key of every row, e.g. the SchoolId column.
+        partition_size (int): The target number of rows per partition.
+
+    Returns:
+        List[np.ndarray]: The row positions of each partition.
+    """
+    # Missing keys get a code of their own rather than -1, so every row lands in exactly one group
+    codes, _ = pd.factorize(keys, sort=True, use_na_sentinel=False)
+    order = np.argsort(codes, kind="stable")
+    group_sizes = np.bincount(codes)
+
+    partitions = []
+    start = 0
+    for group_end in np.cumsum(group_sizes):
+        if group_end - start >= partition_size:
+            partitions.append(order[start:group_end])
+            start = group_end
+    if start < len(order):
+        partitions.append(order[start:])
+    return partitions
+
+
+def to_ipc(df: pd.DataFrame):
+    """
+    Serialize df, index included, as an Arrow IPC stream (or leave it as is without pyarrow).
+    """
+    if pa is None:
+        return df
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def from_ipc(payload) -> pd.DataFrame:
+    """
+    The inverse of to_ipc.
+    """
+    if pa is None:
+        return payload
+    return pa.ipc.open_stream(payload).read_all().to_pandas()
+
+
+def run_partition(transform: Callable, output_columns: List[str], payload):
+    """
+    Transform one partition in a worker process. Only output_columns are sent back.
+    """
+    return to_ipc(transform(from_ipc(payload))[output_columns])
+
+
+def transform_in_parallel(
+    df: pd.DataFrame,
+    keys: pd.Series,
+    transform: Callable[[pd.DataFrame], pd.DataFrame],
+    output_columns: List[str],
+    workers: int,
+    partition_size: int = 250_000,
+) -> pd.DataFrame:
+    """
+    Run transform over df on a pool of worker processes, partitioned by keys.
+
+    transform must be picklable, e.g. a module-level function or a functools.partial of one, and must only depend on the rows of
+    its own partition.
+
+    Args:
+        df (pd.DataFrame): The columns transform needs. Send only those, to keep serialization small.
+        keys (pd.Series): The partitioning key of every row of df; rows with the same key are always transformed together.
+        transform (Callable[[pd.DataFrame], pd.DataFrame]): The transform applied to each partition.
+        output_columns (List[str]): The columns of the transform's result that are returned.
+        workers (int): The number of worker processes.
+        partition_size (int): The target number of rows per partition.
+
+    Returns:
+        pd.DataFrame: The output_columns of the transformed rows, indexed and ordered like df.
+    """
+    partitions = plan_partitions(keys, partition_size)
+    payloads = (to_ipc(df.iloc[positions]) for positions in partitions)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [
+            from_ipc(result)
+            for result in executor.map(
+                partial(run_partition, transform, output_columns), payloads
+            )
+        ]
+
+    if not results:
+        return df.iloc[:0].reindex(columns=output_columns)
+
+    # A categorical column's categories are inferred per partition, e.g. Gender (see pipeline.format_gender_column), and pd.concat
+    # turns categoricals with different categories into plain strings, so they are given the categories of all partitions first
+    for column in output_columns:
+        if isinstance(results[0][column].dtype, pd.CategoricalDtype):
+            dtype = pd.CategoricalDtype(
+                union_categoricals(
+                    [result[column] for result in results], sort_categories=True
+                ).categories
+            )
+            results = [result.astype({column: dtype}) for result in results]
+
+    # Every row keeps its index label through the round trip, so this restores the original order exactly
+    return pd.concat(results).reindex(df.index)
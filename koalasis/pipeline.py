@@ -0,0 +1,1345 @@
+import os  # Provides functions for interacting with the operating system | used here to create directories and manage file paths
+import sys  # Provides system-specific parameters | used here to hash the source code of this module
+import numpy as np  # Provides fast array operations | used here for vectorized business-day arithmetic
+import pandas as pd  # 🐼
+from pandas.tseries.offsets import (
+    BDay,
+)  # Provides business day offsets | used here to calculate the next school day for ExitWithdrawDate
+import json  # Provides functions for working with JSON data | used here to read the config file
+import logging  # Provides a logging system for tracking the execution of the code | used here to log progress and errors
+from datetime import (
+    datetime,
+    timedelta,
+)  # Provides classes for manipulating dates and times | used here for date calculations and transformations
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)  # Provides a way to specify a type that can be one of several types | used here for function argument typing
+import re  # Provides regular expression operations | used here to format names
+from collections import (
+    OrderedDict,
+)  # A dict that remembers insertion order | used here as a bounded LRU memo of formatted names
+from contextlib import (
+    ExitStack,
+)  # Manages a variable number of context managers | used here to keep one output writer open per output format
+from functools import (
+    partial,
+)  # Binds arguments to a function | used here to pass the transform options to the worker processes
+import string  # Provides common string operations | used here to format names
+from koalasis import (
+    config,
+    dtype_plan,
+    join,
+    parallel,
+)  # Settings of the pipeline, and the modules the merge and transforms run | used here for the paths, formats and tuning of every
+
+# stage, and to version the incremental conform's state
+from koalasis.download import (
+    download_all,
+    download_endpoint,
+)  # Concurrent, retrying download of the KoalaSis endpoints | used here to download students, schools and enrollments in parallel
+from koalasis.chunked import (
+    conform_in_chunks,
+)  # Chunked (out-of-core) conform | used here to stream enrollments through the conform when they don't fit in memory
+from koalasis.incremental import (
+    KEY_COLUMN,
+    conform_incremental,
+)  # Incremental (delta) conform | used here to re-transform only the enrollments that changed since the previous run
+from koalasis.join import (
+    DimensionIndex,
+    JoinReport,
+    check_references,
+    join_dimensions,
+    joined_rows,
+    match_keys,
+)  # Hash join of the enrollments with pre-indexed dimension tables | used here to merge only the columns the output needs
+from koalasis.parallel import (
+    transform_in_parallel,
+)  # Process-pool transform partitioned by a key column | used here to spread the transforms over several cores
+from koalasis.validation import (
+    DataValidationError,
+    DataValidator,
+    ValidationReport,
+)  # Chunk-friendly validation with structured reports | used here to check the conformed data
+from koalasis.metrics import (
+    instrumented_stage,
+    measure_stage,
+)  # Per-stage timing, memory and row-count metrics | used here to instrument every pipeline stage
+from koalasis.dtype_plan import (
+    DTYPE_PLANS,
+    apply_dtype_plan,
+    compact_table,
+)  # Memory-optimized dtype plans | used here to store the tables in categoricals, Arrow strings and downcast integers
+from koalasis.stages import (
+    OUTPUT_TABLE,
+    conformed_partition_name,
+)  # The stage graph of the pipeline | used here to name the output table and the conformed partitions its stages pass along
+from koalasis.output_writer import (
+    BackgroundWriter,
+    PartitionedTableWriter,
+    SingleFileTableWriter,
+)  # Streaming, partitioned output writers | used here to write the output table in the background and publish it atomically
+from koalasis.storage import (
+    OUTPUT_SCHEMA,
+    get_storage,
+)  # Pluggable Parquet / Feather / CSV table storage | used here to pass the tables between the pipeline stages
+from koalasis.stage_cache import (
+    cache_key,
+    code_version,
+)  # Hashes of settings and source code | used here to version the incremental conform's state
+
+
+def process_data_generator_to_dataframe(data_generator):
+
+    # A generator is a special type of iterable in Python, similar to a list or a tuple. However, unlike lists and tuples,
+    # generators do not store their items in memory. Instead, they generate each item on-the-fly as you iterate through them.
+    # This makes generators more memory-efficient for working with large data sets or when the entire collection doesn't need to be loaded into memory.
+
+    # converts the input generator object into a list by calling the list() function on the generator.
+    # The generator will yield each item (JSON string) one by one until it's exhausted, and these items will be collected into a list called data_list.
+
+    data_list = list(data_generator)
+
+    # list comprehension to loop through each JSON string in data_list and convert it into a Python dictionary using the json.loads() function.
+    # The resulting dictionaries are stored in the data_records list.
+
+    data_records = [json.loads(data) for data in data_list]
+
+    # list comprehension to create a list of pandas DataFrames, where each DataFrame is created from a dictionary in data_records.
+    # The pd.concat() function is then used to concatenate all these DataFrames into a single DataFrame.
+    # The ignore_index=True parameter tells pandas to reset the index of the resulting DataFrame,
+    # so the index values are continuous and don't repeat from the individual DataFrames.
+
+    return pd.concat([pd.DataFrame(data) for data in data_records], ignore_index=True)
+
+
+def make_client():
+    """
+    Build a KoalaSis client with config.credentials. The client module is only imported here, when a download actually runs.
+    """
+    from do_not_look.koala_sis_api import (
+        KoalaSisDataClient,
+    )  # A module for interacting with the KoalaSis API | used to download student, school, and enrollment data
+
+    return KoalaSisDataClient(config.credentials)
+
+
+@instrumented_stage()
+def download_data_to_csv(
+    client=None,
+    max_workers: Optional[int] = None,
+    retries: Optional[int] = None,
+):
+    """
+    Download data from the KoalaSis API and save it in config.input_path, in config.storage_format (Parquet by default).
+    The data includes students, schools, and enrollments information.
+
+    The three endpoints are downloaded concurrently and each one is retried with backoff on its own (see download.py),
+    so a transient API error on one endpoint doesn't restart the whole download. With config.download_resumable, the pages already written are
+    kept with a checkpoint, so a retry, or the next attempt of the task, continues from the page that failed. The endpoints listed in
+    config.download_cache_ttl are reused from disk while their last download is recent enough.
+
+    Args:
+        client: Optional client to download from. Defaults to a KoalaSisDataClient built from config.credentials; any object with the same
+            get_*_data methods, such as the FakeKoalaSisDataClient of tests/fake_koala_sis.py, can be passed instead.
+        max_workers (Optional[int]): The maximum number of concurrent downloads. Defaults to config.download_max_workers; 1 downloads sequentially.
+        retries (Optional[int]): How many times each endpoint is retried. Defaults to config.download_retries.
+
+    Returns:
+        dict: The number of records downloaded for each endpoint.
+    """
+    # Initialize the KoalaSis API client
+    if client is None:
+        client = make_client()
+
+    # In order to probe the api, we can start by using the help function 'help(client)'
+    # here this provides very useful information about the client and its methods
+
+    # help(client)
+
+    # something that was initially unexpected is that the client.get_student_data() method returns a generator object, so printing it will not return the data
+
+    ##print(client.get_student_data()) # returns <generator object KoalaSisDataClient._get_data at 0x7f4017ee59e0>
+
+    # The generators are streamed straight to disk in fixed-size batches by stream_generator_to_csv, so only one batch of records
+    # is held in memory at a time instead of the whole download (see ingest.py)
+
+    # Save the fetched data in the specified directory
+    return download_all(
+        client,
+        get_storage(config.storage_format, config.input_path),
+        max_workers=max_workers or config.download_max_workers,
+        batch_size=config.ingest_batch_size,
+        retries=config.download_retries if retries is None else retries,
+        backoff=config.download_backoff,
+        resumable=config.download_resumable,
+        cache_ttls=config.download_cache_ttl,
+    )
+
+
+@instrumented_stage()
+def read_csv_files() -> pd.DataFrame:
+    """
+    Read the students, schools, and enrollments tables from config.input_path, with every column. Despite the name, the tables are
+    read in config.storage_format, which is what download_data_to_csv writes them in; read_input_data is the pipeline's own reader.
+
+    Returns:
+        tuple: A tuple containing DataFrames for students, schools, and enrollments.
+    """
+    storage = get_storage(config.storage_format, config.input_path)
+    students = storage.read("students")
+    schools = storage.read("schools")
+    enrollments = storage.read("enrollments")
+    return students, schools, enrollments
+
+
+@instrumented_stage()
+def read_input_data(
+    columns: Optional[dict] = None,
+    compact: Optional[bool] = None,
+    filters: Optional[Dict[str, Dict[str, List[object]]]] = None,
+) -> tuple:
+    """
+    Read the students, schools, and enrollments tables from config.input_path, in config.storage_format.
+
+    Only the columns listed in config.input_columns are read by default. With Parquet and Feather the other columns are never read from disk,
+    and the files are memory mapped rather than copied into memory first.
+
+    Args:
+        columns (Optional[dict]): The columns to read per table. Defaults to config.input_columns; pass {} to read every column.
+        compact (Optional[bool]): Cast each table to its compact dtype plan as it is read, logging the memory saved per column at
+            DEBUG level. Defaults to config.compact_dtypes.
+        filters (Optional[dict]): The rows to read per table, as the values to keep per column, e.g.
+            {"enrollments": {"school_id": [3, 7]}}. With Parquet and Feather the other rows are skipped while the file is scanned.
+
+    Returns:
+        tuple: A tuple containing DataFrames for students, schools, and enrollments.
+    """
+    filters = filters or {}
+    columns = config.input_columns if columns is None else columns
+    compact = config.compact_dtypes if compact is None else compact
+    storage = get_storage(config.storage_format, config.input_path)
+
+    tables = []
+    for name in ["students", "schools", "enrollments"]:
+        table = storage.read(name, columns=columns.get(name), filters=filters.get(name))
+        tables.append(compact_table(table, name) if compact else table)
+    return tuple(tables)
+
+
+def format_gender(gender: str) -> str:
+    """
+    The function then uses the get() method on the gender_map dictionary to look up the short-form representation of the input gender.
+    If the input gender is not found in the dictionary keys ( not 'male' or 'female'), the get() method will return a default value 'X'.
+    This is specified as the second argument of the get() method.
+
+    """
+    gender_map = {"male": "M", "female": "F"}
+    return gender_map.get(gender, "X")
+
+
+def format_gender_column(genders: pd.Series) -> pd.Series:
+    """
+    Vectorized version of format_gender.
+
+    format_gender is run once per distinct gender, missing values included, and the result is a categorical column of the short codes,
+    so a categorical Gender column is never expanded into one Python string per row.
+
+    Args:
+        genders (pd.Series): The Gender column.
+
+    Returns:
+        pd.Series: The formatted genders as a categorical column, indexed like the input column.
+    """
+    codes, uniques = pd.factorize(genders)
+    # format_gender maps a missing gender to "X" like any other unknown value, so code -1 picks format_gender(None) from the end
+    formatted = [format_gender(gender) for gender in uniques] + [format_gender(None)]
+    return pd.Series(
+        pd.Categorical(np.array(formatted, dtype=object)[codes]),
+        index=genders.index,
+        name=genders.name,
+    )
+
+
+def calculate_exit_withdraw_date(
+    enrollment_end_date: Union[str, pd.Timestamp],
+    school_end_date: Union[str, pd.Timestamp],
+) -> pd.Timestamp:
+    """
+    Calculate the exit/withdrawal date for a student. Used BDay() to calculate the next business day.
+    If the enrollment end date is null, the exit/withdrawal date is the school end date.
+    If the enrollment end dat is the last day of school, the exit/withdrawal date is the last day of school, as there is no next school day.
+
+    In this function definition, Union[str, pd.Timestamp] is used as a type hint for the function's parameters enrollment_end_date and school_end_date.
+    The Union type from the typing module allows for specifying that a parameter can accept multiple types.
+    In this case, the function is designed to accept either a string or a pd.Timestamp object as the input for the enrollment_end_date and school_end_date parameters.
+
+    Using Union[str, pd.Timestamp] provides the following benefits:
+
+    Flexibility: It allows the function to be more flexible by handling both string and pd.Timestamp inputs. This can be useful when working with dates that may come from different sources or formats.
+    Type hinting: Type hints help developers understand the expected input types for a function, which can improve code readability and make it easier to debug.
+
+
+    Args:
+        enrollment_end_date (Union[str, pd.Timestamp]): The enrollment end date as a string or Timestamp.
+        school_end_date (Union[str, pd.Timestamp]): The school end date as a string or Timestamp.
+
+    Returns:
+        pd.Timestamp: The exit/withdrawal date"""
+
+    enrollment_end_date = pd.to_datetime(enrollment_end_date, errors="coerce")
+    school_end_date = pd.to_datetime(school_end_date, errors="coerce")
+
+    if pd.isna(enrollment_end_date):
+        return school_end_date
+    else:
+        next_day = enrollment_end_date + pd.Timedelta(days=1)
+        next_school_day = next_day + BDay()
+
+        if next_school_day > school_end_date:
+            return school_end_date
+        else:
+            return next_school_day
+
+
+def calculate_exit_withdraw_dates(
+    enrollment_end_dates: pd.Series,
+    school_end_dates: pd.Series,
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+) -> pd.Series:
+    """
+    Vectorized version of calculate_exit_withdraw_date that works on whole columns at once.
+
+    calculate_exit_withdraw_date stays the reference implementation; this function must return the same values for the same inputs.
+    Instead of calling pd.to_datetime and BDay() once per row, the dates are converted to NumPy datetime64[D] arrays and shifted with
+    np.busday_offset, which does the business-day arithmetic in compiled code.
+
+    np.busday_offset(..., roll="backward") matches the behaviour of `date + BDay()`: a weekend date is first rolled back to the Friday
+    and then moved one business day forward, so Saturday and Sunday both land on Monday, exactly like BDay().
+    Any time-of-day component is carried over unchanged, as BDay() does.
+
+    Args:
+        enrollment_end_dates (pd.Series): The enrollment end dates as strings or Timestamps. Nulls mean the enrollment is still open.
+        school_end_dates (pd.Series): The school end dates as strings or Timestamps, aligned with enrollment_end_dates.
+        holidays (Optional[Iterable[Union[str, pd.Timestamp]]]): Optional school holiday calendar. Holidays are skipped in the same way
+            as weekends when looking for the next school day. When omitted the result matches BDay() exactly.
+
+    Returns:
+        pd.Series: The exit/withdrawal dates, indexed like enrollment_end_dates."""
+
+    enrollment_end_dates = pd.to_datetime(enrollment_end_dates, errors="coerce")
+    school_end_dates = pd.to_datetime(school_end_dates, errors="coerce")
+
+    next_day = (enrollment_end_dates + pd.Timedelta(days=1)).to_numpy(
+        dtype="datetime64[ns]"
+    )
+    next_day_date = next_day.astype("datetime64[D]")
+    time_of_day = next_day - next_day_date
+
+    if holidays is not None:
+        holidays = pd.to_datetime(pd.Series(list(holidays))).to_numpy(
+            dtype="datetime64[D]"
+        )
+    else:
+        holidays = []
+
+    # NaT values pass straight through np.busday_offset, so open enrollments don't need to be masked out first
+    next_school_day = (
+        np.busday_offset(next_day_date, 1, roll="backward", holidays=holidays).astype(
+            "datetime64[ns]"
+        )
+        + time_of_day
+    )
+
+    school_end = school_end_dates.to_numpy(dtype="datetime64[ns]")
+
+    # Comparisons against NaT are always False, so a missing school end date never clamps, matching the scalar function
+    exit_withdraw_dates = np.where(
+        np.isnat(next_school_day) | (next_school_day > school_end),
+        school_end,
+        next_school_day,
+    )
+
+    return pd.Series(exit_withdraw_dates, index=enrollment_end_dates.index)
+
+
+# The pattern is compiled once at import time instead of on every call to capitalize_name_parts
+NAME_PART_START_PATTERN = re.compile(r"\b\w")
+
+
+def capitalize_part(match: re.Match) -> str:
+    """
+    This code defines a function `capitalize_part` that takes a regular expression match object as input and returns the matched
+        string with its first character capitalized. Let's break down the code into its components:
+        1. `def capitalize_part(match: re.Match) -> str:`
+
+        Here, we define a function called `capitalize_part` with a single parameter `match`.
+        We use type hints to indicate that `match` should be of type `re.Match`,
+        which is a match object from the `re` (regular expressions) library.
+        The function is expected to return a string, as indicated by the `-> str` type hint.
+
+        2. `part = match.group()`
+
+        The `group()` method is called on the `match` object.
+        The method returns the entire match as a string.
+        In this case, it retrieves the matched string from the regular expression match object and stores it in a variable called `part`.
+
+        3. `return part[0].upper() + part[1:]`
+
+        This line constructs and returns a new string with the first character of `part` capitalized. Here's how it works:
+
+        - `part[0]`: This retrieves the first character of the `part` string.
+        - `part[0].upper()`: The `upper()` method is called on the first character to convert it to uppercase.
+        - `part[1:]`: This retrieves a substring from the second character of `part` to the end of the string. This remains unchanged.
+        - `part[0].upper() + part[1:]`: Finally, the capitalized first character and the rest of the string are concatenated together
+                    to form the new capitalized string.
+
+        In summary, the `capitalize_part` function takes a regular expression match object, extracts the matched string,
+        capitalizes its first character, and returns the modified string.
+
+        It lives at module level, next to the precompiled NAME_PART_START_PATTERN, so that capitalize_name_parts doesn't
+        rebuild the closure and look the pattern up in the re cache on every call."""
+    part = match.group()
+    return part[0].upper() + part[1:]
+
+
+def capitalize_name_parts(name: str) -> str:
+    """
+    Capitalize the first letter of each part of a name.
+
+    This function handles names with apostrophes, hyphens, and other punctuation marks.
+    It capitalizes the first letter of each part of a name while leaving the
+    remaining characters unchanged.
+
+    The regular expression pattern r"\b\w" is used to match the first letter of each word in a string. Let's break down the components of this pattern:
+    \b: This is a word boundary anchor. It matches the position between a word character (usually a letter, digit, or underscore) and a non-word character.
+    It can also match the position at the beginning or end of a string if the string starts or ends with a word character.
+    The word boundary anchor does not consume any characters; it just marks a position.
+
+    \w: This is a shorthand character class that matches any word character. In most regex flavors, a word character is defined as any alphanumeric character (letter or digit) or an underscore (_).
+    Specifically, \w is equivalent to [a-zA-Z0-9_].
+
+    When used together as \b\w, the pattern matches the first word character that appears immediately after a word boundary.
+    In other words, it matches the first letter of each word in the string. This pattern is commonly used when you want to perform an operation on the first letter of each word, such as capitalizing it.
+
+    Args:
+        name (str): The input name as a string.
+
+    Returns:
+        str: The formatted name with the first letter of each part capitalized.
+    """
+
+    return NAME_PART_START_PATTERN.sub(capitalize_part, name)
+
+
+def format_display_name(first_name: str, last_name: str) -> str:
+    return f"{last_name.capitalize()}, {first_name.capitalize()}"
+
+
+class NameCache:
+    """
+    A bounded LRU memo of raw -> formatted names that can be persisted between pipeline runs.
+
+    Student names repeat heavily, both across the enrollments of a single extract and across the daily runs of the DAG, so remembering
+    the result of capitalize_name_parts for names we have already seen saves re-running the regular expression on them.
+    The memo keeps at most max_size entries; when it is full the least recently used name is dropped.
+
+    If a path is given, the memo is loaded from that JSON file when the cache is created and written back by save().
+
+    Args:
+        max_size (int): The maximum number of names kept in the memo.
+        path (Optional[str]): Optional JSON file used to persist the memo across runs.
+    """
+
+    def __init__(self, max_size: int = 500_000, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        self._entries = OrderedDict()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries.update(json.load(f))
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_or_format(self, name: str, formatter: Callable[[str], str]) -> str:
+        """
+        Return the memoized formatted value of name, calling formatter and remembering the result on a miss.
+        """
+        if name in self._entries:
+            self._entries.move_to_end(name)
+            return self._entries[name]
+
+        formatted = formatter(name)
+        self._entries[name] = formatted
+        self._evict()
+        return formatted
+
+    def save(self):
+        """
+        Write the memo to self.path so the next run can start with a warm cache. Does nothing if no path was given.
+        """
+        if self.path is None:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+
+
+def format_name_column(
+    names: pd.Series,
+    formatter: Callable[[str], str],
+    cache: Optional[NameCache] = None,
+) -> pd.Series:
+    """
+    Apply a name formatter to a column, calling it only once per distinct value.
+
+    pd.factorize splits the column into integer codes and the array of its unique values. The formatter is run on the unique values only,
+    and the results are mapped back to every row by indexing with the codes, which is a single NumPy take instead of a Python call per row.
+    Missing values get the code -1, which picks the NaN appended to the end of the formatted values, so they stay missing.
+
+    Args:
+        names (pd.Series): The column of names to format.
+        formatter (Callable[[str], str]): The function applied to each distinct name, e.g. capitalize_name_parts.
+        cache (Optional[NameCache]): Optional memo of previously formatted names. It must only ever be used with the same formatter.
+
+    Returns:
+        pd.Series: The formatted names, indexed like the input column.
+    """
+    codes, uniques = pd.factorize(names)
+
+    if cache is not None:
+        formatted = [cache.get_or_format(name, formatter) for name in uniques]
+    else:
+        formatted = [formatter(name) for name in uniques]
+
+    formatted = np.array(formatted + [np.nan], dtype=object)
+
+    result = pd.Series(formatted[codes], index=names.index, name=names.name)
+    # Names read with the compact dtype plan stay Arrow-backed strings rather than turning into Python objects
+    if isinstance(names.dtype, pd.StringDtype):
+        result = result.astype(names.dtype)
+    return result
+
+
+def build_display_names(first_names: pd.Series, last_names: pd.Series) -> pd.Series:
+    """
+    Vectorized version of format_display_name.
+
+    Each name column is capitalized once per distinct value with format_name_column, using the same str.capitalize as format_display_name,
+    and the DisplayName is then assembled by concatenating whole columns rather than formatting an f-string for every row.
+
+    Args:
+        first_names (pd.Series): The FirstName column.
+        last_names (pd.Series): The LastSurname column, aligned with first_names.
+
+    Returns:
+        pd.Series: The display names in "Last, First" form.
+    """
+    return (
+        format_name_column(last_names, str.capitalize)
+        + ", "
+        + format_name_column(first_names, str.capitalize)
+    )
+
+
+def assign_data_types(df: pd.DataFrame, compact: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Assign data types to the columns of a Pandas DataFrame to avoid any ambiguity and possible errors from data entry.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame whose columns' data types need to be assigned.
+        compact (Optional[bool]): Assign the compact dtypes of the "merged" dtype plan instead, which leaves the columns of tables
+            read with the compact plan as they are. Defaults to config.compact_dtypes.
+
+    Returns:
+        pd.DataFrame: A new DataFrame with the specified data types assigned to its columns.
+    """
+    if config.compact_dtypes if compact is None else compact:
+        return apply_dtype_plan(df, DTYPE_PLANS["merged"])
+
+    data_types = {
+        "StudentUniqueId": "int64",
+        "FirstName": "object",
+        "LastSurname": "object",
+        "grade": "object",
+        "Gender": "category",
+        "id": "int64",
+        "SchoolId": "int64",
+        "academic_year": "object",
+        "EntryDate": "datetime64[ns]",
+        "enrollment_end_date": "datetime64[ns]",
+        "notes": "object",
+        "NameOfInstitution": "object",
+        "start_grade": "object",
+        "end_grade": "object",
+        "start_date": "datetime64[ns]",
+        "end_date": "datetime64[ns]",
+    }
+    # Only cast the columns that are present: the input tables may have been read with a column projection (see read_input_data)
+    return df.astype({k: v for k, v in data_types.items() if k in df.columns})
+
+
+# The columns transform_data reads, and the columns it adds or replaces
+TRANSFORM_INPUT_COLUMNS = [
+    "FirstName",
+    "LastSurname",
+    "Gender",
+    "enrollment_end_date",
+    "end_date",
+]
+# The columns of the data mart table
+OUTPUT_COLUMNS = [
+    "SchoolId",
+    "NameOfInstitution",
+    "StudentUniqueId",
+    "LastSurname",
+    "FirstName",
+    "DisplayName",
+    "Gender",
+    "EntryDate",
+    "ExitWithdrawDate",
+]
+
+
+def output_columns() -> List[str]:
+    """
+    The columns of the output table: OUTPUT_COLUMNS, followed by the columns of config.output_partition_by that aren't among them,
+    e.g. academic_year, which the table only carries when it is partitioned on it.
+    """
+    partition_by = config.output_partition_by or []
+    return OUTPUT_COLUMNS + [
+        column for column in partition_by if column not in OUTPUT_COLUMNS
+    ]
+
+
+TRANSFORM_OUTPUT_COLUMNS = [
+    "LastSurname",
+    "FirstName",
+    "DisplayName",
+    "Gender",
+    "ExitWithdrawDate",
+]
+
+
+@instrumented_stage()
+def transform_data(
+    merged_data: pd.DataFrame,
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+    name_cache: Optional[NameCache] = None,
+) -> pd.DataFrame:
+    """
+    Apply the field transformations to merged data: capitalize the names, build the DisplayName, format the Gender and calculate the
+    ExitWithdrawDate.
+
+    Only the TRANSFORM_INPUT_COLUMNS are read, so the function can be given just those columns, as the parallel transform does.
+    The DataFrame is modified in place and returned.
+
+    Args:
+        merged_data (pd.DataFrame): The merged and typed data, or at least its TRANSFORM_INPUT_COLUMNS.
+        holidays (Optional[Iterable[Union[str, pd.Timestamp]]]): Optional school holiday calendar used when calculating ExitWithdrawDate.
+        name_cache (Optional[NameCache]): Optional memo of names already formatted by capitalize_name_parts.
+
+    Returns:
+        pd.DataFrame: merged_data with the TRANSFORM_OUTPUT_COLUMNS added or replaced.
+    """
+    rows = len(merged_data)
+
+    # Names repeat heavily across enrollments, so capitalize_name_parts is run once per distinct name rather than once per row
+    with measure_stage("transform.capitalize_names", rows_in=rows):
+        merged_data["LastSurname"] = format_name_column(
+            merged_data["LastSurname"], capitalize_name_parts, cache=name_cache
+        )
+        merged_data["FirstName"] = format_name_column(
+            merged_data["FirstName"], capitalize_name_parts, cache=name_cache
+        )
+
+    # This line creates a new column called DisplayName in the DataFrame. build_display_names produces the same values as calling
+    # format_display_name on every row, but concatenates whole columns instead of using apply() row-wise.
+
+    with measure_stage("transform.display_name", rows_in=rows):
+        merged_data["DisplayName"] = build_display_names(
+            merged_data["FirstName"], merged_data["LastSurname"]
+        )
+
+    # This line applies another custom function called format_gender to each distinct value in the Gender column. This function is expected
+    # to handle the formatting and standardization of gender values. The transformed values replace the original values in the Gender column.
+
+    with measure_stage("transform.gender", rows_in=rows):
+        merged_data["Gender"] = format_gender_column(merged_data["Gender"])
+
+    # This line creates a new column called ExitWithdrawDate in the DataFrame. The whole enrollment_end_date and end_date columns are handed
+    # to calculate_exit_withdraw_dates, which computes every exit date in one vectorized pass instead of calling
+    # calculate_exit_withdraw_date row by row with apply(axis=1).
+
+    with measure_stage("transform.exit_withdraw_date", rows_in=rows):
+        merged_data["ExitWithdrawDate"] = calculate_exit_withdraw_dates(
+            merged_data["enrollment_end_date"],
+            merged_data["end_date"],
+            holidays=holidays,
+        )
+
+    return merged_data
+
+
+# The columns the join keeps from each table, and their names in the merged data. Every other column is left behind before the join.
+ENROLLMENT_JOIN_COLUMNS = {
+    "id": "EnrollmentId",
+    "school_id": "SchoolId",
+    "enrollment_start_date": "EntryDate",
+    "enrollment_end_date": "enrollment_end_date",
+    "academic_year": "academic_year",
+}
+STUDENT_JOIN_COLUMNS = {
+    "local_student_id": "StudentUniqueId",
+    "first_name": "FirstName",
+    "last_name": "LastSurname",
+    "gender": "Gender",
+}
+SCHOOL_JOIN_COLUMNS = {
+    "school_name": "NameOfInstitution",
+    "end_date": "end_date",
+}
+
+# The foreign key merge_data orders its rows by: like the students table, as the former students.merge(enrollments) did
+MERGE_ORDER_BY = "student_id"
+
+
+def build_dimension_indexes(
+    students: pd.DataFrame, schools: pd.DataFrame
+) -> Dict[str, DimensionIndex]:
+    """
+    Index the students and schools tables on their id, keyed by the enrollments column that refers to them.
+
+    The indexes only depend on the students and schools, so they can be built once and passed to every merge_and_transform_data call
+    over the same tables, e.g. for every chunk of the chunked conform.
+
+    Args:
+        students (pd.DataFrame): The students DataFrame.
+        schools (pd.DataFrame): The schools DataFrame.
+
+    Returns:
+        Dict[str, DimensionIndex]: The indexes for join_dimensions.
+    """
+    return {
+        "student_id": DimensionIndex(students, STUDENT_JOIN_COLUMNS),
+        "school_id": DimensionIndex(schools, SCHOOL_JOIN_COLUMNS),
+    }
+
+
+def merge_data(
+    students: pd.DataFrame,
+    schools: pd.DataFrame,
+    enrollments: pd.DataFrame,
+    dimension_indexes: Optional[Dict[str, DimensionIndex]] = None,
+) -> Tuple[pd.DataFrame, JoinReport]:
+    """
+    Merge the students, schools and enrollments DataFrames into one row per enrollment, with the columns the transforms need and
+    their data types assigned.
+
+    Args:
+        students (pd.DataFrame): The students DataFrame.
+        schools (pd.DataFrame): The schools DataFrame.
+        enrollments (pd.DataFrame): The enrollments DataFrame.
+        dimension_indexes (Optional[Dict[str, DimensionIndex]]): The students and schools indexes from build_dimension_indexes, when
+            they were already built for these tables. By default they are built from students and schools.
+
+    Returns:
+        Tuple[pd.DataFrame, JoinReport]: The merged DataFrame, and the report of the enrollments left out of it because their student
+            or school is missing, for validation.
+    """
+    if dimension_indexes is None:
+        dimension_indexes = build_dimension_indexes(students, schools)
+
+    # Join the enrollments with their student and school through the id indexes, keeping only the columns the output needs.
+    # Ordering by student gives the same row order as the former students.merge(enrollments).merge(schools). Enrollments with an
+    # unknown student or school are left out, as with an inner merge, and counted in the join report, which validation logs.
+    merged_data, join_report = join_dimensions(
+        enrollments,
+        ENROLLMENT_JOIN_COLUMNS,
+        dimension_indexes,
+        order_by=MERGE_ORDER_BY,
+    )
+
+    merged_data = assign_data_types(merged_data)
+
+    # Formatting dtypes and previews costs time on big frames, so it is only done when debug logging is on
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Merged data types:\n{merged_data.dtypes}")
+
+    return merged_data, join_report
+
+
+def transform_merged_data(
+    merged_data: pd.DataFrame,
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+    name_cache: Optional[NameCache] = None,
+    keep_enrollment_id: bool = False,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Apply the transforms to the output of merge_data and select the output columns.
+
+    Args:
+        merged_data (pd.DataFrame): The merged DataFrame from merge_data.
+        holidays, name_cache, keep_enrollment_id, workers: As for merge_and_transform_data.
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame.
+    """
+    # Apply transformations to selected fields, either here or partitioned by SchoolId across a pool of processes
+    workers = config.transform_workers if workers is None else workers
+    if workers > 1:
+        merged_data[TRANSFORM_OUTPUT_COLUMNS] = transform_in_parallel(
+            merged_data[TRANSFORM_INPUT_COLUMNS],
+            merged_data["SchoolId"],
+            partial(transform_data, holidays=holidays),
+            TRANSFORM_OUTPUT_COLUMNS,
+            workers=workers,
+            partition_size=config.transform_partition_size,
+        )
+    else:
+        merged_data = transform_data(
+            merged_data, holidays=holidays, name_cache=name_cache
+        )
+
+    # Select only necessary columns for the final output
+    transformed_data = merged_data[
+        (["EnrollmentId"] if keep_enrollment_id else []) + output_columns()
+    ]
+
+    return transformed_data
+
+
+def save_merged_data(merged_data: pd.DataFrame):
+    """
+    Save the output of merge_data, before the transforms, as merged_data in config.input_path, for debugging.
+    """
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Merged data preview:\n{merged_data.head()}")
+    get_storage(config.storage_format, config.input_path).write(
+        merged_data, "merged_data"
+    )
+
+
+@instrumented_stage()
+def merge_and_transform_data(
+    students: pd.DataFrame,
+    schools: pd.DataFrame,
+    enrollments: pd.DataFrame,
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+    name_cache: Optional[NameCache] = None,
+    keep_enrollment_id: bool = False,
+    save_merged: bool = False,
+    workers: Optional[int] = None,
+    dimension_indexes: Optional[Dict[str, DimensionIndex]] = None,
+    join_report: Optional[JoinReport] = None,
+) -> pd.DataFrame:
+    """
+    Merge students, schools, and enrollments DataFrames and transform the data
+    to include only necessary columns and apply transformations to certain fields.
+
+    Args:
+        students (pd.DataFrame): The students DataFrame.
+        schools (pd.DataFrame): The schools DataFrame.
+        enrollments (pd.DataFrame): The enrollments DataFrame.
+        holidays (Optional[Iterable[Union[str, pd.Timestamp]]]): Optional school holiday calendar used when calculating ExitWithdrawDate.
+        name_cache (Optional[NameCache]): Optional memo of names already formatted by capitalize_name_parts.
+        keep_enrollment_id (bool): Also return the enrollment id, as an EnrollmentId first column. The incremental conform needs it
+            to upsert rows into the previous run's output.
+        save_merged (bool): Also save the output of merge_data, before the transforms, with save_merged_data. Off by default: the
+            CLI (see cli.py) keeps the merged data in its stage cache instead, and saves the same table with --save-merged.
+        workers (Optional[int]): The number of processes the transforms run on. Defaults to config.transform_workers; 1 transforms in this
+            process. With more than one worker the name_cache is not used, since it can't be shared between processes.
+        dimension_indexes (Optional[Dict[str, DimensionIndex]]): The students and schools indexes from build_dimension_indexes, when
+            they were already built for these tables. By default they are built from students and schools.
+        join_report (Optional[JoinReport]): A report the enrollments left out by the merge are added to, for validation, e.g. one
+            report for all the chunks of the chunked conform.
+
+    Returns:
+        pd.DataFrame: The transformed and merged DataFrame.
+    """
+    merged_data, merge_report = merge_data(
+        students, schools, enrollments, dimension_indexes
+    )
+    if join_report is not None:
+        join_report.add(merge_report)
+    if save_merged:
+        save_merged_data(merged_data)
+    return transform_merged_data(
+        merged_data,
+        holidays=holidays,
+        name_cache=name_cache,
+        keep_enrollment_id=keep_enrollment_id,
+        workers=workers,
+    )
+
+
+@instrumented_stage()
+def validate_data(
+    transformed_data: pd.DataFrame,
+    students: Optional[pd.DataFrame] = None,
+    schools: Optional[pd.DataFrame] = None,
+    enrollments: Optional[pd.DataFrame] = None,
+    join_report: Optional[JoinReport] = None,
+) -> ValidationReport:
+    """
+    This fucntion validates the data to ensure that it does not contain any missing values or duplicate rows.
+
+    Duplicates are detected on config.validation_key columns rather than on whole rows (see validation.py). Enrollments whose student
+    or school is missing are logged as warnings: from join_report, the report of the merge, or else looked up in the input tables when
+    they are given. With config.validation_fail_fast, validation stops at the first column with missing values.
+
+    Raises DataValidationError, a ValueError, listing every violation if the data contains missing values or duplicates.
+
+    Returns:
+        ValidationReport: Counts and sample rows for every check.
+    """
+    validator = DataValidator(
+        key=config.validation_key, fail_fast=config.validation_fail_fast
+    )
+    validator.update(transformed_data)
+    if join_report is None and all(
+        table is not None for table in (students, schools, enrollments)
+    ):
+        join_report = check_references(
+            enrollments, build_dimension_indexes(students, schools)
+        )
+    if join_report is not None:
+        validator.update_join(join_report)
+
+    report = validator.finish()
+    if not report.ok:
+        raise DataValidationError(report)
+    return report
+
+
+def open_output_writer(output_format: str) -> BackgroundWriter:
+    """
+    Open a writer of the output table in output_format, which writes on a background thread (see output_writer.py). With
+    config.output_partition_by the table is written as a directory of partition files, otherwise as one file; either way it only
+    replaces the previous table once it has been completely written, and is published with a manifest of its row counts and checksums.
+    """
+    storage = get_storage(output_format, config.output_path)
+    if config.output_partition_by:
+        writer = PartitionedTableWriter(
+            output_format,
+            storage.path(OUTPUT_TABLE),
+            config.output_partition_by,
+            storage.schemas.get(OUTPUT_TABLE),
+        )
+    else:
+        writer = SingleFileTableWriter(output_format, storage.open_writer(OUTPUT_TABLE))
+    return BackgroundWriter(writer, max_pending=config.output_max_pending)
+
+
+@instrumented_stage()
+def save_transformed_data(transformed_data: pd.DataFrame):
+    """
+    This function saves the transformed data to the output folder, once for each of config.output_formats.
+
+    The data is handed to the writers config.output_batch_size rows at a time. Every output format is written on its own background
+    thread, so the formats are encoded at the same time, and a batch is encoded while the next one is being handed over.
+    """
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(open_output_writer(output_format))
+            for output_format in config.output_formats
+        ]
+        # An empty table is still written once, so its file has the output columns
+        for start in range(0, max(len(transformed_data), 1), config.output_batch_size):
+            batch = transformed_data.iloc[start : start + config.output_batch_size]
+            for writer in writers:
+                writer.write(batch)
+
+
+def incremental_state(partition: Optional[int] = None):
+    """
+    The storage of the incremental conform's state: config.state_path, or a directory of it per conform partition of the stage graph.
+    """
+    if partition is None:
+        return get_storage(config.storage_format, config.state_path)
+    return get_storage(
+        config.storage_format, os.path.join(config.state_path, f"part_{partition}")
+    )
+
+
+def transform_version(
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+) -> str:
+    """
+    Return a hash of the code and settings the merge and the transforms depend on. The incremental conform keeps it with its state,
+    and rebuilds the state in full when it changes, e.g. after a transform change is deployed.
+    """
+    return cache_key(
+        code_version(sys.modules[__name__], join, parallel, dtype_plan),
+        (
+            None
+            if holidays is None
+            else sorted(str(pd.Timestamp(day)) for day in holidays)
+        ),
+        config.compact_dtypes,
+        config.input_columns,
+        output_columns(),
+    )
+
+
+def conform_tables(
+    students: pd.DataFrame,
+    schools: pd.DataFrame,
+    enrollments: pd.DataFrame,
+    holidays: Optional[Iterable[Union[str, pd.Timestamp]]] = None,
+    name_cache: Optional[NameCache] = None,
+    incremental: Optional[bool] = None,
+    full_rebuild: bool = False,
+    partition: Optional[int] = None,
+    join_report: Optional[JoinReport] = None,
+) -> pd.DataFrame:
+    """
+    Merge and transform the input tables, either in full or incrementally (see incremental.py).
+
+    Args:
+        students (pd.DataFrame): The students DataFrame.
+        schools (pd.DataFrame): The schools DataFrame.
+        enrollments (pd.DataFrame): The enrollments DataFrame.
+        holidays (Optional[Iterable[Union[str, pd.Timestamp]]]): Optional school holiday calendar used when calculating ExitWithdrawDate.
+        name_cache (Optional[NameCache]): Optional memo of names already formatted by capitalize_name_parts.
+        incremental (Optional[bool]): Only re-transform the enrollments affected by a change since the previous incremental run, and
+            upsert them into that run's output. Defaults to config.incremental_conform. The previous run's output is only reused if it
+            was built with the same transform_version.
+        full_rebuild (bool): With incremental, ignore the previous state and transform every enrollment.
+        partition (Optional[int]): The conform partition of the stage graph the tables are for, which keeps its own incremental state.
+        join_report (Optional[JoinReport]): A report the enrollments with no matching student or school are added to, for validation.
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame, with its rows in the same order either way.
+    """
+    dimension_indexes = build_dimension_indexes(students, schools)
+    if not (config.incremental_conform if incremental is None else incremental):
+        return merge_and_transform_data(
+            students,
+            schools,
+            enrollments,
+            holidays=holidays,
+            name_cache=name_cache,
+            dimension_indexes=dimension_indexes,
+            join_report=join_report,
+        )
+
+    # Only the changed enrollments are merged, so the unmatched ones and the row order of a full merge are worked out from all of
+    # them, in the same indexes
+    positions, matched, merge_report = match_keys(enrollments, dimension_indexes)
+    if join_report is not None:
+        join_report.add(merge_report)
+    order = enrollments["id"].to_numpy()[
+        joined_rows(positions, matched, MERGE_ORDER_BY)
+    ]
+    return conform_incremental(
+        students,
+        schools,
+        enrollments,
+        lambda students, schools, enrollments: merge_and_transform_data(
+            students,
+            schools,
+            enrollments,
+            holidays=holidays,
+            name_cache=name_cache,
+            keep_enrollment_id=True,
+            dimension_indexes=dimension_indexes,
+        ),
+        incremental_state(partition),
+        force_full=full_rebuild,
+        version=transform_version(holidays),
+        order=order,
+    ).drop(columns=KEY_COLUMN)
+
+
+@instrumented_stage()
+def conform_data(
+    name_cache_path: Optional[str] = None,
+    incremental: Optional[bool] = None,
+    full_rebuild: bool = False,
+    chunk_size: Optional[int] = None,
+):
+    """
+    This function is the main function of the pipeline. It calls all the other functions in the pipeline to download, conform, and save the data.
+
+    Args:
+        name_cache_path (Optional[str]): Optional JSON file holding the formatted-name memo. When given, the memo is loaded before
+            the transform and saved after it, so names seen in earlier runs don't need to be formatted again.
+        incremental (Optional[bool]): Only re-transform the enrollments affected by a change since the previous incremental run, and
+            upsert them into that run's output (see incremental.py). The state is kept in config.state_path. Defaults to
+            config.incremental_conform.
+        full_rebuild (bool): With incremental, ignore the previous state and transform every enrollment, e.g. after a change to the
+            transform code.
+        chunk_size (Optional[int]): Stream the enrollments through the conform chunk_size rows at a time instead of loading them all,
+            for extracts that don't fit in memory (see conform_data_chunked). The transformed data is then written but not returned.
+    """
+    name_cache = NameCache(path=name_cache_path) if name_cache_path else None
+
+    if chunk_size:
+        conform_data_chunked(chunk_size, name_cache=name_cache)
+        if name_cache is not None:
+            name_cache.save()
+        return None
+
+    students, schools, enrollments = read_input_data()
+    join_report = JoinReport()
+    transformed_data = conform_tables(
+        students,
+        schools,
+        enrollments,
+        name_cache=name_cache,
+        incremental=incremental,
+        full_rebuild=full_rebuild,
+        join_report=join_report,
+    )
+    if name_cache is not None:
+        name_cache.save()
+
+    validate_data(transformed_data, join_report=join_report)
+    save_transformed_data(transformed_data)
+
+    return transformed_data
+
+
+@instrumented_stage()
+def conform_data_chunked(
+    chunk_size: int, name_cache: Optional[NameCache] = None
+) -> int:
+    """
+    Conform the input data without ever holding the whole enrollments table in memory.
+
+    The students and schools tables are read in full; the enrollments are read chunk_size rows at a time and each chunk is merged,
+    transformed, validated and appended to the output files before the next one is read (see chunked.py). The output holds the same
+    rows as conform_data without chunk_size, in chunk order.
+
+    Args:
+        chunk_size (int): The number of enrollments processed at a time.
+        name_cache (Optional[NameCache]): Optional memo of names already formatted by capitalize_name_parts, shared by all chunks.
+
+    Returns:
+        int: The number of rows written.
+    """
+    storage = get_storage(config.storage_format, config.input_path)
+    students = storage.read("students", columns=config.input_columns["students"])
+    schools = storage.read("schools", columns=config.input_columns["schools"])
+    enrollment_chunks = storage.iter_batches(
+        "enrollments",
+        columns=config.input_columns["enrollments"],
+        batch_size=chunk_size,
+    )
+    if config.compact_dtypes:
+        students = compact_table(students, "students")
+        schools = compact_table(schools, "schools")
+        enrollment_chunks = (
+            apply_dtype_plan(chunk, DTYPE_PLANS["enrollments"])
+            for chunk in enrollment_chunks
+        )
+    # The students and schools are indexed once, rather than once per chunk, and the unmatched enrollments of every chunk are added
+    # up in one report for the validation
+    dimension_indexes = build_dimension_indexes(students, schools)
+    join_report = JoinReport()
+
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(open_output_writer(output_format))
+            for output_format in config.output_formats
+        ]
+        return conform_in_chunks(
+            students,
+            schools,
+            enrollment_chunks,
+            lambda students, schools, enrollments: merge_and_transform_data(
+                students,
+                schools,
+                enrollments,
+                name_cache=name_cache,
+                save_merged=False,
+                dimension_indexes=dimension_indexes,
+                join_report=join_report,
+            ),
+            DataValidator(
+                key=config.validation_key, fail_fast=config.validation_fail_fast
+            ),
+            writers,
+            join_report=join_report,
+        )
+
+
+def download_entity(name: str, client=None) -> int:
+    """
+    Download one KoalaSis endpoint into config.input_path, with the same settings as download_data_to_csv. The stage graph runs one of
+    these per endpoint, so the downloads run as parallel tasks.
+
+    Args:
+        name (str): The endpoint to download: "students", "schools" or "enrollments".
+        client: Optional client to download from. Defaults to a KoalaSisDataClient built from config.credentials.
+
+    Returns:
+        int: The number of records downloaded.
+    """
+    if client is None:
+        client = make_client()
+
+    return download_endpoint(
+        client,
+        name,
+        get_storage(config.storage_format, config.input_path),
+        batch_size=config.ingest_batch_size,
+        retries=config.download_retries,
+        backoff=config.download_backoff,
+        resumable=config.download_resumable,
+        cache_ttl=config.download_cache_ttl.get(name),
+    )
+
+
+def staging_storage(partitions: int):
+    """
+    The storage of the stage graph's conformed partitions, which are stored with the dtypes of the output table.
+    """
+    return get_storage(
+        config.storage_format,
+        config.staging_path,
+        schemas={
+            conformed_partition_name(partition): OUTPUT_SCHEMA
+            for partition in range(partitions)
+        },
+    )
+
+
+@instrumented_stage()
+def conform_partition(partition: int = 0, partitions: int = 1) -> int:
+    """
+    Merge and transform the enrollments of one partition of the schools, and store the result in config.staging_path.
+
+    Schools are assigned to partitions by SchoolId modulo partitions, so every partition holds whole schools. Only the school_id column
+    of enrollments is read in full, to find the partition's schools; the rest of enrollments is read filtered on them, so every task
+    only loads its own share. With config.incremental_conform, every partition keeps its own incremental state and only
+    re-transforms its changed enrollments.
+
+    Args:
+        partition (int): The partition to conform, from 0 to partitions - 1.
+        partitions (int): The number of partitions.
+
+    Returns:
+        int: The number of rows conformed.
+    """
+    filters = None
+    if partitions > 1:
+        # The schools are taken from enrollments rather than schools, so enrollments of unknown schools are still conformed (and
+        # reported as unmatched) by exactly one partition
+        school_ids = (
+            get_storage(config.storage_format, config.input_path)
+            .read("enrollments", columns=["school_id"])["school_id"]
+            .dropna()
+            .unique()
+        )
+        school_ids = school_ids[school_ids % partitions == partition]
+        filters = {"enrollments": {"school_id": school_ids.tolist()}}
+    students, schools, enrollments = read_input_data(filters=filters)
+
+    transformed_data = conform_tables(
+        students,
+        schools,
+        enrollments,
+        partition=partition if partitions > 1 else None,
+    )
+    staging_storage(partitions).write(
+        transformed_data, conformed_partition_name(partition)
+    )
+    return len(transformed_data)
+
+
+@instrumented_stage()
+def validate_partitions(partitions: int = 1) -> ValidationReport:
+    """
+    Validate the conformed partitions together, so duplicates across partitions are caught, and store the report as
+    validation_report.json in config.staging_path.
+
+    Raises DataValidationError if the data contains missing values or duplicates.
+
+    Returns:
+        ValidationReport: Counts and sample rows for every check.
+    """
+    storage = staging_storage(partitions)
+    validator = DataValidator(
+        key=config.validation_key, fail_fast=config.validation_fail_fast
+    )
+    try:
+        for partition in range(partitions):
+            validator.update(storage.read(conformed_partition_name(partition)))
+        students, schools, enrollments = read_input_data()
+        validator.update_join(
+            check_references(enrollments, build_dimension_indexes(students, schools))
+        )
+        report = validator.finish()
+    except DataValidationError as e:
+        # With config.validation_fail_fast the report of the failure is raised before finish
+        report = e.report
+
+    os.makedirs(config.staging_path, exist_ok=True)
+    with open(os.path.join(config.staging_path, "validation_report.json"), "w") as f:
+        f.write(report.to_json())
+
+    if not report.ok:
+        raise DataValidationError(report)
+    return report
+
+
+@instrumented_stage()
+def save_partitions(partitions: int = 1) -> int:
+    """
+    Save the conformed partitions to the output folder as one table, once for each of config.output_formats, one partition at a time.
+
+    Returns:
+        int: The number of rows saved.
+    """
+    storage = staging_storage(partitions)
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(open_output_writer(output_format))
+            for output_format in config.output_formats
+        ]
+        for partition in range(partitions):
+            transformed_data = storage.read(conformed_partition_name(partition))
+            for writer in writers:
+                writer.write(transformed_data)
+    return writers[0].rows_written if writers else 0
+
+
+def main():
+    config.configure_logging()
+    logging.info("Pipeline started")
+
+    try:
+        download_data_to_csv()
+        logging.info("Data downloaded successfully")
+    except Exception as e:
+        logging.error(f"Error downloading data: {e}")
+        raise
+
+    try:
+        transformed_data = conform_data()
+        logging.info("Data conformed successfully")
+    except Exception as e:
+        logging.error(f"Error conforming data: {e}")
+        raise
+
+    logging.info("Pipeline completed")
+
+
+if __name__ == "__main__":
+    main()
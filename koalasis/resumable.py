@@ -0,0 +1,209 @@
+"""
+Resumable downloads of the KoalaSis endpoints.
+
+A download that fails part-way used to start again from the first page, on the next retry as well as on the next Airflow attempt of the
+task. download_resumable writes each batch of records to its own part file as soon as the batch is complete, and records in a
+checkpoint file next to the table how many pages and records are already on disk. A later attempt, in the same process or a new one,
+picks up the checkpoint and continues from the next page:
+
+- if the client's get_*_data method accepts a start_page argument, the download restarts at that page;
+- otherwise the pages already on disk are skipped without being decoded or written again. This relies on the API returning the pages
+  in the same order on every call.
+
+Once the last page is written the parts are combined into the table, which is published atomically like any other storage write,
+and the checkpoint and parts are removed.
+
+Every completed download also leaves a small manifest with its record count and completion time, which lets slowly-changing endpoints
+such as the schools be served from disk for a time-to-live instead of being downloaded on every run (see cached_records).
+"""
+
+import inspect  # Provides introspection of callables | used here to find out whether a client method can start at a given page
+import itertools  # Provides iterator building blocks | used here to skip the pages already downloaded
+import json  # Provides functions for working with JSON data | used here to store the checkpoints and manifests
+import logging  # Provides a logging system for tracking the execution of the code | used here to report resumed downloads
+import os  # Provides functions for interacting with the operating system | used here to manage the checkpoint files
+import shutil  # Provides high-level file operations | used here to remove the part files
+import time  # Provides timing functions | used here to age the checkpoints and manifests
+from typing import (
+    Callable,
+    Iterator,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.ingest import (
+    DEFAULT_BATCH_SIZE,
+    iter_page_batches,
+)  # Batched, streaming ingestion of the KoalaSis generators | used here to cut the download into part files on page boundaries
+from koalasis.storage import (
+    TableStorage,
+)  # Pluggable table storage | used here to write the part files and the final table
+
+# Checkpoints older than this are assumed to belong to an abandoned run and are discarded, so a download never resumes from stale data
+DEFAULT_CHECKPOINT_MAX_AGE = 12 * 60 * 60
+
+
+def write_json_atomically(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class DownloadCheckpoint:
+    """
+    The progress of one endpoint's download: the pages and records written so far and the part files holding them.
+
+    Args:
+        storage (TableStorage): The storage the table is downloaded into. The checkpoint and parts are kept in the same directory.
+        name (str): The table being downloaded.
+    """
+
+    def __init__(self, storage: TableStorage, name: str):
+        self.storage = storage
+        self.name = name
+        self.path = os.path.join(storage.directory, f"{name}.checkpoint.json")
+        self.parts_directory = os.path.join(storage.directory, f"{name}.parts")
+        self.pages = 0
+        self.records = 0
+        self.parts = []
+
+    def load(self, max_age: float = DEFAULT_CHECKPOINT_MAX_AGE) -> bool:
+        """
+        Load the checkpoint left by an earlier attempt. Returns False, and starts from scratch, if there is none or it is too old.
+        """
+        state = read_json(self.path)
+        if state is None:
+            return False
+        if time.time() - state["updated_at"] > max_age:
+            logging.info(f"Discarding the checkpoint of {self.name}, it is too old")
+            self.clear()
+            return False
+
+        self.pages = state["pages"]
+        self.records = state["records"]
+        self.parts = state["parts"]
+        return True
+
+    def part_storage(self) -> TableStorage:
+        # Every part is stored with the schema of the table, so the parts combine into the same dtypes as a direct download
+        schema = self.storage.schemas.get(self.name, {})
+        return type(self.storage)(
+            self.parts_directory, schemas={part: schema for part in self.parts}
+        )
+
+    def add_part(self, batch, pages: int):
+        """
+        Write batch, which holds the records of the next pages pages, to a new part file and move the checkpoint past it.
+        """
+        # Trailing empty pages only move the checkpoint; an empty part would fix an empty column layout for the table
+        if len(batch):
+            self.parts.append(f"part-{len(self.parts):05d}")
+            self.part_storage().write(batch, self.parts[-1])
+
+        # The checkpoint is only updated once the part file is in place, so it never points at pages that aren't on disk
+        self.pages += pages
+        self.records += len(batch)
+        os.makedirs(self.storage.directory, exist_ok=True)
+        write_json_atomically(
+            self.path,
+            {
+                "pages": self.pages,
+                "records": self.records,
+                "parts": self.parts,
+                "updated_at": time.time(),
+            },
+        )
+
+    def iter_parts(self) -> Iterator:
+        part_storage = self.part_storage()
+        for part in self.parts:
+            yield part_storage.read(part)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        shutil.rmtree(self.parts_directory, ignore_errors=True)
+
+
+def manifest_path(storage: TableStorage, name: str) -> str:
+    return os.path.join(storage.directory, f"{name}.download.json")
+
+
+def cached_records(storage: TableStorage, name: str, ttl: float) -> Optional[int]:
+    """
+    Return the record count of the table called name if it was downloaded less than ttl seconds ago, or None if it must be downloaded.
+    """
+    manifest = read_json(manifest_path(storage, name))
+    if manifest is None or not storage.exists(name):
+        return None
+    if time.time() - manifest["completed_at"] > ttl:
+        return None
+    return manifest["records"]
+
+
+def open_pages(get_data: Callable, start_page: int) -> Iterator:
+    """
+    Return the pages of get_data from start_page on, asking the API to start there when the client supports it.
+    """
+    if not start_page:
+        return get_data()
+    if "start_page" in inspect.signature(get_data).parameters:
+        return get_data(start_page=start_page)
+    return itertools.islice(get_data(), start_page, None)
+
+
+def download_resumable(
+    get_data: Callable,
+    storage: TableStorage,
+    name: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_age: float = DEFAULT_CHECKPOINT_MAX_AGE,
+) -> int:
+    """
+    Download the pages of get_data into the table called name of storage, continuing from the checkpoint of an earlier failed attempt.
+
+    Args:
+        get_data (Callable): A client method returning a generator of JSON pages, e.g. client.get_enrollment_data.
+        storage (TableStorage): The storage the table is written to.
+        name (str): The table to write, e.g. "enrollments".
+        batch_size (int): The number of records per part file. A part always holds whole pages, so it can be slightly larger.
+        max_age (float): Ignore checkpoints older than this, in seconds.
+
+    Returns:
+        int: The number of records in the table.
+    """
+    checkpoint = DownloadCheckpoint(storage, name)
+    if checkpoint.load(max_age):
+        logging.info(
+            f"Resuming the download of {name} after {checkpoint.pages} pages and {checkpoint.records} records"
+        )
+
+    for pages, batch in iter_page_batches(
+        open_pages(get_data, checkpoint.pages), batch_size
+    ):
+        checkpoint.add_part(batch, pages)
+
+    with storage.open_writer(name) as writer:
+        for part in checkpoint.iter_parts():
+            writer.write(part)
+
+    write_json_atomically(
+        manifest_path(storage, name),
+        {
+            "records": writer.rows_written,
+            "pages": checkpoint.pages,
+            "completed_at": time.time(),
+        },
+    )
+    checkpoint.clear()
+
+    logging.info(f"Wrote {writer.rows_written} records to {storage.path(name)}")
+    return writer.rows_written
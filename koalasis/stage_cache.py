@@ -0,0 +1,152 @@
+"""
+An on-disk cache of the outputs of pipeline stages, keyed by a hash of their inputs and code.
+
+Every entry is the output of one stage run: a set of named tables, stored in a columnar format so they are read back with their
+dtypes, plus a small JSON document (info) for outputs that aren't tables, such as a validation report. The key of an entry is a hash
+of everything the output depends on: the stage name, the source code that computes it (code_version), the settings
+that change it, and the keys of the stages it reads from. A stage whose key is in the cache doesn't have to run again; changing its
+code, a setting or an upstream output changes its key, so stale entries are never read.
+
+Entries are written to a temporary directory and renamed into place, so an interrupted run never leaves a partial entry behind. Only
+the max_entries most recently used entries of each stage are kept.
+"""
+
+import hashlib  # Provides hash functions | used here to hash the keys and the source code of the stages
+import inspect  # Inspects live objects | used here to read the source code of the stages
+import json  # Provides functions for working with JSON data | used here to serialize the keys and the info of the entries
+import logging  # Provides a logging system for tracking the execution of the code | used here to log cache hits and writes
+import os  # Provides functions for interacting with the operating system | used here to manage the entry directories
+import shutil  # Provides high-level file operations | used here to remove evicted entries
+import time  # Provides timing functions | used here to record when an entry was written
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+import pandas as pd  # 🐼
+
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable Parquet / Feather / CSV table storage | used here to store the tables of the entries
+
+INFO_FILE = "entry.json"
+
+
+def code_version(*objects) -> str:
+    """
+    Return a hash of the source code of objects (modules, classes or functions), which changes whenever the code of one of them does.
+    """
+    digest = hashlib.blake2b(digest_size=10)
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+def cache_key(*parts) -> str:
+    """
+    Return a hash of parts, which must be JSON-serializable (lists, dicts, strings, numbers).
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=10).hexdigest()
+
+
+class StageCache:
+    """
+    The cached outputs of the pipeline stages, as one directory per stage and key under directory.
+
+    Args:
+        directory (str): The directory of the cache.
+        storage_format (str): The format the tables are stored in. Defaults to Feather, which is the cheapest to read back.
+        max_entries (int): The number of entries kept per stage; the least recently used ones are removed when a new one is written.
+    """
+
+    def __init__(
+        self, directory: str, storage_format: str = "feather", max_entries: int = 2
+    ):
+        self.directory = directory
+        self.storage_format = storage_format
+        self.max_entries = max_entries
+
+    def path(self, stage: str, key: str) -> str:
+        return os.path.join(self.directory, stage, key)
+
+    def has(self, stage: str, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(stage, key), INFO_FILE))
+
+    def load(self, stage: str, key: str) -> Tuple[Dict[str, pd.DataFrame], dict]:
+        """
+        Return the tables and info of the entry of stage with key.
+        """
+        path = self.path(stage, key)
+        with open(os.path.join(path, INFO_FILE)) as f:
+            entry = json.load(f)
+        # Mark the entry as recently used, so eviction removes the entries that haven't been read the longest
+        os.utime(path)
+        storage = get_storage(self.storage_format, path, schemas={})
+        tables = {}
+        for name in entry["tables"]:
+            df = storage.read(name)
+            # Arrow reads Python string columns back as the string dtype, so the object columns are turned back into object
+            object_columns = entry["object_columns"][name]
+            df[object_columns] = df[object_columns].astype(object)
+            tables[name] = df
+        logging.info(f"Loaded the output of stage {stage} from the cache ({key})")
+        return tables, entry["info"]
+
+    def save(
+        self,
+        stage: str,
+        key: str,
+        tables: Dict[str, pd.DataFrame],
+        info: Optional[dict] = None,
+    ):
+        """
+        Store tables and info as the entry of stage with key, and remove the oldest entries of stage beyond max_entries.
+        """
+        path = self.path(stage, key)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        storage = get_storage(self.storage_format, tmp_path, schemas={})
+        for name, df in tables.items():
+            storage.write(df, name)
+        with open(os.path.join(tmp_path, INFO_FILE), "w") as f:
+            json.dump(
+                {
+                    "stage": stage,
+                    "key": key,
+                    "written_at": time.time(),
+                    "tables": {name: len(df) for name, df in tables.items()},
+                    "object_columns": {
+                        name: list(df.columns[df.dtypes == object])
+                        for name, df in tables.items()
+                    },
+                    "info": info or {},
+                },
+                f,
+                indent=2,
+            )
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logging.info(f"Cached the output of stage {stage} ({key})")
+        self.evict(stage)
+
+    def evict(self, stage: str):
+        """
+        Remove the entries of stage beyond the max_entries most recently written or read.
+        """
+        stage_directory = os.path.join(self.directory, stage)
+        entries = sorted(
+            (
+                entry
+                for entry in os.scandir(stage_directory)
+                if entry.is_dir() and not entry.name.endswith(".tmp")
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in entries[self.max_entries :]:
+            shutil.rmtree(entry.path, ignore_errors=True)
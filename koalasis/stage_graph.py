@@ -0,0 +1,248 @@
+"""
+A graph of pipeline stages connected by file artifacts.
+
+Every Stage declares the files it reads (inputs) and writes (outputs). A stage depends on the stages that write its inputs, which is all
+an orchestrator needs to run independent stages in parallel and to start a stage as soon as its inputs exist. The same graph is turned
+into Airflow tasks by dag.py and run in-process by run_local, so it can be exercised without Airflow.
+
+Artifacts are passed between stages by path and content hash. run_stage records the hashes of a stage's inputs and outputs in the state
+directory when it succeeds, with a version of the stage: a hash of its code, its kwargs and the settings it reads. The next time, if the
+inputs and outputs still have the same hashes and the version is the same, the stage is skipped. A daily download that returns the
+same data as the day before therefore doesn't trigger the conform, validate and save stages again, but deploying a fix to the
+transforms or changing a setting does. Stages that read from outside the graph, such as the downloads from the API, are marked
+always_run.
+"""
+
+import graphlib  # Provides topological sorting | used here to order the stages by their dependencies
+import hashlib  # Provides hash functions | used here to hash the content of the artifacts
+import importlib  # Imports modules by name | used here to import the function of a stage only when the stage runs
+import json  # Provides functions for working with JSON data | used here to store the state of each stage
+import logging  # Provides a logging system for tracking the execution of the code | used here to log skipped stages
+import os  # Provides functions for interacting with the operating system | used here to check and hash the artifact files
+import sys  # Provides the loaded modules | used here to find the modules the code of a stage uses
+import types  # Provides the module type | used here to find the modules the code of a stage uses
+from dataclasses import (
+    dataclass,
+    field,
+)  # Generates boilerplate for data-holding classes | used here for the stage definitions
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Union,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# Content hashes, keyed by (path, size, modification time), so an artifact written by one stage isn't hashed again by the next one
+_hash_cache: Dict[tuple, str] = {}
+
+
+def content_hash(path: str) -> str:
+    """
+    Return the BLAKE2b hash of the content of the file at path.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_cache:
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+@dataclass
+class Stage:
+    """
+    One unit of work of the pipeline.
+
+    Args:
+        name (str): A unique name, used as the Airflow task id.
+        func (Union[str, Callable]): Runs the stage. It must write every path in outputs. Either a callable or its import path, as
+            "package.module:function"; an import path is only imported when the stage runs, so building the graph stays cheap.
+        kwargs (Dict[str, Any]): The keyword arguments func is called with.
+        inputs (List[str]): The files the stage reads.
+        outputs (List[str]): The files the stage writes.
+        always_run (bool): Run the stage even if its inputs are unchanged, for stages that read from outside the graph.
+        settings (Dict[str, Any]): The values of the settings the output of the stage depends on, keyed by name. They must be
+            JSON-serializable. A change to them reruns the stage, like a change to its inputs.
+    """
+
+    name: str
+    func: Union[str, Callable]
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    always_run: bool = False
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+
+def resolve(func: Union[str, Callable]) -> Callable:
+    """
+    Return func itself, or the function its import path ("package.module:function") points to.
+    """
+    if callable(func):
+        return func
+    module, _, name = func.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def code_modules(func: Callable) -> List[types.ModuleType]:
+    """
+    Return the module that defines func and every module of its package that module uses, directly or through another one, sorted by
+    name. The transforms a stage runs are usually not in the function of the stage itself but in the functions it calls.
+    """
+    package = func.__module__.partition(".")[0]
+    modules: Dict[str, types.ModuleType] = {}
+    pending = [func.__module__]
+    while pending:
+        name = pending.pop()
+        if name in modules or name not in sys.modules:
+            continue
+        modules[name] = sys.modules[name]
+        for value in vars(modules[name]).values():
+            used = (
+                value.__name__
+                if isinstance(value, types.ModuleType)
+                else getattr(value, "__module__", None)
+            )
+            if isinstance(used, str) and used.partition(".")[0] == package:
+                pending.append(used)
+    return [modules[name] for name in sorted(modules)]
+
+
+def stage_version(stage: Stage) -> str:
+    """
+    Return a hash of what the output of stage depends on besides its inputs: the source code of its function and of the modules of its
+    package it uses (see code_modules), its kwargs and its settings.
+    """
+    # stage_cache imports pandas, so it is only imported when a stage runs, not when the DAG is parsed
+    from koalasis.stage_cache import (
+        cache_key,
+        code_version,
+    )  # Hashes of source code and settings | used here to version the stages
+
+    return cache_key(
+        code_version(*code_modules(resolve(stage.func))),
+        stage.kwargs,
+        stage.settings,
+    )
+
+
+class StageGraph:
+    """
+    A set of stages, with the dependencies between them derived from their inputs and outputs.
+    """
+
+    def __init__(self, stages: Optional[List[Stage]] = None):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages or []:
+            self.add(stage)
+
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage name {stage.name!r}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def upstream(self, name: str) -> List[str]:
+        """
+        Return the names of the stages that write an input of the stage called name.
+        """
+        inputs = set(self.stages[name].inputs)
+        return [
+            other.name
+            for other in self.stages.values()
+            if other.name != name and inputs.intersection(other.outputs)
+        ]
+
+    def order(self) -> List[str]:
+        """
+        Return the stage names in an order where every stage comes after its upstream stages.
+        """
+        sorter = graphlib.TopologicalSorter(
+            {name: self.upstream(name) for name in self.stages}
+        )
+        return list(sorter.static_order())
+
+
+class StageState:
+    """
+    The input and output hashes of each stage's last successful run, stored as one JSON file per stage in directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, name: str) -> Optional[dict]:
+        try:
+            with open(self.path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name: str, record: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path(name) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, self.path(name))
+
+
+def run_stage(stage: Stage, state: StageState) -> Dict[str, str]:
+    """
+    Run a stage, unless its inputs, code and settings are unchanged since its last successful run and its outputs are still the ones
+    it wrote then.
+
+    Args:
+        stage (Stage): The stage to run.
+        state (StageState): Where the hashes of the previous runs are kept.
+
+    Returns:
+        Dict[str, str]: The content hash of every output, keyed by path. Airflow stores the return value of a task as its XCom, so
+            the artifacts of every task run can be looked up there.
+    """
+    missing = [path for path in stage.inputs if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Stage {stage.name} is missing its inputs {missing}")
+
+    input_hashes = {path: content_hash(path) for path in stage.inputs}
+    version = stage_version(stage)
+    previous = state.load(stage.name)
+
+    if (
+        not stage.always_run
+        and previous is not None
+        and previous["inputs"] == input_hashes
+        and previous.get("version") == version
+        and all(os.path.exists(path) for path in stage.outputs)
+        and previous["outputs"] == {path: content_hash(path) for path in stage.outputs}
+    ):
+        logging.info(
+            f"Skipping stage {stage.name}: its inputs, code and settings are unchanged"
+        )
+        return previous["outputs"]
+
+    resolve(stage.func)(**stage.kwargs)
+
+    output_hashes = {path: content_hash(path) for path in stage.outputs}
+    state.save(
+        stage.name,
+        {"inputs": input_hashes, "outputs": output_hashes, "version": version},
+    )
+    return output_hashes
+
+
+def run_local(graph: StageGraph, state: StageState) -> Dict[str, Dict[str, str]]:
+    """
+    Run every stage of the graph in this process, in dependency order, with the same skipping as under Airflow.
+
+    Returns:
+        Dict[str, Dict[str, str]]: The output hashes of every stage, keyed by stage name.
+    """
+    return {name: run_stage(graph.stages[name], state) for name in graph.order()}
@@ -0,0 +1,161 @@
+"""
+The stage graph of the KoalaSis pipeline, and the entry points that run its stages.
+
+This module is what the Airflow DAG imports, and the scheduler imports the DAG file every time it parses it. It therefore only imports
+the standard library, config.py and stage_graph.py: the stages refer to their functions in pipeline.py by import path, so pandas, the
+KoalaSis client and the pipeline code are imported by the task that runs a stage, not by the scheduler. Logging is only configured
+when a stage runs, for the same reason.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to build the artifact paths
+from typing import (
+    Dict,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis import (
+    config,
+)  # Settings of the pipeline | used here to lay out the artifacts of the stages
+from koalasis.stage_graph import (
+    Stage,
+    StageGraph,
+    StageState,
+    run_local,
+    run_stage,
+)  # Stage graph with content-hashed artifacts | used here to build the DAG and run it without Airflow
+
+# The KoalaSis endpoints, one download stage each (the keys of download.ENDPOINTS)
+ENDPOINTS = ("students", "schools", "enrollments")
+
+# The name of the output table of the pipeline
+OUTPUT_TABLE = "student_demographics_and_enrollment"
+
+# The manifest a partitioned output table is published with, and the suffix of the manifest of a single file table
+# (output_writer.MANIFEST_FILE and output_writer.SINGLE_FILE_MANIFEST_SUFFIX)
+MANIFEST_FILE = "_manifest.json"
+SINGLE_FILE_MANIFEST_SUFFIX = ".manifest.json"
+
+
+def conformed_partition_name(partition: int) -> str:
+    return f"conformed_part_{partition}"
+
+
+def table_path(directory: str, name: str, storage_format: str) -> str:
+    """
+    The path a table is stored at by the storage of storage_format (see storage.py), without importing it.
+    """
+    return os.path.join(directory, f"{name}.{storage_format}")
+
+
+def output_path(output_format: str) -> str:
+    """
+    The file the output table is published with: the manifest of the partitioned table, or of the single file table.
+    """
+    path = table_path(config.output_path, OUTPUT_TABLE, output_format)
+    if config.output_partition_by:
+        return os.path.join(path, MANIFEST_FILE)
+    return path + SINGLE_FILE_MANIFEST_SUFFIX
+
+
+def build_stage_graph(partitions: Optional[int] = None) -> StageGraph:
+    """
+    Build the pipeline as a graph of stages: one download per endpoint, one conform per partition of the schools, then validate and
+    save. The artifacts between them are the files in config.input_path, config.staging_path and config.output_path.
+
+    Args:
+        partitions (Optional[int]): The number of conform stages. Defaults to config.conform_partitions.
+
+    Returns:
+        StageGraph: The stages of the pipeline.
+    """
+    partitions = config.conform_partitions if partitions is None else partitions
+    inputs = [
+        table_path(config.input_path, name, config.storage_format) for name in ENDPOINTS
+    ]
+    conformed = [
+        table_path(
+            config.staging_path,
+            conformed_partition_name(partition),
+            config.storage_format,
+        )
+        for partition in range(partitions)
+    ]
+    report = os.path.join(config.staging_path, "validation_report.json")
+
+    graph = StageGraph()
+    for name, path in zip(ENDPOINTS, inputs):
+        graph.add(
+            Stage(
+                f"download_{name}",
+                "koalasis.pipeline:download_entity",
+                {"name": name},
+                outputs=[path],
+                always_run=True,
+            )
+        )
+    for partition, path in enumerate(conformed):
+        graph.add(
+            Stage(
+                "conform" if partitions == 1 else f"conform_part_{partition}",
+                "koalasis.pipeline:conform_partition",
+                {"partition": partition, "partitions": partitions},
+                inputs=inputs,
+                outputs=[path],
+                settings={
+                    "input_columns": config.input_columns,
+                    "compact_dtypes": config.compact_dtypes,
+                    "incremental_conform": config.incremental_conform,
+                    # The partition columns are added to the conformed rows (see pipeline.output_columns)
+                    "output_partition_by": config.output_partition_by,
+                },
+            )
+        )
+    graph.add(
+        Stage(
+            "validate",
+            "koalasis.pipeline:validate_partitions",
+            {"partitions": partitions},
+            inputs=inputs + conformed,
+            outputs=[report],
+            settings={
+                "validation_key": config.validation_key,
+                "validation_fail_fast": config.validation_fail_fast,
+            },
+        )
+    )
+    graph.add(
+        Stage(
+            "save",
+            "koalasis.pipeline:save_partitions",
+            {"partitions": partitions},
+            inputs=conformed + [report],
+            outputs=[
+                output_path(output_format) for output_format in config.output_formats
+            ],
+            settings={"output_partition_by": config.output_partition_by},
+        )
+    )
+    return graph
+
+
+def stage_state() -> StageState:
+    return StageState(os.path.join(config.staging_path, "stages"))
+
+
+def run_graph_stage(name: str) -> Dict[str, str]:
+    """
+    Run the stage called name of the stage graph, skipping it if its inputs are unchanged. This is the callable of every Airflow task.
+
+    Returns:
+        Dict[str, str]: The content hash of every output of the stage, keyed by path.
+    """
+    config.configure_logging()
+    return run_stage(build_stage_graph().stages[name], stage_state())
+
+
+def run_pipeline_locally() -> Dict[str, Dict[str, str]]:
+    """
+    Run the whole stage graph in this process, in dependency order, as the Airflow DAG would.
+    """
+    config.configure_logging()
+    return run_local(build_stage_graph(), stage_state())
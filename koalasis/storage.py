@@ -0,0 +1,492 @@
+"""
+Pluggable storage for the tables passed between the pipeline stages.
+
+Every run used to round-trip the data through CSV: the downloads were written as CSV, parsed again with type inference, and the dates
+re-parsed on every read. The storage classes here write the tables in a columnar format instead, with the dtypes fixed by
+TABLE_SCHEMAS, compressed, and readable one column subset at a time:
+
+- ParquetStorage (the default): compressed Parquet files, read back with column projection and memory mapping.
+- FeatherStorage: Arrow IPC (Feather v2) files, which are the cheapest to read back when memory mapped.
+- CsvStorage: plain CSV files, kept for downstream consumers that need them.
+
+Reads can also be filtered on column values, e.g. the enrollments of some schools only. Parquet and Feather apply the filter while
+scanning the file, so the rows that don't match are never converted to pandas; Parquet also skips the row groups whose statistics rule
+them out.
+
+All three write through a TableWriter, which appends one batch at a time to a temporary file and only renames it into place once the
+whole table has been written.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to manage file paths and atomic renames
+import logging  # Provides a logging system for tracking the execution of the code | used here to warn about dropped columns
+import pandas as pd  # 🐼
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# pyarrow is needed for the Parquet and Feather formats only. It is imported optionally so the CSV format keeps working without it.
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+
+# The dtypes of the raw KoalaSis tables. They are enforced on every write, so a batch in which a column happens to be entirely null
+# is stored with the same type as every other batch, and on CSV reads, so dates come back as datetimes rather than strings.
+# Columns that are not listed keep the type pandas infers for them.
+TABLE_SCHEMAS = {
+    "students": {
+        "id": "int64",
+        "local_student_id": "int64",
+        "first_name": "object",
+        "last_name": "object",
+        "gender": "object",
+        "grade": "object",
+    },
+    "schools": {
+        "id": "int64",
+        "school_name": "object",
+        "start_date": "datetime64[ns]",
+        "end_date": "datetime64[ns]",
+        "start_grade": "object",
+        "end_grade": "object",
+    },
+    "enrollments": {
+        "id": "int64",
+        "student_id": "int64",
+        "school_id": "int64",
+        "enrollment_start_date": "datetime64[ns]",
+        "enrollment_end_date": "datetime64[ns]",
+        "grade": "object",
+        "academic_year": "object",
+        "notes": "object",
+    },
+}
+
+# The dtypes of the conformed output table, as saved to the data mart
+OUTPUT_SCHEMA = {
+    "SchoolId": "int64",
+    "NameOfInstitution": "object",
+    "StudentUniqueId": "int64",
+    "LastSurname": "object",
+    "FirstName": "object",
+    "DisplayName": "object",
+    "Gender": "object",
+    "EntryDate": "datetime64[ns]",
+    "ExitWithdrawDate": "datetime64[ns]",
+    # Only in the table when it is partitioned on it (see config.output_partition_by)
+    "academic_year": "object",
+}
+TABLE_SCHEMAS["student_demographics_and_enrollment"] = OUTPUT_SCHEMA
+
+# The incremental conform state keeps the output keyed by enrollment id (see incremental.py)
+TABLE_SCHEMAS["conformed"] = {"EnrollmentId": "int64", **OUTPUT_SCHEMA}
+
+DEFAULT_COMPRESSION = "zstd"
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Cast the columns of df that appear in schema to their schema dtype.
+
+    Dates are converted with pd.to_datetime(errors="coerce"), so values that can't be parsed become NaT instead of failing the cast.
+
+    Args:
+        df (pd.DataFrame): The table to cast.
+        schema (Dict[str, str]): Column name -> pandas dtype.
+
+    Returns:
+        pd.DataFrame: The table with the schema applied.
+    """
+    df = df.copy()
+    for column, dtype in schema.items():
+        # Columns that already have their dtype are left alone: the output writers cast every batch they write, and re-parsing
+        # datetime columns that are already datetimes costs more than writing a small batch
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if dtype.startswith("datetime64"):
+            df[column] = pd.to_datetime(df[column], errors="coerce").astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def arrow_schema(df: pd.DataFrame, schema: Dict[str, str]):
+    """
+    Build the Arrow schema a table is written with: schema dtypes for listed columns, inferred types for the others.
+
+    Columns that are entirely null in df infer to Arrow's null type, which later batches with real values couldn't be written as,
+    so those are stored as strings.
+    """
+    arrow_types = {
+        "int64": pa.int64(),
+        "uint64": pa.uint64(),
+        "object": pa.string(),
+        "datetime64[ns]": pa.timestamp("ns"),
+    }
+
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in inferred:
+        if field.name in schema:
+            field = pa.field(field.name, arrow_types[schema[field.name]])
+        elif pa.types.is_null(field.type):
+            field = pa.field(field.name, pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class TableWriter:
+    """
+    Writes one table batch by batch to a temporary file and publishes it atomically.
+
+    The columns of the first batch fix the layout of the table. Later batches are aligned to it; columns that only appear in later batches
+    can't be added to rows that were already written, so they are dropped with a warning.
+
+    Use it as a context manager: the file is renamed into place when the block exits normally and removed if it raises.
+    """
+
+    def __init__(self, path: str, schema: Dict[str, str]):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema
+        self.columns = None
+        self.rows_written = 0
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._close()
+        finally:
+            if exc_type is None:
+                os.replace(self.tmp_path, self.path)
+            elif os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def write(self, batch: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(batch.columns)
+        else:
+            extra_columns = batch.columns.difference(self.columns)
+            if len(extra_columns):
+                logging.warning(
+                    f"Dropping columns {list(extra_columns)} not present in the first batch of {self.path}"
+                )
+            batch = batch.reindex(columns=self.columns)
+
+        self._write(apply_schema(batch, self.schema))
+        self.rows_written += len(batch)
+
+    def _write(self, batch: pd.DataFrame):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CsvTableWriter(TableWriter):
+    def __enter__(self):
+        super().__enter__()
+        self._file = open(self.tmp_path, "w", newline="", encoding="utf-8")
+        return self
+
+    def _write(self, batch: pd.DataFrame):
+        batch.to_csv(self._file, index=False, header=self.rows_written == 0)
+
+    def _close(self):
+        self._file.close()
+
+
+class ArrowTableWriter(TableWriter):
+    """
+    Base writer for the Arrow-based formats. The Arrow schema is fixed from the first batch.
+    """
+
+    def __init__(self, path: str, schema: Dict[str, str], compression: str):
+        super().__init__(path, schema)
+        self.compression = compression
+        self._writer = None
+
+    def _write(self, batch: pd.DataFrame):
+        if self._writer is None:
+            self._arrow_schema = arrow_schema(batch, self.schema)
+            self._writer = self._open(self._arrow_schema)
+        table = pa.Table.from_pandas(
+            batch, schema=self._arrow_schema, preserve_index=False
+        )
+        self._writer.write_table(table)
+
+    def _open(self, schema):
+        raise NotImplementedError
+
+    def _close(self):
+        if self._writer is None:
+            # Nothing was written: still publish an empty, readable file
+            self._writer = self._open(pa.schema([]))
+        self._writer.close()
+
+
+class ParquetTableWriter(ArrowTableWriter):
+    def _open(self, schema):
+        # Every batch becomes a row group, so readers can skip row groups they don't need
+        return pq.ParquetWriter(self.tmp_path, schema, compression=self.compression)
+
+
+class FeatherTableWriter(ArrowTableWriter):
+    _sink = None
+
+    def _open(self, schema):
+        # Closing the IPC writer doesn't close a file it opened from a path, which would keep it open until it is garbage collected,
+        # so the file is opened and closed here
+        self._sink = pa.OSFile(self.tmp_path, "wb")
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self._sink, schema, options=options)
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            if self._sink is not None:
+                self._sink.close()
+
+
+def filter_rows(df: pd.DataFrame, filters: Dict[str, List[object]]) -> pd.DataFrame:
+    """
+    Return the rows of df whose value of each column in filters is among the listed values.
+    """
+    for column, values in filters.items():
+        df = df[df[column].isin(values)]
+    return df
+
+
+def arrow_filter(filters: Dict[str, List[object]]):
+    """
+    Return filters as a pyarrow.dataset expression, which the Parquet and Feather readers apply while scanning.
+    """
+    expression = None
+    for column, values in filters.items():
+        condition = ds.field(column).isin(list(values))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class TableStorage:
+    """
+    Reads and writes named tables (students, schools, ...) as files in one directory.
+
+    Args:
+        directory (str): The directory the tables are stored in.
+        schemas (Optional[Dict[str, Dict[str, str]]]): Dtypes per table name. Defaults to TABLE_SCHEMAS.
+    """
+
+    extension = None
+
+    def __init__(
+        self, directory: str, schemas: Optional[Dict[str, Dict[str, str]]] = None
+    ):
+        self.directory = directory
+        self.schemas = TABLE_SCHEMAS if schemas is None else schemas
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.{self.extension}")
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def open_writer(self, name: str) -> TableWriter:
+        """
+        Return a TableWriter that writes the table called name batch by batch.
+        """
+        raise NotImplementedError
+
+    def write(self, df: pd.DataFrame, name: str):
+        """
+        Write a whole DataFrame as the table called name.
+        """
+        with self.open_writer(name) as writer:
+            writer.write(df)
+
+    def read(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[object]]] = None,
+    ) -> pd.DataFrame:
+        """
+        Read the table called name, optionally only the listed columns, and only the rows whose value of each column in filters is
+        among the listed values, e.g. {"school_id": [3, 7]}. The filter columns don't have to be among columns.
+        """
+        raise NotImplementedError
+
+    def iter_batches(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 100_000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Read the table called name as a sequence of DataFrames of at most batch_size rows, so it never has to fit in memory at once.
+        """
+        raise NotImplementedError
+
+
+class CsvStorage(TableStorage):
+    extension = "csv"
+
+    def open_writer(self, name: str) -> TableWriter:
+        return CsvTableWriter(self.path(name), self.schemas.get(name, {}))
+
+    def _read_csv(self, name: str, columns: Optional[List[str]], **kwargs):
+        schema = self.schemas.get(name, {})
+        dates = [c for c, t in schema.items() if t.startswith("datetime64")]
+        header = pd.read_csv(self.path(name), nrows=0).columns
+        if columns is not None:
+            header = [c for c in header if c in columns]
+
+        return pd.read_csv(
+            self.path(name),
+            usecols=columns,
+            dtype={c: t for c, t in schema.items() if c in header and c not in dates},
+            parse_dates=[c for c in dates if c in header],
+            **kwargs,
+        )
+
+    def read(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[object]]] = None,
+    ) -> pd.DataFrame:
+        if not filters:
+            return apply_schema(
+                self._read_csv(name, columns), self.schemas.get(name, {})
+            )
+
+        # CSV can't be filtered while it is parsed, so it is parsed in batches and only the matching rows of each batch are kept
+        read_columns = columns and list(columns) + [
+            column for column in filters if column not in columns
+        ]
+        df = pd.concat(
+            [
+                filter_rows(batch, filters)
+                for batch in self.iter_batches(name, read_columns)
+            ],
+            ignore_index=True,
+        )
+        return df if columns is None else df[columns]
+
+    def iter_batches(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 100_000,
+    ) -> Iterator[pd.DataFrame]:
+        with self._read_csv(name, columns, chunksize=batch_size) as reader:
+            for chunk in reader:
+                yield apply_schema(chunk, self.schemas.get(name, {}))
+
+
+class ParquetStorage(TableStorage):
+    extension = "parquet"
+
+    def __init__(
+        self,
+        directory: str,
+        schemas: Optional[Dict[str, Dict[str, str]]] = None,
+        compression: str = DEFAULT_COMPRESSION,
+    ):
+        super().__init__(directory, schemas)
+        self.compression = compression
+
+    def open_writer(self, name: str) -> TableWriter:
+        return ParquetTableWriter(
+            self.path(name), self.schemas.get(name, {}), self.compression
+        )
+
+    def read(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[object]]] = None,
+    ) -> pd.DataFrame:
+        return pq.read_table(
+            self.path(name),
+            columns=columns,
+            filters=arrow_filter(filters) if filters else None,
+            memory_map=True,
+        ).to_pandas()
+
+    def iter_batches(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 100_000,
+    ) -> Iterator[pd.DataFrame]:
+        parquet_file = pq.ParquetFile(self.path(name), memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+class FeatherStorage(ParquetStorage):
+    extension = "feather"
+
+    def open_writer(self, name: str) -> TableWriter:
+        return FeatherTableWriter(
+            self.path(name), self.schemas.get(name, {}), self.compression
+        )
+
+    def read(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[object]]] = None,
+    ) -> pd.DataFrame:
+        if filters:
+            return (
+                ds.dataset(self.path(name), format="feather")
+                .to_table(columns=columns, filter=arrow_filter(filters))
+                .to_pandas()
+            )
+        return feather.read_table(
+            self.path(name), columns=columns, memory_map=True
+        ).to_pandas()
+
+    def iter_batches(
+        self,
+        name: str,
+        columns: Optional[List[str]] = None,
+        batch_size: int = 100_000,
+    ) -> Iterator[pd.DataFrame]:
+        # The memory-mapped table isn't loaded into memory; each slice is only paged in when it is converted to pandas
+        table = feather.read_table(self.path(name), columns=columns, memory_map=True)
+        for offset in range(0, table.num_rows, batch_size):
+            yield table.slice(offset, batch_size).to_pandas()
+
+
+STORAGE_FORMATS = {
+    "parquet": ParquetStorage,
+    "feather": FeatherStorage,
+    "csv": CsvStorage,
+}
+
+
+def get_storage(storage_format: str, directory: str, **kwargs) -> TableStorage:
+    """
+    Return the storage for storage_format ("parquet", "feather" or "csv") rooted at directory.
+    """
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(
+            f"Unknown storage format {storage_format!r}, expected one of {list(STORAGE_FORMATS)}"
+        )
+    if storage_format != "csv" and pa is None:
+        raise ImportError(f"pyarrow is required for the {storage_format} format")
+    return STORAGE_FORMATS[storage_format](directory, **kwargs)
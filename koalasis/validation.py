@@ -0,0 +1,207 @@
+"""
+Validation of the conformed data.
+
+DataValidator checks the output one chunk at a time, so the same code validates a whole DataFrame or a stream of chunks from the
+chunked conform:
+
+- Nulls are checked column by column. Only columns that contain nulls are looked at further, to count and sample them.
+- Duplicates are checked on a key (SchoolId + StudentUniqueId + EntryDate by default) hashed to one 64-bit integer per row, rather than
+  by hashing every column of every row, long DisplayName strings included.
+- Enrollments whose student_id or school_id has no match in the students or schools table are reported, since the join of the merge
+  would otherwise drop them silently. Their counts come from the JoinReport of the merge (see join.py), which has already looked every
+  key up in the dimension indexes.
+
+The result is a ValidationReport with counts and sample offending rows. Nulls and duplicates are errors; unmatched enrollments are
+reported as warnings.
+"""
+
+import json  # Provides functions for working with JSON data | used here to serialize the report
+import logging  # Provides a logging system for tracking the execution of the code | used here to log warnings from the report
+import numpy as np  # Provides fast array operations | used here to find duplicated key hashes
+import pandas as pd  # 🐼
+from dataclasses import (
+    asdict,
+    dataclass,
+    field,
+)  # Generates boilerplate for data-holding classes | used here for the validation report
+from typing import (
+    Dict,
+    List,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+from koalasis.join import (
+    JoinReport,
+)  # Hash join of the enrollments with the dimension tables | used here for the enrollments the merge found no student or school for
+
+# The columns that identify one output row: a student can only enter a given school once on a given day
+DEFAULT_DUPLICATE_KEY = ["SchoolId", "StudentUniqueId", "EntryDate"]
+
+# How many offending rows are kept per violation
+DEFAULT_SAMPLE_SIZE = 5
+
+
+@dataclass
+class ValidationReport:
+    """
+    The outcome of validating the conformed data.
+
+    Sample rows are stored as records, with their position in the validated data under "_row".
+    """
+
+    rows: int = 0
+    null_counts: Dict[str, int] = field(default_factory=dict)
+    null_samples: Dict[str, List[dict]] = field(default_factory=dict)
+    duplicate_key: Optional[List[str]] = None
+    duplicate_count: int = 0
+    duplicate_samples: List[dict] = field(default_factory=list)
+    unmatched_counts: Dict[str, int] = field(default_factory=dict)
+    unmatched_samples: Dict[str, list] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.null_counts and not self.duplicate_count
+
+    def errors(self) -> List[str]:
+        errors = [
+            f"{count} missing values in {column}"
+            for column, count in self.null_counts.items()
+        ]
+        if self.duplicate_count:
+            errors.append(
+                f"{self.duplicate_count} duplicate rows on {self.duplicate_key or 'all columns'}"
+            )
+        return errors
+
+    def warnings(self) -> List[str]:
+        return [
+            f"{count} enrollments with no matching {column}"
+            for column, count in self.unmatched_counts.items()
+            if count
+        ]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), default=str)
+
+
+class DataValidationError(ValueError):
+    """
+    Raised when the conformed data fails validation. The full ValidationReport is available as .report.
+    """
+
+    def __init__(self, report: ValidationReport):
+        self.report = report
+        super().__init__("Data failed validation: " + "; ".join(report.errors()))
+
+
+def sample_records(df: pd.DataFrame, positions: np.ndarray, offset: int) -> List[dict]:
+    sample = df.iloc[positions].copy()
+    sample.insert(0, "_row", positions + offset)
+    return sample.to_dict("records")
+
+
+class DataValidator:
+    """
+    Validates conformed data chunk by chunk. Call update() with each chunk, then finish() for the report.
+
+    Args:
+        key (Optional[List[str]]): The columns duplicates are detected on. None compares whole rows.
+        sample_size (int): How many offending rows to keep per violation.
+        fail_fast (bool): Raise DataValidationError at the first column with nulls, without scanning the rest of the columns and
+            chunks, instead of finishing the run to report everything. Duplicates can only be decided once every chunk has been seen.
+    """
+
+    def __init__(
+        self,
+        key: Optional[List[str]] = DEFAULT_DUPLICATE_KEY,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+        fail_fast: bool = False,
+    ):
+        self.key = key
+        self.sample_size = sample_size
+        self.fail_fast = fail_fast
+        self.report = ValidationReport(duplicate_key=key)
+        self._hashes = []
+        self._chunks_for_samples = []
+
+    def update(self, chunk: pd.DataFrame):
+        offset = self.report.rows
+        self.report.rows += len(chunk)
+
+        for column in chunk.columns:
+            missing = chunk[column].isna()
+            if not missing.any():
+                continue
+            positions = np.flatnonzero(missing.to_numpy())
+            self.report.null_counts[column] = self.report.null_counts.get(
+                column, 0
+            ) + len(positions)
+            samples = self.report.null_samples.setdefault(column, [])
+            if len(samples) < self.sample_size:
+                samples.extend(
+                    sample_records(
+                        chunk, positions[: self.sample_size - len(samples)], offset
+                    )
+                )
+            if self.fail_fast:
+                raise DataValidationError(self.report)
+
+        keyed = chunk if self.key is None else chunk[self.key]
+        self._hashes.append(pd.util.hash_pandas_object(keyed, index=False).to_numpy())
+
+        # Duplicates are only known in finish(), so a few of the first chunks are kept to take sample rows from. Duplicates in later
+        # chunks are reported by row number only, which keeps the memory of the chunked conform flat.
+        if sum(len(c) for c in self._chunks_for_samples) < self.sample_size * 1000:
+            self._chunks_for_samples.append((offset, chunk))
+
+    def update_join(self, join_report: JoinReport):
+        """
+        Add the enrollments whose student_id or school_id matched no student or school in a join, from the report of the join.
+        """
+        for column, count in join_report.unmatched_counts.items():
+            self.report.unmatched_counts[column] = (
+                self.report.unmatched_counts.get(column, 0) + count
+            )
+            if count:
+                samples = self.report.unmatched_samples.setdefault(column, [])
+                samples.extend(
+                    value
+                    for value in join_report.unmatched_samples.get(column, [])
+                    if value not in samples
+                )
+                del samples[self.sample_size :]
+
+    def finish(self) -> ValidationReport:
+        """
+        Decide on duplicates across every chunk seen, log any warnings and return the report.
+        """
+        if self._hashes:
+            hashes = np.concatenate(self._hashes)
+            order = np.argsort(hashes, kind="stable")
+            sorted_hashes = hashes[order]
+            repeated = sorted_hashes[1:] == sorted_hashes[:-1]
+            self.report.duplicate_count = int(repeated.sum())
+
+            # The second and later occurrences of a key are the duplicates; their row numbers are order[1:][repeated]
+            duplicate_rows = np.sort(order[1:][repeated])[: self.sample_size]
+            for offset, chunk in self._chunks_for_samples:
+                in_chunk = duplicate_rows[
+                    (duplicate_rows >= offset) & (duplicate_rows < offset + len(chunk))
+                ]
+                self.report.duplicate_samples.extend(
+                    sample_records(chunk, in_chunk - offset, offset)
+                )
+            if len(self.report.duplicate_samples) < len(duplicate_rows):
+                # Rows from chunks that weren't kept are reported by position only
+                reported = {s["_row"] for s in self.report.duplicate_samples}
+                self.report.duplicate_samples.extend(
+                    {"_row": int(row)} for row in duplicate_rows if row not in reported
+                )
+
+        for warning in self.report.warnings():
+            logging.warning(f"Validation: {warning}")
+
+        return self.report
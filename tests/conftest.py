@@ -0,0 +1,40 @@
+"""
+Fixtures shared by the tests.
+"""
+
+import pytest  # Provides the test runner | used here to define the fixtures
+
+from koalasis import (
+    config,
+    pipeline,
+)  # The pipeline and its settings | used here to point the pipeline at a scratch directory
+from tests.fake_koala_sis import (
+    FakeKoalaSisDataClient,
+)  # A local stand-in for the KoalaSis client | used here as the source of the downloads
+
+
+@pytest.fixture
+def pipeline_config(tmp_path, monkeypatch):
+    """
+    Point every path of the pipeline at tmp_path, and return config.
+    """
+    for setting, directory in [
+        ("input_path", "koala_sis"),
+        ("output_path", "data_mart"),
+        ("state_path", "koala_sis/state"),
+        ("staging_path", "koala_sis/staging"),
+        ("cache_path", "koala_sis/cache"),
+    ]:
+        monkeypatch.setattr(config, setting, str(tmp_path / directory))
+    monkeypatch.setattr(config, "log_file", str(tmp_path / "pipeline.log"))
+    return config
+
+
+@pytest.fixture
+def downloaded(pipeline_config):
+    """
+    Download a small extract from the fake KoalaSis client into config.input_path, and return the client.
+    """
+    client = FakeKoalaSisDataClient(n_students=60, n_schools=6, n_enrollments=300)
+    pipeline.download_data_to_csv(client=client, max_workers=1)
+    return client
@@ -0,0 +1,305 @@
+"""
+A local stand-in for do_not_look.koala_sis_api.KoalaSisDataClient.
+
+FakeKoalaSisDataClient exposes the same get_student_data / get_schools_data / get_enrollment_data generators as the real client,
+yielding one JSON page at a time, but builds its data locally. It can inject latency per page and fail a chosen endpoint a given number
+of times with the same "Unknown Koala SIS API error" seen in pipeline.log, which makes it possible to exercise the download code
+without API credentials.
+
+The data is synthetic but skewed like a real district extract, so it exercises the same code paths as production data:
+- names are drawn from small pools with a Zipf-like skew, so a few names repeat on most rows, and include apostrophes, hyphens,
+  spaces, accents and inconsistent capitalization;
+- most enrollments are still open, with a null enrollment_end_date;
+- closed enrollments often end on a Friday or a weekend, or on or just before the school end date, so the next business day falls
+  after the end of the school year;
+- a few large schools hold most of the enrollments.
+
+Pages are generated one at a time from a seeded generator, so extracts of tens of millions of enrollments can be streamed without
+being held in memory, and the same seed always yields the same data.
+
+install_as_koala_sis_api() registers the fake as the do_not_look.koala_sis_api module when the real client isn't installed, so the
+pipeline can be imported and benchmarked without it. This module is part of the tests rather than of the koalasis package, so the
+production code can never import the fake or install it in place of the real client; the tests and the benchmarks import it from here.
+"""
+
+from datetime import (
+    date,
+    timedelta,
+)  # Provides classes for manipulating dates | used here to spread enrollment dates over the school year
+import json  # Provides functions for working with JSON data | used here to encode the pages
+import sys  # Provides access to the loaded modules | used here to install the fake as the KoalaSis API module
+import time  # Provides timing functions | used here to simulate API latency
+import threading  # Provides thread synchronization | used here to count failures safely across concurrent downloads
+import types  # Provides the module type | used here to build the stand-in KoalaSis API module
+import numpy as np  # Provides fast array operations | used here to generate a page of records at a time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)  # Provides a way to specify argument and return types | used here for function argument typing
+
+# Most frequent first: zipf_weights() makes the first few names cover most rows
+FIRST_NAMES = [
+    "mary-jane", "o'neil", "JOHN", "anne marie", "li", "jean-luc", "d'arcy", "zoë", "mohammed", "maria",
+    "james", "SOPHIA", "liam", "olivia", "noah", "emma", "ava", "isabella", "lucas", "mia",
+    "ethan", "amelia", "josé", "chloé", "aiden", "sofia", "mateo", "harper", "elijah", "evelyn",
+]  # fmt: skip
+LAST_NAMES = [
+    "smith", "o'brien", "mc-donald", "NGUYEN", "d'angelo", "garcia", "van der berg", "johnson", "williams", "brown",
+    "jones", "miller", "DAVIS", "rodriguez", "martinez", "hernández", "lopez", "gonzalez", "wilson", "anderson",
+    "smith-jones", "o'connor", "le", "thomas", "taylor", "moore", "jackson", "martin", "lee", "perez",
+]  # fmt: skip
+GENDERS = ["male", "female", "nonbinary", "unknown"]
+GENDER_WEIGHTS = [0.49, 0.49, 0.015, 0.005]
+
+SCHOOL_YEAR_START = date(2022, 8, 15)  # a Monday
+SCHOOL_YEAR_END = date(2023, 6, 2)  # a Friday
+SCHOOL_YEAR_DAYS = (SCHOOL_YEAR_END - SCHOOL_YEAR_START).days
+
+# The share of enrollments that are still open, end on a random day, end on a Friday or weekend, and end on or just before the school
+# end date
+END_DATE_KINDS = [0.6, 0.2, 0.1, 0.1]
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class KoalaSisApiError(Exception):
+    """
+    The error raised by FakeKoalaSisDataClient when a failure is injected.
+    """
+
+
+class FakeKoalaSisDataClient:
+    """
+    A drop-in replacement for KoalaSisDataClient backed by generated data.
+
+    Args:
+        credentials (Optional[str]): Ignored, accepted so the fake can be constructed like the real client.
+        n_students (int): The number of students.
+        n_schools (int): The number of schools.
+        n_enrollments (int): The number of enrollments.
+        page_size (int): The number of records per yielded JSON page.
+        latency (float): Seconds to sleep before yielding each page.
+        failures (Optional[Dict[str, int]]): How many times each method should fail before it succeeds, keyed by method name,
+            e.g. {"get_enrollment_data": 1}. Failures are raised part-way through the download, when page fail_at_page is requested.
+        fail_at_page (int): The page (counting from 0) at which an injected failure is raised.
+        seed (int): The seed of the generated data. The same seed always yields the same records.
+
+    Like a paged API, every get_*_data method can start at a later page with start_page. The pages yielded so far are recorded in
+    fetched_pages, keyed by method name, so tests can check that a resumed download doesn't fetch a page twice.
+    """
+
+    def __init__(
+        self,
+        credentials: Optional[str] = None,
+        n_students: int = 100,
+        n_schools: int = 5,
+        n_enrollments: int = 200,
+        page_size: int = 50,
+        latency: float = 0.0,
+        failures: Optional[Dict[str, int]] = None,
+        seed: int = 0,
+        fail_at_page: int = 1,
+    ):
+        self.n_students = n_students
+        self.n_schools = n_schools
+        self.n_enrollments = n_enrollments
+        self.page_size = page_size
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.seed = seed
+        self.fail_at_page = fail_at_page
+        self.calls = {}
+        self.fetched_pages: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def at_scale(cls, n_enrollments: int, **kwargs) -> "FakeKoalaSisDataClient":
+        """
+        Build a client for n_enrollments enrollments with district-like proportions: about ten enrollments per student and one school
+        per 5,000 enrollments.
+        """
+        kwargs.setdefault("n_students", max(n_enrollments // 10, 1))
+        kwargs.setdefault("n_schools", max(n_enrollments // 5_000, 5))
+        kwargs.setdefault("page_size", 1_000)
+        return cls(n_enrollments=n_enrollments, **kwargs)
+
+    def _should_fail(self, method: str) -> bool:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if self.failures.get(method, 0) > 0:
+                self.failures[method] -= 1
+                return True
+        return False
+
+    def _get_data(
+        self,
+        method: str,
+        n_records: int,
+        make_page: Callable[[int, np.ndarray], List[dict]],
+        start_page: int = 0,
+    ) -> Iterator[str]:
+        fail = self._should_fail(method)
+
+        for page_number, ids in enumerate(self._pages(n_records)):
+            if page_number < start_page:
+                continue
+            if fail and page_number == self.fail_at_page:
+                raise KoalaSisApiError("Unknown Koala SIS API error")
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.fetched_pages.setdefault(method, []).append(page_number)
+            yield json.dumps(make_page(page_number, ids))
+
+        if fail:
+            raise KoalaSisApiError("Unknown Koala SIS API error")
+
+    def _pages(self, n_records: int) -> Iterator[np.ndarray]:
+        for start in range(0, n_records, self.page_size):
+            yield np.arange(start + 1, min(start + self.page_size, n_records) + 1)
+
+    def _rng(self, table: int, page_number: int) -> np.random.Generator:
+        # Each page has a generator of its own, so its records don't depend on the pages generated before it
+        return np.random.default_rng([self.seed, table, page_number])
+
+    def student_page(self, page_number: int, ids: np.ndarray) -> List[dict]:
+        rng = self._rng(0, page_number)
+        first_names = rng.choice(
+            FIRST_NAMES, len(ids), p=zipf_weights(len(FIRST_NAMES))
+        )
+        last_names = rng.choice(LAST_NAMES, len(ids), p=zipf_weights(len(LAST_NAMES)))
+        genders = rng.choice(GENDERS, len(ids), p=GENDER_WEIGHTS)
+        grades = rng.integers(0, 6, len(ids))
+        return [
+            {
+                "id": i,
+                "local_student_id": 100_000 + i,
+                "first_name": first_name,
+                "last_name": last_name,
+                "gender": gender,
+                "grade": str(grade),
+            }
+            for i, first_name, last_name, gender, grade in zip(
+                ids.tolist(),
+                first_names.tolist(),
+                last_names.tolist(),
+                genders.tolist(),
+                grades.tolist(),
+            )
+        ]
+
+    def school_page(self, page_number: int, ids: np.ndarray) -> List[dict]:
+        # Most schools end on the Friday; some end on the Saturday after or the Wednesday before
+        end_offsets = [0, 0, 1, -2]
+        return [
+            {
+                "id": i,
+                "school_name": f"School {i}",
+                "start_date": SCHOOL_YEAR_START.isoformat(),
+                "end_date": (
+                    SCHOOL_YEAR_END + timedelta(days=end_offsets[i % len(end_offsets)])
+                ).isoformat(),
+                "start_grade": "0",
+                "end_grade": "5",
+            }
+            for i in ids.tolist()
+        ]
+
+    def enrollment_page(self, page_number: int, ids: np.ndarray) -> List[dict]:
+        rng = self._rng(1, page_number)
+        n = len(ids)
+
+        student_ids = (ids - 1) % self.n_students + 1
+        school_ids = rng.choice(self.n_schools, n, p=zipf_weights(self.n_schools)) + 1
+
+        # The k-th enrollment of a student starts on a weekday of week k, so no two enrollments of a student are identical
+        start_days = 7 * ((ids - 1) // self.n_students) + rng.integers(0, 5, n)
+
+        kinds = rng.choice(len(END_DATE_KINDS), n, p=END_DATE_KINDS)
+        end_days = np.minimum(
+            start_days + rng.integers(1, SCHOOL_YEAR_DAYS, n), SCHOOL_YEAR_DAYS
+        )
+        # Friday, Saturday or Sunday of the same week
+        end_days = np.where(
+            kinds == 2, end_days - end_days % 7 + rng.integers(4, 7, n), end_days
+        )
+        end_days = np.where(
+            kinds == 3, SCHOOL_YEAR_DAYS - rng.integers(0, 2, n), end_days
+        )
+        end_days = np.maximum(end_days, start_days)
+
+        return [
+            {
+                "id": i,
+                "student_id": student_id,
+                "school_id": school_id,
+                "enrollment_start_date": (
+                    SCHOOL_YEAR_START + timedelta(days=start_day)
+                ).isoformat(),
+                "enrollment_end_date": (
+                    None
+                    if kind == 0
+                    else (SCHOOL_YEAR_START + timedelta(days=end_day)).isoformat()
+                ),
+                "academic_year": "2022-2023",
+                "notes": "",
+            }
+            for i, student_id, school_id, start_day, kind, end_day in zip(
+                ids.tolist(),
+                student_ids.tolist(),
+                school_ids.tolist(),
+                start_days.tolist(),
+                kinds.tolist(),
+                end_days.tolist(),
+            )
+        ]
+
+    def _records(self, n_records: int, make_page) -> List[dict]:
+        records = []
+        for page_number, ids in enumerate(self._pages(n_records)):
+            records.extend(make_page(page_number, ids))
+        return records
+
+    def student_records(self) -> List[dict]:
+        return self._records(self.n_students, self.student_page)
+
+    def school_records(self) -> List[dict]:
+        return self._records(self.n_schools, self.school_page)
+
+    def enrollment_records(self) -> List[dict]:
+        return self._records(self.n_enrollments, self.enrollment_page)
+
+    def get_student_data(self, start_page: int = 0) -> Iterator[str]:
+        return self._get_data(
+            "get_student_data", self.n_students, self.student_page, start_page
+        )
+
+    def get_schools_data(self, start_page: int = 0) -> Iterator[str]:
+        return self._get_data(
+            "get_schools_data", self.n_schools, self.school_page, start_page
+        )
+
+    def get_enrollment_data(self, start_page: int = 0) -> Iterator[str]:
+        return self._get_data(
+            "get_enrollment_data", self.n_enrollments, self.enrollment_page, start_page
+        )
+
+
+def install_as_koala_sis_api():
+    """
+    Make do_not_look.koala_sis_api.KoalaSisDataClient the fake client, unless the real client is installed.
+    """
+    try:
+        import do_not_look.koala_sis_api  # noqa: F401
+    except ImportError:
+        package = sys.modules.setdefault("do_not_look", types.ModuleType("do_not_look"))
+        module = types.ModuleType("do_not_look.koala_sis_api")
+        module.KoalaSisDataClient = FakeKoalaSisDataClient
+        package.koala_sis_api = module
+        sys.modules["do_not_look.koala_sis_api"] = module
@@ -0,0 +1,51 @@
+"""
+Tests of the chunked conform: streaming the enrollments through the conform a few rows at a time must write the same rows as the
+in-memory conform.
+"""
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to parametrize the chunk sizes and dtype plans
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to conform the downloads in memory and in chunks
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to read back the saved output
+
+KEY = ["SchoolId", "StudentUniqueId", "EntryDate"]
+
+
+def saved_output(config) -> pd.DataFrame:
+    return get_storage(config.output_formats[0], config.output_path).read(
+        pipeline.OUTPUT_TABLE
+    )
+
+
+def sorted_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # The chunked conform writes the rows chunk by chunk rather than grouped by student (see chunked.py)
+    return df.sort_values(KEY).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("compact_dtypes", [False, True])
+@pytest.mark.parametrize("chunk_size", [7, 64])
+def test_chunked_matches_in_memory(
+    downloaded, pipeline_config, monkeypatch, chunk_size, compact_dtypes
+):
+    monkeypatch.setattr(pipeline_config, "compact_dtypes", compact_dtypes)
+    enrollments = pipeline.read_input_data()[2]
+    # The chunk boundaries fall inside schools: every chunk holds enrollments of several schools, and every school spans chunks
+    chunks = pd.DataFrame(
+        {"chunk": enrollments.index // chunk_size, "school": enrollments["school_id"]}
+    )
+    assert (chunks.groupby("chunk")["school"].nunique() > 1).all()
+    assert (chunks.groupby("school")["chunk"].nunique() > 1).all()
+
+    in_memory = pipeline.conform_data()
+    saved_in_memory = saved_output(pipeline_config)
+
+    assert pipeline.conform_data(chunk_size=chunk_size) is None
+    chunked = saved_output(pipeline_config)
+
+    assert len(chunked) == len(in_memory)
+    pd.testing.assert_frame_equal(sorted_rows(chunked), sorted_rows(saved_in_memory))
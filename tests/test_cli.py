@@ -0,0 +1,67 @@
+"""
+Tests of the stage runner of the command line: save only writes validated data, and --save-merged writes the merged data whatever the
+range of stages, the same table as merge_and_transform_data saves.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to check which files were written
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to expect the validation error
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to make validation fail
+from koalasis.cli import (
+    StageRun,
+)  # Runner of a range of the pipeline stages | used here to run the stages
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to check for the merged data
+from koalasis.validation import (
+    DataValidationError,
+    ValidationReport,
+)  # Validation of the conformed data | used here to make validation fail
+
+
+def test_save_runs_validate_first(downloaded, pipeline_config):
+    run = StageRun(["transform"])
+    run.run()
+    assert not run.is_cached("validate")
+
+    statuses = StageRun(["save"]).run()
+    assert list(statuses) == ["save"]
+    assert run.is_cached("validate")
+    assert os.listdir(pipeline_config.output_path)
+
+
+def test_save_writes_nothing_when_validation_fails(
+    downloaded, pipeline_config, monkeypatch
+):
+    def failing_validate_data(transformed_data, **kwargs):
+        raise DataValidationError(ValidationReport(rows=len(transformed_data)))
+
+    monkeypatch.setattr(pipeline, "validate_data", failing_validate_data)
+
+    with pytest.raises(DataValidationError):
+        StageRun(["save"]).run()
+    assert not os.path.exists(pipeline_config.output_path) or not os.listdir(
+        pipeline_config.output_path
+    )
+
+
+def test_save_merged_outside_the_range(downloaded, pipeline_config):
+    input_storage = get_storage(
+        pipeline_config.storage_format, pipeline_config.input_path
+    )
+    StageRun(["validate"]).run()
+    assert not input_storage.exists("merged_data")
+
+    StageRun(["save"], from_cache=True, save_merged=True).run()
+    merged_data = input_storage.read("merged_data")
+    assert len(merged_data) == len(input_storage.read("enrollments"))
+    assert "DisplayName" not in merged_data.columns
+
+    # merge_and_transform_data saves the same table, the merge before the transforms
+    os.remove(input_storage.path("merged_data"))
+    pipeline.merge_and_transform_data(*pipeline.read_input_data(), save_merged=True)
+    pd.testing.assert_frame_equal(input_storage.read("merged_data"), merged_data)
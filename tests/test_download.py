@@ -0,0 +1,86 @@
+"""
+Tests of the concurrent, retrying downloads against the fake client's injected failures and latency, and of reading the downloads
+back in config.storage_format.
+"""
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to expect the permanent failure
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to read back the downloads
+from koalasis.download import (
+    ENDPOINTS,
+    download_all,
+    retry_with_backoff,
+)  # Concurrent, retrying downloads | used here to download the endpoints
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to store and read back the downloads
+from tests.fake_koala_sis import (
+    FakeKoalaSisDataClient,
+    KoalaSisApiError,
+)  # A local stand-in for the KoalaSis client | used here to inject failures and latency
+
+SIZES = {"n_students": 60, "n_schools": 6, "n_enrollments": 300, "page_size": 25}
+
+
+def serial_download(tmp_path) -> dict:
+    storage = get_storage("parquet", str(tmp_path / "serial"))
+    download_all(FakeKoalaSisDataClient(**SIZES), storage, max_workers=1, retries=0)
+    return {name: storage.read(name) for name in ENDPOINTS}
+
+
+def test_transient_failures_are_retried(tmp_path):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    client = FakeKoalaSisDataClient(
+        **SIZES,
+        latency=0.001,
+        failures={"get_student_data": 1, "get_enrollment_data": 2},
+        fail_at_page=3,
+    )
+
+    records = download_all(client, storage, retries=3, backoff=0)
+
+    assert records == {"students": 60, "schools": 6, "enrollments": 300}
+    assert client.calls == {
+        "get_student_data": 2,
+        "get_schools_data": 1,
+        "get_enrollment_data": 3,
+    }
+    for name, expected in serial_download(tmp_path).items():
+        pd.testing.assert_frame_equal(storage.read(name), expected)
+
+
+def test_permanent_failure_raises_after_retries(tmp_path):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    client = FakeKoalaSisDataClient(
+        **SIZES, latency=0.001, failures={"get_schools_data": 100}, fail_at_page=0
+    )
+
+    with pytest.raises(KoalaSisApiError):
+        download_all(client, storage, retries=2, backoff=0)
+
+    assert client.calls["get_schools_data"] == 3
+    # The failed endpoint leaves no partial table behind, and the others still finish
+    assert not storage.exists("schools")
+    assert storage.exists("students") and storage.exists("enrollments")
+
+
+def test_retry_with_backoff_only_retries_retry_on():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise KeyError("not transient")
+
+    with pytest.raises(KeyError):
+        retry_with_backoff(fail, retries=3, backoff=0, retry_on=(KoalaSisApiError,))
+    assert len(calls) == 1
+
+
+def test_read_csv_files_reads_the_storage_format(downloaded, pipeline_config):
+    # The downloads are in config.storage_format (Parquet by default), not necessarily CSV
+    storage = get_storage(pipeline_config.storage_format, pipeline_config.input_path)
+    for name, table in zip(ENDPOINTS, pipeline.read_csv_files()):
+        pd.testing.assert_frame_equal(table, storage.read(name))
@@ -0,0 +1,140 @@
+"""
+Tests of calculate_exit_withdraw_dates against calculate_exit_withdraw_date, the row-by-row reference implementation.
+"""
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to parametrize the cases
+
+from koalasis.pipeline import (
+    calculate_exit_withdraw_date,
+    calculate_exit_withdraw_dates,
+)  # The scalar and vectorized ExitWithdrawDate | used here to compare them
+
+SCHOOL_END = "2023-06-02"  # a Friday
+
+
+def reference(enrollment_end_dates: list, school_end_dates: list) -> pd.Series:
+    return pd.Series(
+        [
+            calculate_exit_withdraw_date(enrollment_end_date, school_end_date)
+            for enrollment_end_date, school_end_date in zip(
+                enrollment_end_dates, school_end_dates
+            )
+        ],
+        dtype="datetime64[ns]",
+    )
+
+
+def vectorized(enrollment_end_dates: list, school_end_dates: list, **kwargs):
+    return calculate_exit_withdraw_dates(
+        pd.Series(enrollment_end_dates, dtype=object),
+        pd.Series(school_end_dates, dtype=object),
+        **kwargs,
+    ).astype("datetime64[ns]")
+
+
+@pytest.mark.parametrize(
+    "enrollment_end_date, expected",
+    [
+        # Monday: the next day is a Tuesday, and the next school day after it Wednesday
+        ("2023-03-06", "2023-03-08"),
+        ("2023-03-09", "2023-03-13"),  # Thursday: the next day is a Friday, so Monday
+        # Friday: the next day is a Saturday, rolled back to the Friday, so Monday
+        ("2023-03-10", "2023-03-13"),
+        ("2023-03-11", "2023-03-13"),  # Saturday
+        ("2023-03-12", "2023-03-14"),  # Sunday: the next day is a Monday, so Tuesday
+    ],
+)
+def test_weekdays_and_weekends_match_bday(enrollment_end_date, expected):
+    result = vectorized([enrollment_end_date], [SCHOOL_END])
+    assert result[0] == pd.Timestamp(expected)
+    pd.testing.assert_series_equal(
+        result, reference([enrollment_end_date], [SCHOOL_END])
+    )
+
+
+def test_matches_reference_over_a_school_year():
+    enrollment_end_dates = [
+        day.isoformat() for day in pd.date_range("2022-08-15", "2023-06-10").date
+    ]
+    school_end_dates = [SCHOOL_END, "2023-06-03", "2023-05-31"] * (
+        len(enrollment_end_dates) // 3 + 1
+    )
+    school_end_dates = school_end_dates[: len(enrollment_end_dates)]
+
+    pd.testing.assert_series_equal(
+        vectorized(enrollment_end_dates, school_end_dates),
+        reference(enrollment_end_dates, school_end_dates),
+    )
+
+
+@pytest.mark.parametrize(
+    "enrollment_end_date, school_end_date",
+    [
+        (None, SCHOOL_END),  # an open enrollment exits on the school end date
+        ("2023-03-10", None),  # no school end date: nothing to clamp to
+        (None, None),
+        # Dates that can't be parsed are treated as missing, as pd.to_datetime(errors="coerce") does
+        ("not a date", SCHOOL_END),
+    ],
+)
+def test_missing_dates_match_reference(enrollment_end_date, school_end_date):
+    pd.testing.assert_series_equal(
+        vectorized([enrollment_end_date], [school_end_date]),
+        reference([enrollment_end_date], [school_end_date]),
+    )
+
+
+@pytest.mark.parametrize(
+    "enrollment_end_date",
+    ["2023-05-31", "2023-06-01", "2023-06-02", "2023-06-03", "2023-07-01"],
+)
+def test_clamps_to_school_end_date(enrollment_end_date):
+    result = vectorized([enrollment_end_date], [SCHOOL_END])
+    assert result[0] == pd.Timestamp(SCHOOL_END)
+    pd.testing.assert_series_equal(
+        result, reference([enrollment_end_date], [SCHOOL_END])
+    )
+
+
+def test_keeps_time_of_day_and_index():
+    enrollment_end_dates = pd.Series(
+        pd.to_datetime(["2023-03-10 08:30", None]), index=[10, 20]
+    )
+    school_end_dates = pd.Series(
+        pd.to_datetime([SCHOOL_END, SCHOOL_END]), index=[10, 20]
+    )
+
+    result = calculate_exit_withdraw_dates(enrollment_end_dates, school_end_dates)
+
+    assert list(result.index) == [10, 20]
+    assert result[10] == calculate_exit_withdraw_date(
+        enrollment_end_dates[10], school_end_dates[10]
+    )
+    assert result[10] == pd.Timestamp("2023-03-13 08:30")
+
+
+@pytest.mark.parametrize(
+    "enrollment_end_date, holidays, expected",
+    [
+        ("2023-03-09", ["2023-03-13"], "2023-03-14"),  # the Monday is a holiday
+        ("2023-03-09", ["2023-03-13", "2023-03-14"], "2023-03-15"),
+        ("2023-03-06", ["2023-03-08"], "2023-03-09"),  # the Wednesday is a holiday
+        # The next day itself is a holiday, which only decides where it is rolled back from
+        ("2023-03-06", ["2023-03-07"], "2023-03-08"),
+        # Still clamped to the school end date
+        ("2023-05-31", ["2023-06-02"], SCHOOL_END),
+    ],
+)
+def test_holidays_are_skipped_like_weekends(enrollment_end_date, holidays, expected):
+    result = vectorized([enrollment_end_date], [SCHOOL_END], holidays=holidays)
+    assert result[0] == pd.Timestamp(expected)
+
+
+def test_no_holidays_matches_empty_calendar():
+    enrollment_end_dates = ["2023-03-09", "2023-03-10", None]
+    school_end_dates = [SCHOOL_END] * 3
+    pd.testing.assert_series_equal(
+        vectorized(enrollment_end_dates, school_end_dates, holidays=[]),
+        vectorized(enrollment_end_dates, school_end_dates),
+    )
@@ -0,0 +1,162 @@
+"""
+Tests of the incremental conform: after students, schools and enrollments are edited, deleted and inserted, the incremental output must
+be identical to a full rebuild, row order included, and a change to the transform must not reuse the previous run's rows.
+"""
+
+import pandas as pd  # 🐼
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to conform the downloads
+from koalasis.storage import (
+    OUTPUT_SCHEMA,
+    apply_schema,
+    get_storage,
+)  # Pluggable table storage | used here to edit the downloaded tables and compare the outputs with their saved dtypes
+
+
+def copy_row(df: pd.DataFrame, row_id: int, **values) -> pd.DataFrame:
+    row = df[df["id"] == row_id].copy()
+    for column, value in values.items():
+        row[column] = value
+    return row
+
+
+def edit_downloads(config):
+    """
+    Change the downloads the way a day of activity in the SIS would: edited, deleted and new students, schools and enrollments.
+    """
+    storage = get_storage(config.storage_format, config.input_path)
+    students = storage.read("students")
+    schools = storage.read("schools")
+    enrollments = storage.read("enrollments")
+
+    students.loc[students["id"] == 3, "first_name"] = "bartholomew"
+    students = students[students["id"] != 5]
+    students = pd.concat(
+        [students, copy_row(students, 7, id=61, local_student_id=100_061)]
+    )
+
+    schools.loc[schools["id"] == 2, "end_date"] = pd.Timestamp("2023-05-26")
+    schools = schools[schools["id"] != 6]
+    schools = pd.concat([schools, copy_row(schools, 1, id=7, school_name="School 7")])
+
+    enrollments.loc[enrollments["id"] == 10, "enrollment_end_date"] = pd.Timestamp(
+        "2023-03-10"
+    )
+    enrollments.loc[enrollments["id"] == 11, "enrollment_end_date"] = pd.NaT
+    enrollments = enrollments[~enrollments["id"].isin([20, 21])]
+    enrollments = pd.concat(
+        [
+            enrollments,
+            copy_row(enrollments, 1, id=301, student_id=61, school_id=7),
+            copy_row(enrollments, 2, id=302, student_id=8, school_id=1),
+        ]
+    )
+
+    storage.write(students, "students")
+    storage.write(schools, "schools")
+    storage.write(enrollments, "enrollments")
+
+
+def conform(incremental: bool, full_rebuild: bool = False, **kwargs) -> pd.DataFrame:
+    return pipeline.conform_tables(
+        *pipeline.read_input_data(),
+        incremental=incremental,
+        full_rebuild=full_rebuild,
+        **kwargs,
+    )
+
+
+def saved(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    df with the dtypes of the saved output, which the incremental conform's state is read back with.
+    """
+    return apply_schema(df, OUTPUT_SCHEMA)
+
+
+def record_transforms(monkeypatch) -> list:
+    """
+    Record the number of enrollments every merge_and_transform_data call gets.
+    """
+    transformed = []
+    original = pipeline.merge_and_transform_data
+
+    def recording_merge_and_transform_data(students, schools, enrollments, **kwargs):
+        transformed.append(len(enrollments))
+        return original(students, schools, enrollments, **kwargs)
+
+    monkeypatch.setattr(
+        pipeline, "merge_and_transform_data", recording_merge_and_transform_data
+    )
+    return transformed
+
+
+def test_incremental_matches_full_rebuild(downloaded, pipeline_config):
+    first_run = conform(incremental=True)
+    # The rows come in the order of the full conform, not sorted by enrollment id
+    pd.testing.assert_frame_equal(first_run, saved(conform(incremental=False)))
+
+    edit_downloads(pipeline_config)
+    incremental = conform(incremental=True)
+    full = conform(incremental=True, full_rebuild=True)
+
+    pd.testing.assert_frame_equal(incremental, full)
+    pd.testing.assert_frame_equal(incremental, saved(conform(incremental=False)))
+
+    # The edits are in the output, so the incremental run didn't just return the first run
+    student_ids = set(incremental["StudentUniqueId"])
+    assert 100_005 not in student_ids and 100_061 in student_ids
+    assert 6 not in set(incremental["SchoolId"]) and 7 in set(incremental["SchoolId"])
+    assert "Bartholomew" in set(incremental["FirstName"])
+
+
+def test_unchanged_downloads_transform_nothing(
+    downloaded, pipeline_config, monkeypatch
+):
+    first_run = conform(incremental=True)
+
+    transformed = record_transforms(monkeypatch)
+    second_run = conform(incremental=True)
+
+    assert transformed == [0]
+    pd.testing.assert_frame_equal(first_run, second_run)
+
+
+def test_transform_change_rebuilds_in_full(downloaded, pipeline_config, monkeypatch):
+    conform(incremental=True)
+    enrollments = len(pipeline.read_input_data()[2])
+
+    # A holiday changes ExitWithdrawDate of unchanged enrollments, so none of the previous run's rows can be reused
+    transformed = record_transforms(monkeypatch)
+    holidays = ["2023-03-13"]
+    with_holidays = conform(incremental=True, holidays=holidays)
+    assert transformed == [enrollments]
+    pd.testing.assert_frame_equal(
+        with_holidays, saved(conform(incremental=False, holidays=holidays))
+    )
+
+    transformed.clear()
+    conform(incremental=True, holidays=holidays)
+    assert transformed == [0]
+
+    # So does a change to the code of the transforms
+    monkeypatch.setattr(pipeline, "transform_version", lambda holidays=None: "next")
+    conform(incremental=True, holidays=holidays)
+    assert transformed == [0, enrollments]
+
+
+def test_config_turns_on_the_incremental_conform(
+    downloaded, pipeline_config, monkeypatch
+):
+    monkeypatch.setattr(pipeline_config, "incremental_conform", True)
+
+    pipeline.conform_data()
+    assert get_storage(
+        pipeline_config.storage_format, pipeline_config.state_path
+    ).exists("conformed")
+
+    edit_downloads(pipeline_config)
+    incremental = pipeline.conform_data()
+    full = pipeline.conform_data(full_rebuild=True)
+    pd.testing.assert_frame_equal(incremental, full)
@@ -0,0 +1,84 @@
+"""
+Tests of the hash join of the enrollments with their dimension tables: the row order with and without order_by, and the JoinReport of
+the enrollments whose student or school is missing.
+"""
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to expect the duplicated dimension key
+
+from koalasis.join import (
+    DimensionIndex,
+    JoinReport,
+    join_dimensions,
+)  # Hash join of the enrollments with the dimension tables | used here to join the tables
+
+STUDENTS = pd.DataFrame({"id": [3, 1, 2], "FirstName": ["Cy", "Ann", "Bo"]})
+SCHOOLS = pd.DataFrame({"id": [20, 10], "NameOfInstitution": ["West", "East"]})
+# Enrollment 4 has an unknown school and enrollment 5 an unknown student
+ENROLLMENTS = pd.DataFrame(
+    {
+        "id": [100, 101, 102, 103, 104, 105],
+        "student_id": [1, 3, 2, 3, 1, 99],
+        "school_id": [10, 20, 10, 10, 30, 20],
+    }
+)
+
+
+def join(order_by=None):
+    return join_dimensions(
+        ENROLLMENTS,
+        {"id": "EnrollmentId"},
+        {
+            "student_id": DimensionIndex(STUDENTS, {"FirstName": "FirstName"}),
+            "school_id": DimensionIndex(
+                SCHOOLS, {"NameOfInstitution": "NameOfInstitution"}
+            ),
+        },
+        order_by=order_by,
+    )
+
+
+def test_facts_keep_their_order_by_default():
+    joined, _ = join()
+    assert joined["EnrollmentId"].tolist() == [100, 101, 102, 103]
+    assert joined["FirstName"].tolist() == ["Ann", "Cy", "Bo", "Cy"]
+    assert joined["NameOfInstitution"].tolist() == ["East", "West", "East", "East"]
+
+
+def test_order_by_follows_the_dimension_order():
+    joined, _ = join(order_by="student_id")
+    # Students in their table order (3, 1, 2), and the enrollments of a student in their own order
+    assert joined["EnrollmentId"].tolist() == [101, 103, 100, 102]
+
+    # The order of the chain of merges starting from students that the join replaces
+    merged = STUDENTS.merge(ENROLLMENTS, left_on="id", right_on="student_id").merge(
+        SCHOOLS, left_on="school_id", right_on="id"
+    )
+    assert joined["EnrollmentId"].tolist() == merged["id_y"].tolist()
+    assert joined["NameOfInstitution"].tolist() == (
+        merged["NameOfInstitution"].tolist()
+    )
+
+
+def test_report_counts_the_unmatched_enrollments():
+    _, report = join(order_by="student_id")
+    assert report == JoinReport(
+        rows_in=6,
+        rows_out=4,
+        unmatched_counts={"student_id": 1, "school_id": 1},
+        unmatched_samples={"student_id": [99], "school_id": [30]},
+    )
+    assert len(report.warnings()) == 2
+
+    total = JoinReport()
+    total.add(report)
+    total.add(report)
+    assert total.rows_in == 12
+    assert total.unmatched_counts == {"student_id": 2, "school_id": 2}
+    # The samples are distinct values, not one per unmatched row
+    assert total.unmatched_samples == {"student_id": [99], "school_id": [30]}
+
+
+def test_dimension_keys_must_be_unique():
+    with pytest.raises(ValueError):
+        DimensionIndex(pd.DataFrame({"id": [1, 1]}), {})
@@ -0,0 +1,163 @@
+"""
+Tests of the vectorized name and gender formatting against capitalize_name_parts, format_display_name and format_gender, the row-by-row
+reference implementations, and of the NameCache memo.
+"""
+
+import numpy as np  # Provides fast array operations | used here for missing names
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to parametrize the dtypes
+
+from koalasis.pipeline import (
+    NameCache,
+    build_display_names,
+    capitalize_name_parts,
+    format_display_name,
+    format_gender,
+    format_gender_column,
+    format_name_column,
+)  # The scalar and vectorized formatting | used here to compare them
+
+NAMES = [
+    "o'brien",
+    "mary-jane",
+    "de la cruz",
+    "van der berg-smith",
+    "d'angelo-o'neil",
+    "jean paul",
+    "McDONALD",
+    "élodie",
+    "anne_marie",
+    "x",
+    "",
+    "o'brien",
+    "mary-jane",
+]
+DTYPES = [object, "str", "category"]
+
+
+def series(values: list, dtype) -> pd.Series:
+    return pd.Series(values, dtype=dtype, index=range(10, 10 + len(values)))
+
+
+def values(result: pd.Series) -> list:
+    return [None if pd.isna(value) else value for value in result]
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_format_name_column_matches_capitalize_name_parts(dtype):
+    names = series(NAMES, dtype)
+
+    result = format_name_column(names, capitalize_name_parts)
+
+    assert values(result) == [capitalize_name_parts(name) for name in NAMES]
+    assert result.index.equals(names.index)
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_format_name_column_keeps_missing_names_missing(dtype):
+    names = series(["o'brien", None, np.nan, "", "mary-jane"], dtype)
+
+    result = format_name_column(names, capitalize_name_parts)
+
+    assert values(result) == ["O'Brien", None, None, "", "Mary-Jane"]
+
+
+def test_format_name_column_keeps_str_dtype():
+    names = series(NAMES, "str")
+    assert format_name_column(names, capitalize_name_parts).dtype == names.dtype
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_build_display_names_matches_format_display_name(dtype):
+    first_names = NAMES
+    last_names = NAMES[::-1]
+
+    result = build_display_names(series(first_names, dtype), series(last_names, dtype))
+
+    assert values(result) == [
+        format_display_name(first_name, last_name)
+        for first_name, last_name in zip(first_names, last_names)
+    ]
+
+
+def test_build_display_names_of_missing_names_is_missing():
+    result = build_display_names(
+        series(["ann", None, "bo"], object), series(["lee", "kim", None], object)
+    )
+    assert values(result) == ["Lee, Ann", None, None]
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_format_gender_column_matches_format_gender(dtype):
+    genders = ["male", "female", "Male", "other", "", "female", None]
+
+    result = format_gender_column(series(genders, dtype))
+
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert values(result) == [format_gender(gender) for gender in genders]
+
+
+def test_name_cache_gives_the_same_names():
+    cache = NameCache(max_size=3)
+    names = series(NAMES, object)
+
+    pd.testing.assert_series_equal(
+        format_name_column(names, capitalize_name_parts, cache=cache),
+        format_name_column(names, capitalize_name_parts),
+    )
+    assert len(cache) == 3
+
+
+def test_name_cache_evicts_the_least_recently_used_name():
+    calls = []
+
+    def formatter(name: str) -> str:
+        calls.append(name)
+        return name.upper()
+
+    cache = NameCache(max_size=2)
+    cache.get_or_format("a", formatter)
+    cache.get_or_format("b", formatter)
+    cache.get_or_format("a", formatter)  # a is now the most recently used
+    cache.get_or_format("c", formatter)  # so b is evicted
+    assert calls == ["a", "b", "c"]
+
+    assert cache.get_or_format("a", formatter) == "A"
+    assert cache.get_or_format("b", formatter) == "B"
+    assert calls == ["a", "b", "c", "b"]
+    assert len(cache) == 2
+
+
+def test_name_cache_round_trip(tmp_path):
+    path = str(tmp_path / "cache" / "names.json")
+    cache = NameCache(path=path)
+    for name in ["o'brien", "mary-jane"]:
+        cache.get_or_format(name, capitalize_name_parts)
+    # JSON keys are always strings, so a key that isn't one comes back as a string after a reload
+    cache.get_or_format(7, str)
+    cache.save()
+
+    def unexpected(name):
+        raise AssertionError(f"{name!r} should have been loaded from the cache")
+
+    reloaded = NameCache(path=path)
+    assert len(reloaded) == 3
+    assert reloaded.get_or_format("o'brien", unexpected) == "O'Brien"
+    assert reloaded.get_or_format("mary-jane", unexpected) == "Mary-Jane"
+    assert reloaded.get_or_format("7", unexpected) == "7"
+    assert reloaded.get_or_format(7, str) == "7"
+    assert len(reloaded) == 4
+
+
+def test_name_cache_load_keeps_max_size(tmp_path):
+    path = str(tmp_path / "names.json")
+    cache = NameCache(path=path)
+    for name in ["a", "b", "c"]:
+        cache.get_or_format(name, str.upper)
+    cache.save()
+
+    # The oldest names are dropped when a smaller cache loads them
+    reloaded = NameCache(max_size=2, path=path)
+    assert len(reloaded) == 2
+    assert reloaded.get_or_format("c", str.lower) == "C"
+    assert reloaded.get_or_format("a", str.lower) == "a"
@@ -0,0 +1,178 @@
+"""
+Tests of PartitionedTableWriter: tables with many partitions are written without running out of file descriptors, every part file is
+in the manifest, a failed run leaves the previous table in place, and the data mart is partitioned on the enrollments' academic year.
+An unpartitioned data mart is published with a manifest too, and without the academic_year column.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to list the files of the table
+import resource  # Provides process resource limits | used here to lower the limit on open files
+
+import numpy as np  # Provides fast array operations | used here to generate the rows
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to parametrize the formats and lower the limit on open files
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to conform and save the downloads partitioned
+from koalasis.output_writer import (
+    PartitionedTableWriter,
+    content_hash,
+    read_manifest,
+    read_partitioned_table,
+)  # The partitioned writer and its reader | used here to write and read back the tables
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to edit the downloaded enrollments
+
+FORMATS = ["parquet", "feather", "csv"]
+
+
+def batch(n_rows: int, n_schools: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "SchoolId": rng.integers(0, n_schools, n_rows),
+            "StudentUniqueId": rng.integers(100_000, 200_000, n_rows),
+        }
+    )
+
+
+def table_files(path: str) -> list:
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), path)
+        for directory, _, names in os.walk(path)
+        for name in names
+        if name != "_manifest.json"
+    )
+
+
+@pytest.fixture
+def open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(256, hard), hard))
+    yield
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_many_partitions_within_open_files_limit(
+    tmp_path, storage_format, open_files_limit
+):
+    path = str(tmp_path / "table")
+    batches = [batch(1_000, 300, seed) for seed in range(4)]
+    with PartitionedTableWriter(
+        storage_format, path, ["SchoolId"], rows_per_write=50, max_buffered_rows=2_000
+    ) as writer:
+        for rows in batches:
+            writer.write(rows)
+
+    manifest = read_manifest(path)
+    assert len({entry["partition"]["SchoolId"] for entry in manifest["files"]}) == 300
+    # The partitions are written over several flushes, each into a part file of its own, and the manifest lists all of them
+    assert len(manifest["files"]) > 300
+    assert sorted(entry["path"] for entry in manifest["files"]) == table_files(path)
+    assert sum(entry["rows"] for entry in manifest["files"]) == manifest["rows"]
+
+    expected = pd.concat(batches)
+    table = read_partitioned_table(path, verify=True)
+    pd.testing.assert_frame_equal(
+        table.sort_values(["SchoolId", "StudentUniqueId"]).reset_index(drop=True),
+        expected.sort_values(["SchoolId", "StudentUniqueId"]).reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert (
+        len(read_partitioned_table(path, filters={"SchoolId": [7]}))
+        == (expected["SchoolId"] == 7).sum()
+    )
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_failed_run_keeps_previous_table(tmp_path, storage_format):
+    path = str(tmp_path / "table")
+    with PartitionedTableWriter(storage_format, path, ["SchoolId"]) as writer:
+        writer.write(batch(500, 20, seed=0))
+    manifest, files = read_manifest(path), table_files(path)
+
+    with pytest.raises(RuntimeError):
+        with PartitionedTableWriter(
+            storage_format, path, ["SchoolId"], rows_per_write=1
+        ) as writer:
+            writer.write(batch(500, 20, seed=1))
+            raise RuntimeError("failed run")
+
+    assert read_manifest(path) == manifest
+    assert table_files(path) == files
+
+    with PartitionedTableWriter(storage_format, path, ["SchoolId"]) as writer:
+        writer.write(batch(100, 5, seed=2))
+    # The files of the previous table are removed once the new one is published
+    assert len(read_partitioned_table(path)) == 100
+    assert sorted(entry["path"] for entry in read_manifest(path)["files"]) == (
+        table_files(path)
+    )
+
+
+def test_partitions_on_the_enrollments_academic_year(
+    downloaded, pipeline_config, monkeypatch
+):
+    # Enrollments that start in the same school year but are recorded under another academic year: the partition follows the
+    # recorded value, not EntryDate
+    input_storage = get_storage(
+        pipeline_config.storage_format, pipeline_config.input_path
+    )
+    enrollments = input_storage.read("enrollments")
+    enrollments.loc[enrollments["id"] <= 100, "academic_year"] = "2021-2022"
+    input_storage.write(enrollments, "enrollments")
+    monkeypatch.setattr(
+        pipeline_config, "output_partition_by", ["SchoolId", "academic_year"]
+    )
+
+    transformed_data = pipeline.conform_data()
+    pipeline.save_transformed_data(transformed_data)
+
+    path = get_storage(
+        pipeline_config.storage_format, pipeline_config.output_path
+    ).path(pipeline.OUTPUT_TABLE)
+    manifest = read_manifest(path)
+    assert "academic_year" in manifest["schema"]
+    assert {entry["partition"]["academic_year"] for entry in manifest["files"]} == {
+        "2021-2022",
+        "2022-2023",
+    }
+    assert all(
+        f"academic_year={entry['partition']['academic_year']}" in entry["path"]
+        for entry in manifest["files"]
+    )
+    expected = transformed_data["academic_year"].value_counts()
+    for academic_year in ["2021-2022", "2022-2023"]:
+        table = read_partitioned_table(path, filters={"academic_year": [academic_year]})
+        assert len(table) == expected[academic_year]
+        assert set(table["academic_year"]) == {academic_year}
+
+
+@pytest.mark.parametrize("storage_format", FORMATS)
+def test_unpartitioned_output_has_a_manifest(
+    downloaded, pipeline_config, monkeypatch, storage_format
+):
+    monkeypatch.setattr(pipeline_config, "output_formats", (storage_format,))
+    transformed_data = pipeline.conform_data()
+    pipeline.save_transformed_data(transformed_data)
+
+    path = get_storage(storage_format, pipeline_config.output_path).path(
+        pipeline.OUTPUT_TABLE
+    )
+    assert os.path.isfile(path)
+    manifest = read_manifest(path)
+    assert manifest["partition_by"] == []
+    assert manifest["rows"] == len(transformed_data)
+    assert manifest["files"] == [
+        {
+            "path": os.path.basename(path),
+            "partition": {},
+            "rows": len(transformed_data),
+            "blake2b": content_hash(path),
+        }
+    ]
+    assert "academic_year" not in manifest["schema"]
+    assert "academic_year" not in transformed_data.columns
+    assert len(read_partitioned_table(path, verify=True)) == len(transformed_data)
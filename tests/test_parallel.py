@@ -0,0 +1,37 @@
+"""
+Tests of the transforms run on a pool of processes: the output equals the serial transform's, row order included.
+"""
+
+import pandas as pd  # 🐼
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to merge and transform the downloads
+from koalasis.parallel import (
+    plan_partitions,
+)  # Partitioned transforms on a process pool | used here to check the rows are split across several partitions
+
+HOLIDAYS = ["2022-12-26", "2023-01-02", "2023-05-29"]
+
+
+def test_parallel_transform_equals_serial(downloaded, pipeline_config, monkeypatch):
+    # Small partitions, so the 6 schools are transformed in several partitions on both workers
+    monkeypatch.setattr(pipeline_config, "transform_partition_size", 40)
+    students, schools, enrollments = pipeline.read_input_data()
+
+    def transform(workers: int) -> pd.DataFrame:
+        return pipeline.merge_and_transform_data(
+            students.copy(),
+            schools.copy(),
+            enrollments.copy(),
+            holidays=HOLIDAYS,
+            keep_enrollment_id=True,
+            workers=workers,
+        )
+
+    serial = transform(workers=1)
+    assert len(plan_partitions(serial["SchoolId"], 40)) > 2
+    parallel = transform(workers=2)
+
+    # Row order and index included, not only the same set of rows
+    pd.testing.assert_frame_equal(parallel, serial)
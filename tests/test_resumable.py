@@ -0,0 +1,163 @@
+"""
+Tests of the resumable downloads: a download interrupted part-way continues from its checkpoint without fetching a page twice and ends
+with the same rows as a clean download, and cached downloads expire after their time-to-live.
+"""
+
+import os  # Provides functions for interacting with the operating system | used here to check for the checkpoint
+import time  # Provides timing functions | used here to move the clock past the time-to-live
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to expect the injected failure
+
+from koalasis.download import (
+    download_endpoint,
+)  # Retrying download of one endpoint | used here to download with checkpoints and a time-to-live
+from koalasis.resumable import (
+    DownloadCheckpoint,
+    cached_records,
+)  # Resumable downloads | used here to inspect the checkpoint and the download manifest
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to store and read back the downloads
+from tests.fake_koala_sis import (
+    FakeKoalaSisDataClient,
+    KoalaSisApiError,
+)  # A local stand-in for the KoalaSis client | used here to fail a download part-way
+
+PAGE_SIZE = 20
+N_ENROLLMENTS = 200  # 10 pages
+FAIL_AT_PAGE = 6
+
+
+def clean_download(tmp_path, storage_format: str = "parquet") -> pd.DataFrame:
+    storage = get_storage(storage_format, str(tmp_path / "clean"))
+    client = FakeKoalaSisDataClient(n_enrollments=N_ENROLLMENTS, page_size=PAGE_SIZE)
+    download_endpoint(client, "enrollments", storage, retries=0)
+    return storage.read("enrollments")
+
+
+def failing_client() -> FakeKoalaSisDataClient:
+    return FakeKoalaSisDataClient(
+        n_enrollments=N_ENROLLMENTS,
+        page_size=PAGE_SIZE,
+        failures={"get_enrollment_data": 1},
+        fail_at_page=FAIL_AT_PAGE,
+    )
+
+
+class ClientWithoutStartPage:
+    """
+    A client whose get_enrollment_data can only start at the first page, so a resumed download has to skip the pages it already has.
+    """
+
+    def __init__(self, client: FakeKoalaSisDataClient):
+        self.client = client
+
+    def get_enrollment_data(self):
+        return self.client.get_enrollment_data()
+
+
+@pytest.mark.parametrize("storage_format", ["parquet", "csv"])
+def test_interrupted_download_resumes_from_checkpoint(tmp_path, storage_format):
+    storage = get_storage(storage_format, str(tmp_path / "download"))
+    client = failing_client()
+
+    # One part file per page, so every page before the failure is on disk
+    with pytest.raises(KoalaSisApiError):
+        download_endpoint(
+            client,
+            "enrollments",
+            storage,
+            batch_size=PAGE_SIZE,
+            retries=0,
+            resumable=True,
+        )
+    checkpoint = DownloadCheckpoint(storage, "enrollments")
+    assert checkpoint.load()
+    assert checkpoint.pages == FAIL_AT_PAGE
+    assert not storage.exists("enrollments")
+
+    records = download_endpoint(
+        client, "enrollments", storage, batch_size=PAGE_SIZE, retries=0, resumable=True
+    )
+
+    assert client.fetched_pages["get_enrollment_data"] == list(
+        range(N_ENROLLMENTS // PAGE_SIZE)
+    )
+    assert records == N_ENROLLMENTS
+    pd.testing.assert_frame_equal(
+        storage.read("enrollments"), clean_download(tmp_path, storage_format)
+    )
+    assert not os.path.exists(checkpoint.path)
+    assert not os.path.exists(checkpoint.parts_directory)
+
+
+def test_retry_resumes_within_one_call(tmp_path):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    client = failing_client()
+
+    download_endpoint(
+        client,
+        "enrollments",
+        storage,
+        batch_size=PAGE_SIZE,
+        retries=1,
+        backoff=0,
+        resumable=True,
+    )
+
+    assert client.calls["get_enrollment_data"] == 2
+    assert client.fetched_pages["get_enrollment_data"] == list(
+        range(N_ENROLLMENTS // PAGE_SIZE)
+    )
+    pd.testing.assert_frame_equal(storage.read("enrollments"), clean_download(tmp_path))
+
+
+def test_resume_skips_pages_of_a_client_without_start_page(tmp_path):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    client = failing_client()
+
+    download_endpoint(
+        ClientWithoutStartPage(client),
+        "enrollments",
+        storage,
+        batch_size=PAGE_SIZE,
+        retries=1,
+        backoff=0,
+        resumable=True,
+    )
+
+    # The API sends the first pages again, but they are skipped rather than written a second time
+    assert client.fetched_pages["get_enrollment_data"] == list(
+        range(FAIL_AT_PAGE)
+    ) + list(range(N_ENROLLMENTS // PAGE_SIZE))
+    pd.testing.assert_frame_equal(storage.read("enrollments"), clean_download(tmp_path))
+
+
+def test_cached_download_expires_after_ttl(tmp_path, monkeypatch):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    client = FakeKoalaSisDataClient(n_schools=5)
+
+    assert cached_records(storage, "schools", ttl=60) is None
+    assert download_endpoint(client, "schools", storage, cache_ttl=60) == 5
+    assert cached_records(storage, "schools", ttl=60) == 5
+
+    # Within the time-to-live the table on disk is used without calling the API
+    assert download_endpoint(client, "schools", storage, cache_ttl=60) == 5
+    assert client.calls["get_schools_data"] == 1
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cached_records(storage, "schools", ttl=60) is None
+    assert cached_records(storage, "schools", ttl=120) == 5
+
+    assert download_endpoint(client, "schools", storage, cache_ttl=60) == 5
+    assert client.calls["get_schools_data"] == 2
+
+
+def test_cached_download_needs_the_table(tmp_path):
+    storage = get_storage("parquet", str(tmp_path / "download"))
+    download_endpoint(FakeKoalaSisDataClient(), "schools", storage, cache_ttl=60)
+
+    os.remove(storage.path("schools"))
+    assert cached_records(storage, "schools", ttl=60) is None
@@ -0,0 +1,72 @@
+"""
+Tests of the skipping of unchanged stages by run_stage: a stage is only skipped when its inputs, code, kwargs and settings are unchanged.
+"""
+
+import importlib  # Imports modules by name | used here to import and reload the module of the test stage
+
+from koalasis.stage_graph import (
+    Stage,
+    StageState,
+    run_stage,
+)  # Stage graph with content-hashed artifacts | used here to run the test stage
+
+STAGE_SOURCE = """
+def suffix():
+    return "{suffix}"
+
+
+def copy(source, target, prefix=""):
+    with open(source) as f:
+        text = f.read()
+    with open(target, "w") as f:
+        f.write(prefix + text + suffix())
+"""
+
+
+def write_stage_module(directory, suffix: str):
+    (directory / "copy_stage.py").write_text(STAGE_SOURCE.format(suffix=suffix))
+
+
+def test_stage_reruns_when_inputs_code_kwargs_or_settings_change(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_stage_module(tmp_path, "!")
+    module = importlib.import_module("copy_stage")
+
+    source, target = tmp_path / "source.txt", tmp_path / "target.txt"
+    source.write_text("hello")
+    state = StageState(str(tmp_path / "state"))
+
+    def run(kwargs=None, settings=None) -> str:
+        target_before = target.stat().st_mtime_ns if target.exists() else None
+        run_stage(
+            Stage(
+                "copy",
+                "copy_stage:copy",
+                {"source": str(source), "target": str(target), **(kwargs or {})},
+                inputs=[str(source)],
+                outputs=[str(target)],
+                settings=settings or {},
+            ),
+            state,
+        )
+        ran = target_before != target.stat().st_mtime_ns
+        return target.read_text() if ran else None
+
+    assert run() == "hello!"
+    assert run() is None
+
+    source.write_text("goodbye")
+    assert run() == "goodbye!"
+    assert run() is None
+
+    # A change to a function the stage calls, not just to the stage function itself, reruns it
+    write_stage_module(tmp_path, "?")
+    importlib.reload(module)
+    assert run() == "goodbye?"
+    assert run() is None
+
+    assert run(kwargs={"prefix": "> "}) == "> goodbye?"
+    assert run(kwargs={"prefix": "> "}) is None
+
+    assert run(kwargs={"prefix": "> "}, settings={"mode": "strict"}) is not None
+    assert run(kwargs={"prefix": "> "}, settings={"mode": "strict"}) is None
@@ -0,0 +1,113 @@
+"""
+Tests of the validation of the conformed data: DataValidator's null, duplicate and unmatched checks, and the validation_report.json
+validate_partitions stores for a failing run.
+"""
+
+import json  # Provides functions for working with JSON data | used here to read the stored report
+import os  # Provides functions for interacting with the operating system | used here to find the stored report
+
+import pandas as pd  # 🐼
+import pytest  # Provides the test runner | used here to expect the validation failures
+
+from koalasis import (
+    pipeline,
+)  # The pipeline | used here to conform and validate the downloads
+from koalasis.join import (
+    JoinReport,
+)  # Hash join of the enrollments with the dimension tables | used here to report unmatched enrollments
+from koalasis.storage import (
+    get_storage,
+)  # Pluggable table storage | used here to edit the downloads and the conformed partition
+from koalasis.validation import (
+    DataValidationError,
+    DataValidator,
+)  # Validation of the conformed data | used here to validate the tables
+
+
+def rows() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "SchoolId": [1, 1, 2, 2],
+            "StudentUniqueId": [10, 11, 10, 12],
+            "EntryDate": pd.to_datetime(
+                ["2022-08-20", "2022-08-20", None, "2022-08-20"]
+            ),
+            "FirstName": ["Ann", None, "Bo", "Cy"],
+        }
+    )
+
+
+def test_reports_nulls_and_duplicates_across_chunks():
+    df = rows()
+    validator = DataValidator()
+    validator.update(df)
+    # The same rows again, as a second chunk: every key of it is a duplicate
+    validator.update(df)
+    report = validator.finish()
+
+    assert not report.ok
+    assert report.rows == 8
+    assert report.null_counts == {"EntryDate": 2, "FirstName": 2}
+    assert [sample["_row"] for sample in report.null_samples["EntryDate"]] == [2, 6]
+    assert report.duplicate_count == 4
+    assert [sample["_row"] for sample in report.duplicate_samples] == [4, 5, 6, 7]
+
+
+def test_fail_fast_stops_at_the_first_column_with_nulls():
+    validator = DataValidator(fail_fast=True)
+    with pytest.raises(DataValidationError) as failure:
+        validator.update(rows())
+    assert failure.value.report.null_counts == {"EntryDate": 1}
+
+
+def test_unmatched_enrollments_are_warnings():
+    validator = DataValidator()
+    validator.update(rows().dropna())
+    validator.update_join(
+        JoinReport(
+            unmatched_counts={"student_id": 0, "school_id": 2},
+            unmatched_samples={"student_id": [], "school_id": [98, 99]},
+        )
+    )
+    report = validator.finish()
+
+    assert report.ok
+    assert report.warnings() == ["2 enrollments with no matching school_id"]
+
+
+def test_validate_partitions_stores_the_report(downloaded, pipeline_config):
+    assert not pipeline_config.validation_fail_fast
+
+    # An enrollment of a school that isn't in the schools table: the merge drops it
+    input_storage = get_storage(
+        pipeline_config.storage_format, pipeline_config.input_path
+    )
+    enrollments = input_storage.read("enrollments")
+    enrollments.loc[0, "school_id"] = 999
+    input_storage.write(enrollments, "enrollments")
+    assert pipeline.conform_partition() == len(enrollments) - 1
+
+    # A conformed row with no EntryDate, and a row conformed twice
+    staging = pipeline.staging_storage(1)
+    conformed = staging.read(pipeline.conformed_partition_name(0))
+    conformed.loc[0, "EntryDate"] = pd.NaT
+    conformed = pd.concat([conformed, conformed.iloc[[1]]], ignore_index=True)
+    staging.write(conformed, pipeline.conformed_partition_name(0))
+
+    with pytest.raises(DataValidationError):
+        pipeline.validate_partitions()
+
+    with open(
+        os.path.join(pipeline_config.staging_path, "validation_report.json")
+    ) as f:
+        report = json.load(f)
+    assert report["rows"] == len(conformed)
+    assert report["null_counts"] == {"EntryDate": 1}
+    assert [sample["_row"] for sample in report["null_samples"]["EntryDate"]] == [0]
+    assert report["duplicate_key"] == pipeline_config.validation_key
+    assert report["duplicate_count"] == 1
+    assert [sample["_row"] for sample in report["duplicate_samples"]] == [
+        len(conformed) - 1
+    ]
+    assert report["unmatched_counts"] == {"student_id": 0, "school_id": 1}
+    assert report["unmatched_samples"]["school_id"] == [999]